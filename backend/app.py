@@ -2,6 +2,7 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from datetime import datetime
 
@@ -15,6 +16,7 @@ from routes.sensor_routes import sensor_bp
 
 # Import Firebase initialization
 from services.firebase_service import initialize_firebase
+from middleware.compression import init_compression
 
 def create_app():
     app = Flask(__name__)
@@ -22,6 +24,13 @@ def create_app():
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
     app.config['DEBUG'] = os.getenv('FLASK_ENV') == 'development'
+
+    # Number of reverse proxies in front of the app (e.g. 1 behind a platform router). Only then are
+    # X-Forwarded-For/-Proto trusted, and only that many hops of them; rate limits and device
+    # fingerprints key on the resulting remote_addr. Leave at 0 when clients connect directly.
+    proxy_hops = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+    if proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
     
     # ✅ Enable CORS for your frontend
     CORS(
@@ -35,6 +44,9 @@ def create_app():
     
     # Initialize Firebase
     initialize_firebase()
+
+    # gzip/brotli responses negotiated through Accept-Encoding
+    init_compression(app)
     
     # Health check endpoint
     @app.route('/health', methods=['GET'])
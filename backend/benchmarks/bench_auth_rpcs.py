@@ -0,0 +1,198 @@
+# benchmarks/bench_auth_rpcs.py
+# Firestore round trips per auth endpoint: direct reads/writes vs the request-scoped user document session.
+# Runs against an in-process fake Firestore; no credentials or network needed.
+# Usage (from backend/): python benchmarks/bench_auth_rpcs.py
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('AUTH_TOKEN_STORE', 'memory')
+os.environ.setdefault('AUTH_RATE_LIMIT_STORE', 'memory')
+os.environ.setdefault('AUTH_DEVICE_GENERATION_STORE', 'memory')
+
+from flask import Flask
+
+import routes.auth_routes as auth_routes
+import services.trusted_devices as trusted_devices
+import services.user_documents as user_documents
+from services.login_history import get_login_history_writer
+from services.token_store import get_token_store, LOGIN_TOKEN, DEVICE_TOKEN
+
+UID = 'benchmark-user'
+EMAIL = 'farmer@example.com'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+CLIENT_IP = '198.51.100.7'
+
+rpcs = Counter()
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, store, uid):
+        self.store = store
+        self.uid = uid
+
+    def get(self):
+        rpcs['get'] += 1
+        return FakeSnapshot(self.store.get(self.uid))
+
+    def update(self, fields):
+        rpcs['update'] += 1
+        user_documents.apply_update(self.store[self.uid], fields)
+
+
+class FakeBatch:
+    def __init__(self):
+        self.writes = []
+
+    def update(self, reference, fields):
+        self.writes.append((reference, fields))
+
+    def commit(self):
+        rpcs['batch'] += 1
+        for reference, fields in self.writes:
+            user_documents.apply_update(reference.store[reference.uid], fields)
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.users = {}
+
+    def collection(self, name):
+        return self
+
+    def document(self, uid):
+        return FakeDocument(self.users, uid)
+
+    def batch(self):
+        return FakeBatch()
+
+
+class FakeUser:
+    uid = UID
+    email = EMAIL
+
+
+class DirectUserDocuments:
+    """The old access pattern: every lookup reads Firestore and every update writes immediately"""
+
+    def get(self, uid):
+        snapshot = fake_db.document(uid).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def update(self, uid, fields):
+        fake_db.document(uid).update(fields)
+
+    def commit(self):
+        pass
+
+
+fake_db = FakeFirestore()
+
+
+def reset_user(trusted):
+    fingerprint = auth_routes.get_device_fingerprint(FakeRequest())['fingerprint']
+    devices = [{'fingerprint': fingerprint, 'lastUsed': '2024-01-01T00:00:00'}] if trusted else []
+    fake_db.users[UID] = {
+        'uid': UID, 'email': EMAIL, 'fullName': 'Benchmark Farmer', 'isRegistered': True,
+        'trustedDevices': devices, 'loginHistory': []
+    }
+
+
+class FakeRequest:
+    headers = {'User-Agent': USER_AGENT}
+    remote_addr = CLIENT_IP
+
+
+def issue(kind, data):
+    token = f'{kind}-{time.perf_counter_ns()}'
+    get_token_store().issue(kind, token, {**data, 'expires_at': time.time() + 300}, time.time() + 300)
+    return token
+
+
+def scenarios(client):
+    headers = {'User-Agent': USER_AGENT}
+    fingerprint = auth_routes.get_device_fingerprint(FakeRequest())['fingerprint']
+
+    def check_email():
+        reset_user(trusted=True)
+        return client.post('/api/auth/check-email', json={'email': EMAIL}, headers=headers)
+
+    def send_link_trusted():
+        reset_user(trusted=True)
+        return client.post('/api/auth/send-magic-link', json={'email': EMAIL}, headers=headers)
+
+    def send_link_new_device():
+        reset_user(trusted=False)
+        return client.post('/api/auth/send-magic-link', json={'email': EMAIL}, headers=headers)
+
+    def verify_device():
+        reset_user(trusted=False)
+        token = issue(DEVICE_TOKEN, {'uid': UID, 'email': EMAIL, 'device_info': auth_routes.get_device_fingerprint(FakeRequest())})
+        return client.post('/api/auth/verify-device', json={'token': token}, headers=headers)
+
+    def verify_token():
+        reset_user(trusted=True)
+        token = issue(LOGIN_TOKEN, {'uid': UID, 'email': EMAIL, 'device_fingerprint': fingerprint})
+        return client.post('/api/auth/verify-token', json={'token': token}, headers=headers)
+
+    return (
+        ('check-email', check_email),
+        ('send-magic-link (trusted)', send_link_trusted),
+        ('send-magic-link (new device)', send_link_new_device),
+        ('verify-device', verify_device),
+        ('verify-token', verify_token),
+    )
+
+
+def use_sessions(factory):
+    auth_routes.get_user_documents = trusted_devices.get_user_documents = factory
+
+
+def count_rpcs(call):
+    # Start every run with a cold trusted-device cache
+    trusted_devices.get_trusted_device_cache().invalidate(UID)
+    rpcs.clear()
+    response = call()
+    assert response.status_code == 200, (response.status_code, response.get_json())
+    return rpcs['get'], rpcs['update'] + rpcs['batch']
+
+
+def main():
+    user_documents.get_firestore = lambda: fake_db
+    # Login history is written by a background batch shared across users, not by the request; keep it out of the counts
+    login_history = get_login_history_writer()
+    login_history._client_factory = lambda: fake_db
+    login_history.flush_interval = 3600
+    auth_routes.get_user_by_email = lambda email: FakeUser()
+    auth_routes.create_custom_token = lambda uid: 'custom-token'
+    for name in ('send_magic_link_email', 'send_device_verification_email', 'send_new_device_alert_email'):
+        setattr(auth_routes, name, lambda *args, **kwargs: True)
+
+    app = Flask(__name__)
+    app.register_blueprint(auth_routes.auth_bp, url_prefix='/api/auth')
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = CLIENT_IP
+
+    session_factory = auth_routes.get_user_documents
+    print(f"{'endpoint':<30}{'direct reads/writes':>22}{'request session':>18}")
+    for label, call in scenarios(client):
+        use_sessions(DirectUserDocuments)
+        before = count_rpcs(call)
+        use_sessions(session_factory)
+        after = count_rpcs(call)
+        print(f"{label:<30}{f'{before[0]} get + {before[1]} write':>22}{f'{after[0]} get + {after[1]} write':>18}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_compression.py
+# CPU cost vs bytes saved for gzip/brotli levels on typical dashboard responses.
+# Usage (from backend/): python benchmarks/bench_compression.py
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from services.sensor_store import SENSOR_FIELDS
+from services.sensor_stats import summarize
+from utils.dummy_data import generate_historical_series
+from utils.streaming import iter_history_json
+from utils.time_utils import parse_duration
+from utils.wire_format import encode_history_columnar
+
+REPEATS = 5
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 5, 11)
+
+
+def history_json(time_range, hours, interval):
+    series = generate_historical_series(hours, interval, seed=42)
+    timestamps = series.pop('timestamps')
+    return b''.join(iter_history_json('Historical data retrieved successfully', time_range, interval, timestamps, series))
+
+
+def history_columnar(hours, interval):
+    series = generate_historical_series(hours, interval, seed=42)
+    timestamps = series.pop('timestamps')
+    encoded = encode_history_columnar(timestamps, series, parse_duration(interval, 3600))
+    return json.dumps({'success': True, 'data': encoded}, separators=(',', ':')).encode()
+
+
+def stats_json():
+    stats = summarize(generate_historical_series(24, '1m', seed=42))
+    rounded = {field: {key: round(value, 1) for key, value in stats[field].items()} for field in SENSOR_FIELDS}
+    return json.dumps({'success': True, 'data': rounded}, separators=(',', ':')).encode()
+
+
+def timed(compress, body):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        payload = compress(body)
+        best = min(best, time.perf_counter() - start)
+    return payload, best
+
+
+def main():
+    bodies = (
+        ('stats 24h json', stats_json()),
+        ('history 24h/1h json', history_json('24h', 24, '1h')),
+        ('history 7d/5m json', history_json('7d', 7 * 24, '5m')),
+        ('history 7d/5m columnar', history_columnar(7 * 24, '5m')),
+        ('history 30d/1m json', history_json('30d', 30 * 24, '1m')),
+    )
+
+    codecs = [(f'gzip-{level}', lambda body, level=level: gzip.compress(body, level, mtime=0)) for level in GZIP_LEVELS]
+    if brotli is not None:
+        codecs += [(f'br-{quality}', lambda body, quality=quality: brotli.compress(body, quality=quality))
+                   for quality in BROTLI_QUALITIES]
+
+    for label, body in bodies:
+        print(f"{label} ({len(body):,} B)")
+        for name, compress in codecs:
+            payload, seconds = timed(compress, body)
+            saved = len(body) - len(payload)
+            print(f"  {name:<8}{len(payload):>12,} B{len(payload) / len(body):>8.1%}{seconds * 1000:>10.2f} ms"
+                  f"{saved / 1e6 / seconds if seconds else 0:>10.0f} MB saved/s")
+        print()
+
+
+if __name__ == '__main__':
+    main()
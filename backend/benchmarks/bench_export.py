@@ -0,0 +1,50 @@
+# benchmarks/bench_export.py
+# Measure /export encoder throughput (CSV and binary) against the 125 MB/s of a gigabit link.
+# Usage (from backend/): python benchmarks/bench_export.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sensor_store import SENSOR_FIELDS
+from utils.dummy_data import generate_historical_series
+from utils.export_format import encode_csv_chunk, encode_export_block
+from utils.time_utils import format_timestamps
+
+CHUNK_ROWS = 65536
+CHUNKS = 16
+GIGABIT_BYTES_PER_SECOND = 125e6
+
+
+def naive_csv(greenhouse_id, timestamps, columns):
+    """Row-by-row string formatting, for comparison"""
+    values = [columns[field].astype(float).round(1).tolist() for field in SENSOR_FIELDS]
+    rows = zip(format_timestamps(timestamps), *values)
+    return ''.join(f"{greenhouse_id},{t},{a},{b},{c}\n" for t, a, b, c in rows).encode()
+
+
+def measure(label, encode, timestamps, columns):
+    start = time.perf_counter()
+    total = 0
+    for offset in range(0, len(timestamps), CHUNK_ROWS):
+        window = slice(offset, offset + CHUNK_ROWS)
+        total += len(encode('GH-001', timestamps[window], {field: columns[field][window] for field in SENSOR_FIELDS}))
+    seconds = time.perf_counter() - start
+    rate = total / seconds
+    print(f"  {label:<12}{len(timestamps) / seconds / 1e6:>8.2f} M rows/s{rate / 1e6:>10.1f} MB/s"
+          f"{rate / GIGABIT_BYTES_PER_SECOND:>9.0%} of 1 Gbit/s")
+
+
+def main():
+    rows = CHUNK_ROWS * CHUNKS
+    series = generate_historical_series(rows * 10 / 3600, '10s', seed=42)
+    timestamps = series.pop('timestamps')
+    print(f"export of {len(timestamps):,} readings in chunks of {CHUNK_ROWS:,}")
+    measure('csv (naive)', naive_csv, timestamps, series)
+    measure('csv', encode_csv_chunk, timestamps, series)
+    measure('binary', encode_export_block, timestamps, series)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_token_store.py
+# Issue / verify / consume throughput of the token store backends with 100k live tokens.
+# Usage (from backend/): python benchmarks/bench_token_store.py
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.token_store import MemoryTokenStore, SQLiteTokenStore, LOGIN_TOKEN
+
+LIVE_TOKENS = 100_000
+OPERATIONS = 20_000
+EXPIRING = 10_000
+
+
+def record(expires_at):
+    return {
+        'uid': 'benchmark-user',
+        'email': 'farmer@example.com',
+        'device_fingerprint': secrets.token_hex(32),
+        'created_at': expires_at - 300,
+        'expires_at': expires_at
+    }
+
+
+def rate(label, count, seconds):
+    print(f"  {label:<28}{count / seconds:>12,.0f} ops/s{seconds / count * 1e6:>10.1f} µs/op")
+
+
+def run(label, store):
+    print(label)
+    now = time.time()
+    live = [secrets.token_urlsafe(32) for _ in range(LIVE_TOKENS)]
+    for token in live:
+        store.issue(LOGIN_TOKEN, token, record(now + 300), now + 300)
+
+    fresh = [secrets.token_urlsafe(32) for _ in range(OPERATIONS)]
+    start = time.perf_counter()
+    for token in fresh:
+        store.issue(LOGIN_TOKEN, token, record(now + 300), now + 300)
+    rate('issue', OPERATIONS, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for token in live[:OPERATIONS]:
+        assert store.get(LOGIN_TOKEN, token) is not None
+    rate('verify (get)', OPERATIONS, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for token in fresh:
+        assert store.consume(LOGIN_TOKEN, token) is not None
+    rate('consume (one-time use)', OPERATIONS, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(OPERATIONS):
+        store.get(LOGIN_TOKEN, secrets.token_urlsafe(32))
+    rate('unknown token', OPERATIONS, time.perf_counter() - start)
+
+    # Purge cost tracks the number of expired tokens, not the number of live ones
+    for token in (secrets.token_urlsafe(32) for _ in range(EXPIRING)):
+        store.issue(LOGIN_TOKEN, token, record(now - 1), now - 1)
+    start = time.perf_counter()
+    removed = store.purge_expired(now)
+    seconds = time.perf_counter() - start
+    print(f"  purge {removed:,} expired of {store.count() + removed:,}{seconds * 1000:>16.1f} ms")
+    print()
+
+
+def main():
+    run('memory (heap expiry)', MemoryTokenStore())
+    with tempfile.TemporaryDirectory() as directory:
+        run('sqlite (WAL, shared across workers)', SQLiteTokenStore(os.path.join(directory, 'tokens.db')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_user_agent.py
+# Per-call cost of User-Agent parsing: uncached user_agents.parse vs the memoized parse_user_agent.
+# Usage (from backend/): python benchmarks/bench_user_agent.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import user_agents
+
+from utils.user_agent import parse_user_agent, clear_user_agent_cache, user_agent_cache_info
+
+# Browsers farmers and agronomists actually log in from: Android phones dominate, then desktop Chrome/Edge/Firefox/Safari
+USER_AGENTS = (
+    'Mozilla/5.0 (Linux; Android 13; SM-A135F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.6099.144 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 12; TECNO KG5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.6045.163 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 11; Infinix X6511) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5993.111 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13; Redmi Note 12) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.6099.210 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 12; itel A665L) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.5938.153 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13; SM-A047F) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/23.0 Chrome/115.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; U; Android 11; en-us; Infinix X688B) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/110.0.5481.153 Mobile Safari/537.36 OPR/73.0.2254.67461',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/120.0.6099.119 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPad; CPU OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+)
+
+CALLS = 20_000
+
+
+def corpus(count, seed=7):
+    """Requests drawn with a skew towards the most common browsers, like real login traffic"""
+    weights = [1 / (rank + 1) for rank in range(len(USER_AGENTS))]
+    return random.Random(seed).choices(USER_AGENTS, weights=weights, k=count)
+
+
+def per_call(label, parse, requests):
+    start = time.perf_counter()
+    for user_agent in requests:
+        parse(user_agent)
+    seconds = time.perf_counter() - start
+    print(f"  {label:<36}{seconds / len(requests) * 1e6:>10.1f} µs/call")
+
+
+def device_fields(user_agent):
+    """What get_device_fingerprint used to do on every call"""
+    ua = user_agents.parse(user_agent)
+    return {
+        'device_type': ua.device.family,
+        'os': f"{ua.os.family} {ua.os.version_string}",
+        'browser': f"{ua.browser.family} {ua.browser.version_string}",
+        'is_mobile': ua.is_mobile,
+        'is_tablet': ua.is_tablet,
+        'is_pc': ua.is_pc,
+    }
+
+
+def main():
+    requests = corpus(CALLS)
+    print(f"{len(USER_AGENTS)} distinct User-Agents, {CALLS:,} calls")
+
+    per_call('user_agents.parse (uncached)', device_fields, requests[:2000])
+
+    clear_user_agent_cache()
+    per_call('parse_user_agent, cold cache', parse_user_agent, USER_AGENTS)
+    per_call('parse_user_agent, warm cache', parse_user_agent, requests)
+    print(f"  {user_agent_cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
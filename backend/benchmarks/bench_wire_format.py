@@ -0,0 +1,88 @@
+# benchmarks/bench_wire_format.py
+# Compare payload size and encode time of the /history and /stats wire formats.
+# Usage (from backend/): python benchmarks/bench_wire_format.py
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sensor_store import SENSOR_FIELDS
+from utils.dummy_data import generate_historical_series
+from utils.streaming import iter_history_json
+from utils.time_utils import parse_duration
+from utils.wire_format import (
+    encode_history_columnar,
+    encode_history_binary,
+    encode_stats_columnar,
+    encode_stats_binary
+)
+
+CASES = (('24h', 24, '1h'), ('7d', 7 * 24, '1h'), ('30d', 30 * 24, '1h'), ('30d', 30 * 24, '1m'))
+REPEATS = 5
+
+
+def legacy_json(timestamps, columns):
+    """The original encoding: one dict per reading with an ISO timestamp"""
+    readings = [
+        {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)),
+            **{field: round(float(columns[field][i]), 1) for field in SENSOR_FIELDS}
+        }
+        for i, t in enumerate(timestamps.tolist())
+    ]
+    return json.dumps({'success': True, 'data': {'readings': readings}}, separators=(',', ':')).encode()
+
+
+def timed(encode):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        payload = encode()
+        best = min(best, time.perf_counter() - start)
+    return payload, best
+
+
+def report(label, payload, seconds, baseline):
+    compressed = len(gzip.compress(payload, 6))
+    print(f"  {label:<16}{len(payload):>12,} B{compressed:>12,} B gz{seconds * 1000:>10.2f} ms"
+          f"{len(payload) / baseline:>9.1%}")
+
+
+def main():
+    for time_range, hours, interval in CASES:
+        series = generate_historical_series(hours, interval, seed=42)
+        timestamps = series.pop('timestamps')
+        step = parse_duration(interval, 3600)
+        print(f"history range={time_range} interval={interval} ({len(timestamps):,} points)")
+
+        baseline, seconds = timed(lambda: legacy_json(timestamps, series))
+        report('json (legacy)', baseline, seconds, len(baseline))
+
+        payload, seconds = timed(lambda: b''.join(iter_history_json('', time_range, interval, timestamps, series)))
+        report('json (stream)', payload, seconds, len(baseline))
+
+        payload, seconds = timed(lambda: json.dumps(encode_history_columnar(timestamps, series, step), separators=(',', ':')).encode())
+        report('columnar json', payload, seconds, len(baseline))
+
+        payload, seconds = timed(lambda: encode_history_binary(timestamps, series, step))
+        report('binary float32', payload, seconds, len(baseline))
+        print()
+
+    stats = {
+        field: {'count': 1440, 'min': 18.2, 'max': 31.7, 'avg': 24.93, 'stddev': 2.41, 'p5': 20.6, 'p50': 24.9, 'p95': 29.3}
+        for field in SENSOR_FIELDS
+    }
+    print("stats (24h)")
+    baseline, seconds = timed(lambda: json.dumps({'success': True, 'data': stats}, separators=(',', ':')).encode())
+    report('json', baseline, seconds, len(baseline))
+    payload, seconds = timed(lambda: json.dumps(encode_stats_columnar(stats), separators=(',', ':')).encode())
+    report('columnar json', payload, seconds, len(baseline))
+    payload, seconds = timed(lambda: encode_stats_binary(stats, 86400))
+    report('binary float32', payload, seconds, len(baseline))
+
+
+if __name__ == '__main__':
+    main()
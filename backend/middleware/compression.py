@@ -0,0 +1,104 @@
+# middleware/compression.py
+import gzip
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:     # Brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this go out as-is - headers and CPU would cost more than the bytes saved
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Streamed bodies (large history, exports) are compressed on every request and never cached,
+# so they use the fastest levels - see benchmarks/bench_compression.py
+STREAM_GZIP_LEVEL = int(os.getenv('COMPRESSION_STREAM_GZIP_LEVEL', '1'))
+STREAM_BROTLI_QUALITY = int(os.getenv('COMPRESSION_STREAM_BROTLI_QUALITY', '1'))
+
+# Float32 binary payloads barely shrink, so only text formats are compressed
+COMPRESSIBLE_PREFIXES = ('text/', 'application/json', 'application/javascript')
+COMPRESSIBLE_SUFFIXES = ('+json', '/xml', '+xml')
+UNCOMPRESSED_MIMETYPES = ('text/event-stream',)   # SSE frames must reach the client unbuffered
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def iter_compressed(chunks, encoding):
+    """Compress a streamed body chunk by chunk, flushing after each so the client keeps receiving data"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=STREAM_BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(STREAM_GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits 31 = gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def is_compressible(mimetype):
+    if not mimetype or mimetype in UNCOMPRESSED_MIMETYPES:
+        return False
+    return mimetype.startswith(COMPRESSIBLE_PREFIXES) or mimetype.endswith(COMPRESSIBLE_SUFFIXES)
+
+
+def compress_response(response):
+    """
+    after_request hook: gzip/brotli-encode the body according to Accept-Encoding.
+    A response may carry `compressed_variants`, a dict shared with a query cache entry:
+    compressed bytes are looked up there first and stored there after compressing,
+    so repeated cache hits are never compressed twice.
+    """
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or request.method == 'HEAD' or not is_compressible(response.mimetype)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = iter_compressed(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_BYTES:
+            return response
+
+        variants = getattr(response, 'compressed_variants', None)
+        compressed = variants.get(encoding) if variants is not None else None
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if variants is not None:
+                variants[encoding] = compressed
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = encoding
+    # The encoded bytes differ from the identity representation, so the validator becomes weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """Register response compression on a Flask app"""
+    app.after_request(compress_response)
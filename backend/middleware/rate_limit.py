@@ -0,0 +1,33 @@
+# middleware/rate_limit.py
+from functools import wraps
+from flask import request, jsonify
+from services.rate_limiter import get_rate_limiter
+
+
+def client_ip():
+    """
+    The connecting client's address. X-Forwarded-For is client-controlled, so it is only honoured
+    through ProxyFix for the TRUSTED_PROXY_HOPS proxies configured in app.py, which rewrites remote_addr.
+    """
+    return request.remote_addr
+
+
+def rate_limit(name, limit, window_seconds, key_func=client_ip):
+    """Decorator to cap requests per client to `limit` per sliding `window_seconds`"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Store failures fall back to per-process counters inside the limiter; never skip the limit
+            allowed, retry_after = get_rate_limiter().hit(name, key_func(), limit, window_seconds)
+            if not allowed:
+                response = jsonify({
+                    'success': False,
+                    'error': f'Too many requests. Please wait {retry_after} seconds before trying again.'
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+
+            return f(*args, **kwargs)
+
+        return decorated_function
+    return decorator
@@ -1,11 +1,10 @@
 # routes/auth_routes.py - Enhanced with Device Verification + HTTPS Support
-from flask import Blueprint, request, jsonify, redirect
+from flask import Blueprint, request, jsonify, redirect, g, has_request_context
 import secrets
 import time
 from datetime import datetime, timedelta
 from services.firebase_service import (
     get_auth,
-    get_firestore,
     get_user_by_email,
     create_custom_token
 )
@@ -15,24 +14,37 @@ from services.email_service import (
     send_new_device_alert_email,
     send_device_verification_email
 )
+from services.token_store import get_token_store, purge_expired_tokens, LOGIN_TOKEN, DEVICE_TOKEN
+from services.user_documents import get_user_documents, commit_user_documents
+from services.login_history import get_login_history_writer
+from services.trusted_devices import (
+    is_trusted_device,
+    add_trusted_device,
+    remove_trusted_device,
+    list_trusted_devices
+)
+from middleware.rate_limit import rate_limit
+from utils.user_agent import parse_user_agent
 
 import os
 import re
 import hashlib
-import user_agents
 
 auth_bp = Blueprint('auth', __name__)
 
-# In-memory token storage (use Redis in production)
-login_tokens = {}
-device_verification_tokens = {}
+# User documents are read once per request and buffered updates written when it ends
+auth_bp.after_request(commit_user_documents)
+
+# Magic-link and device verification tokens live in the token store (shared by all workers)
 TOKEN_EXPIRY_MINUTES = 5
 DEVICE_VERIFICATION_EXPIRY_MINUTES = 10
 
-# In-memory rate limiting (use Redis in production)
-rate_limit = {}
-RATE_LIMIT_REQUESTS = 3          # max 3 requests per window
+# Per-IP limits (requests per sliding window), enforced across all workers
 RATE_LIMIT_WINDOW_SECONDS = 60   # 1-minute window
+RATE_LIMIT_REQUESTS = 3          # verify-token: max 3 requests per window
+SEND_LINK_RATE_LIMIT = 5         # send-magic-link and verify-device send emails
+VERIFY_DEVICE_RATE_LIMIT = 5
+CHECK_EMAIL_RATE_LIMIT = 10
 
 
 # ✅ HTTPS Enforcement (set to True in production)
@@ -46,111 +58,33 @@ def enforce_https():
     return None
 
 def get_device_fingerprint(request):
-    """Generate device fingerprint from user agent and IP"""
+    """Generate device fingerprint from user agent and IP (computed once per request)"""
+    cached = g.get('device_info') if has_request_context() else None
+    if cached is not None:
+        return dict(cached)
+
     user_agent = request.headers.get('User-Agent', '')
-    ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
+    # remote_addr, not the spoofable X-Forwarded-For; ProxyFix sets it behind trusted proxies
+    ip_address = request.remote_addr
     
     # Create fingerprint
     fingerprint_string = f"{user_agent}|{ip_address}"
     fingerprint = hashlib.sha256(fingerprint_string.encode()).hexdigest()
     
-    # Parse user agent for device info
-    ua = user_agents.parse(user_agent)
-    
+    # Parse user agent for device info (memoized per User-Agent string)
     device_info = {
         'fingerprint': fingerprint,
-        'device_type': ua.device.family,
-        'os': f"{ua.os.family} {ua.os.version_string}",
-        'browser': f"{ua.browser.family} {ua.browser.version_string}",
+        **parse_user_agent(user_agent),
         'ip_address': ip_address,
-        'is_mobile': ua.is_mobile,
-        'is_tablet': ua.is_tablet,
-        'is_pc': ua.is_pc,
         'timestamp': datetime.utcnow().isoformat()
     }
     
-    return device_info
-
-def is_trusted_device(uid, device_fingerprint):
-    """Check if device is trusted for this user"""
-    try:
-        db = get_firestore()
-        user_doc = db.collection('users').document(uid).get()
-        
-        if not user_doc.exists:
-            return False
-        
-        user_data = user_doc.to_dict()
-        trusted_devices = user_data.get('trustedDevices', [])
-        
-        # Check if device fingerprint exists in trusted devices
-        for device in trusted_devices:
-            if device.get('fingerprint') == device_fingerprint:
-                # Update last used timestamp
-                device['lastUsed'] = datetime.utcnow().isoformat()
-                db.collection('users').document(uid).update({
-                    'trustedDevices': trusted_devices
-                })
-                return True
-        
-        return False
-        
-    except Exception as e:
-        print(f"❌ Error checking trusted device: {str(e)}")
-        return False
-
-def add_trusted_device(uid, device_info):
-    """Add device to trusted devices list"""
-    try:
-        db = get_firestore()
-        user_doc = db.collection('users').document(uid).get()
-        
-        if not user_doc.exists:
-            return False
-        
-        user_data = user_doc.to_dict()
-        trusted_devices = user_data.get('trustedDevices', [])
-        
-        # Add new device
-        device_info['addedAt'] = datetime.utcnow().isoformat()
-        device_info['lastUsed'] = datetime.utcnow().isoformat()
-        trusted_devices.append(device_info)
-        
-        # Keep only last 5 devices
-        if len(trusted_devices) > 5:
-            trusted_devices = sorted(trusted_devices, key=lambda x: x['lastUsed'], reverse=True)[:5]
-        
-        db.collection('users').document(uid).update({
-            'trustedDevices': trusted_devices
-        })
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error adding trusted device: {str(e)}")
-        return False
-
-def cleanup_expired_tokens():
-    """Remove expired tokens"""
-    current_time = time.time()
-    
-    # Cleanup login tokens
-    expired_login = [
-        token for token, data in login_tokens.items()
-        if current_time > data['expires_at']
-    ]
-    for token in expired_login:
-        del login_tokens[token]
-    
-    # Cleanup device verification tokens
-    expired_device = [
-        token for token, data in device_verification_tokens.items()
-        if current_time > data['expires_at']
-    ]
-    for token in expired_device:
-        del device_verification_tokens[token]
+    if has_request_context():
+        g.device_info = device_info
+    return dict(device_info)
 
 @auth_bp.route('/send-magic-link', methods=['POST'])
+@rate_limit('send-magic-link', SEND_LINK_RATE_LIMIT, RATE_LIMIT_WINDOW_SECONDS)
 def send_magic_link():
     """Send magic link with device verification"""
     # Check HTTPS enforcement
@@ -188,18 +122,15 @@ def send_magic_link():
             }), 404
         
         # Check if user completed registration in Firestore
-        db = get_firestore()
-        user_doc = db.collection('users').document(user.uid).get()
+        user_data = get_user_documents().get(user.uid)
         
-        if not user_doc.exists:
+        if user_data is None:
             return jsonify({
                 'success': False,
                 'error': 'Email not registered. Please complete registration first.',
                 'registered': False
             }), 404
         
-        user_data = user_doc.to_dict()
-        
         if not user_data.get('isRegistered'):
             return jsonify({
                 'success': False,
@@ -218,13 +149,14 @@ def send_magic_link():
             verification_token = secrets.token_urlsafe(32)
             
             current_time = time.time()
-            device_verification_tokens[verification_token] = {
+            expires_at = current_time + (DEVICE_VERIFICATION_EXPIRY_MINUTES * 60)
+            get_token_store().issue(DEVICE_TOKEN, verification_token, {
                 'uid': user.uid,
                 'email': user.email,
                 'device_info': device_info,
                 'created_at': current_time,
-                'expires_at': current_time + (DEVICE_VERIFICATION_EXPIRY_MINUTES * 60)
-            }
+                'expires_at': expires_at
+            }, expires_at)
             
             # Send device verification email
             frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:5173')
@@ -247,20 +179,21 @@ def send_magic_link():
         token = secrets.token_urlsafe(32)
         
         current_time = time.time()
-        login_tokens[token] = {
+        expires_at = current_time + (TOKEN_EXPIRY_MINUTES * 60)
+        get_token_store().issue(LOGIN_TOKEN, token, {
             'uid': user.uid,
             'email': user.email,
             'device_fingerprint': device_info['fingerprint'],
             'created_at': current_time,
-            'expires_at': current_time + (TOKEN_EXPIRY_MINUTES * 60)
-        }
+            'expires_at': expires_at
+        }, expires_at)
         
         frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:5173')
         magic_link = f"{frontend_url}/auth/verify?token={token}"
         
         send_magic_link_email(user.email, user_data.get('fullName', 'User'), magic_link)
         
-        cleanup_expired_tokens()
+        purge_expired_tokens()
         
         print(f"✅ Magic link sent to trusted device: {email}")
         
@@ -278,6 +211,7 @@ def send_magic_link():
 
 
 @auth_bp.route('/verify-device', methods=['GET', 'POST'])  # ✅ Accept both GET and POST
+@rate_limit('verify-device', VERIFY_DEVICE_RATE_LIMIT, RATE_LIMIT_WINDOW_SECONDS)
 def verify_device():
     """Verify new device and send magic link"""
 
@@ -301,8 +235,8 @@ def verify_device():
                 'error': 'Verification token is required'
             }), 400
         
-        # Check if token exists
-        token_data = device_verification_tokens.get(token)
+        # Take the token out of the store (one-time use, even across workers)
+        token_data = get_token_store().consume(DEVICE_TOKEN, token)
         
         if not token_data:
             return jsonify({
@@ -313,7 +247,6 @@ def verify_device():
         # Check if token has expired
         current_time = time.time()
         if current_time > token_data['expires_at']:
-            del device_verification_tokens[token]
             return jsonify({
                 'success': False,
                 'error': 'Verification link has expired. Please request a new login link.'
@@ -322,24 +255,20 @@ def verify_device():
         # Add device to trusted devices
         add_trusted_device(token_data['uid'], token_data['device_info'])
         
-        # Delete verification token
-        del device_verification_tokens[token]
-        
         # Generate magic link
         magic_token = secrets.token_urlsafe(32)
         
-        login_tokens[magic_token] = {
+        expires_at = current_time + (TOKEN_EXPIRY_MINUTES * 60)
+        get_token_store().issue(LOGIN_TOKEN, magic_token, {
             'uid': token_data['uid'],
             'email': token_data['email'],
             'device_fingerprint': token_data['device_info']['fingerprint'],
             'created_at': current_time,
-            'expires_at': current_time + (TOKEN_EXPIRY_MINUTES * 60)
-        }
+            'expires_at': expires_at
+        }, expires_at)
         
-        # Get user data
-        db = get_firestore()
-        user_doc = db.collection('users').document(token_data['uid']).get()
-        user_data = user_doc.to_dict()
+        # Get user data (already loaded by add_trusted_device)
+        user_data = get_user_documents().get(token_data['uid']) or {}
         
         # Send magic link
         frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:5173')
@@ -367,6 +296,7 @@ def verify_device():
 
 
 @auth_bp.route('/verify-token', methods=['GET', 'POST'])  # ✅ Accept both GET and POST
+@rate_limit('verify-token', RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_SECONDS)
 def verify_token():
     """Verify magic link token and return Firebase custom token"""
 
@@ -375,24 +305,6 @@ def verify_token():
     if https_redirect:
         return https_redirect
     
-    # 🛡️ Rate limiting check
-    ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
-    current_time = time.time()
-    requests_list = rate_limit.get(ip_address, [])
-
-    # Remove old entries (older than window)
-    requests_list = [t for t in requests_list if current_time - t < RATE_LIMIT_WINDOW_SECONDS]
-
-    if len(requests_list) >= RATE_LIMIT_REQUESTS:
-        return jsonify({
-            'success': False,
-            'error': 'Too many requests. Please wait a minute before trying again.'
-        }), 429
-    
-    # Record this attempt
-    requests_list.append(current_time)
-    rate_limit[ip_address] = requests_list
-
     try:
         # ✅ Get token from either POST body or GET query params
         if request.method == 'POST':
@@ -401,24 +313,14 @@ def verify_token():
         else:  # GET request from email link
             token = request.args.get('token')
 
-        # --- DEBUG PRINTS ---
-        print("🔹 Token received from request:", token)
-        print("🔹 Current tokens in memory:", list(login_tokens.keys()))
-
-        if token in login_tokens:
-           print("🔹 Token expires at:", datetime.fromtimestamp(login_tokens[token]['expires_at']))
-           print("🔹 Expected device fingerprint:", login_tokens[token]['device_fingerprint'])
-        # --------------------
-
-
         if not token:
             return jsonify({
                 'success': False,
                 'error': 'Token is required'
             }), 400
         
-        # Check if token exists
-        token_data = login_tokens.get(token)
+        # Take the token out of the store (one-time use, even across workers)
+        token_data = get_token_store().consume(LOGIN_TOKEN, token)
         
         if not token_data:
             return jsonify({
@@ -429,7 +331,6 @@ def verify_token():
         # Check if token has expired
         current_time = time.time()
         if current_time > token_data['expires_at']:
-            del login_tokens[token]
             return jsonify({
                 'success': False,
                 'error': 'Token has expired. Please request a new magic link.'
@@ -440,12 +341,11 @@ def verify_token():
         device_mismatch = current_device_info['fingerprint'] != token_data['device_fingerprint']
 
         # ✅ Get user data before using it
-        db = get_firestore()
-        user_doc = db.collection('users').document(token_data['uid']).get()
-        user_data = user_doc.to_dict() if user_doc.exists else {}
+        user_documents = get_user_documents()
+        user_data = user_documents.get(token_data['uid']) or {}
 
          # ✅ Add device to trusted devices
-        add_trusted_device(token_data['uid'], get_device_fingerprint(request))
+        add_trusted_device(token_data['uid'], current_device_info)
 
 
         # 🚨 Security alert: Notify user of login from new or unrecognized device
@@ -466,9 +366,6 @@ def verify_token():
         # Create custom Firebase token
         custom_token = create_custom_token(token_data['uid'])
         
-        # Delete used token (one-time use)
-        del login_tokens[token]
-        
         
         
         # Log login activity
@@ -478,16 +375,13 @@ def verify_token():
             'status': 'success'
         }
         
-        # Add to user's login history (keep last 10)
-        login_history = user_data.get('loginHistory', [])
-        login_history.append(login_activity)
-        if len(login_history) > 10:
-            login_history = login_history[-10:]
-        
-        db.collection('users').document(token_data['uid']).update({
-            'loginHistory': login_history,
-            'lastLogin': datetime.utcnow().isoformat()
-        })
+        # Add to user's login history (keep last 10) and set lastLogin - written in the background
+        if user_documents.get(token_data['uid']) is not None:
+            get_login_history_writer().record(
+                token_data['uid'],
+                login_activity,
+                user_data.get('loginHistory', [])
+            )
         
         print(f"✅ User authenticated: {token_data['email']}")
         
@@ -540,17 +434,15 @@ def get_trusted_devices():
                 'error': 'User ID required'
             }), 400
         
-        db = get_firestore()
-        user_doc = db.collection('users').document(uid).get()
+        user_data = get_user_documents().get(uid)
         
-        if not user_doc.exists:
+        if user_data is None:
             return jsonify({
                 'success': False,
                 'error': 'User not found'
             }), 404
         
-        user_data = user_doc.to_dict()
-        trusted_devices = user_data.get('trustedDevices', [])
+        trusted_devices = list_trusted_devices(user_data)
         
         return jsonify({
             'success': True,
@@ -584,24 +476,15 @@ def remove_device():
                 'error': 'User ID and device fingerprint required'
             }), 400
         
-        db = get_firestore()
-        user_doc = db.collection('users').document(uid).get()
-        
-        if not user_doc.exists:
+        # Remove device (also drops it from this worker's trusted-device cache)
+        if not remove_trusted_device(uid, device_fingerprint):
             return jsonify({
                 'success': False,
                 'error': 'User not found'
             }), 404
         
-        user_data = user_doc.to_dict()
-        trusted_devices = user_data.get('trustedDevices', [])
-        
-        # Remove device
-        trusted_devices = [d for d in trusted_devices if d.get('fingerprint') != device_fingerprint]
-        
-        db.collection('users').document(uid).update({
-            'trustedDevices': trusted_devices
-        })
+        # Write now rather than after the response, so a failed removal is reported as one
+        get_user_documents().commit()
         
         return jsonify({
             'success': True,
@@ -617,6 +500,7 @@ def remove_device():
 
 
 @auth_bp.route('/check-email', methods=['POST'])
+@rate_limit('check-email', CHECK_EMAIL_RATE_LIMIT, RATE_LIMIT_WINDOW_SECONDS)
 def check_email():
     """Check if email is registered"""
     # Check HTTPS enforcement
@@ -646,18 +530,15 @@ def check_email():
             }), 404
         
         # Check Firestore
-        db = get_firestore()
-        user_doc = db.collection('users').document(user.uid).get()
+        user_data = get_user_documents().get(user.uid)
         
-        if not user_doc.exists:
+        if user_data is None:
             return jsonify({
                 'success': False,
                 'registered': False,
                 'error': 'Email not registered. Please register first.'
             }), 404
         
-        user_data = user_doc.to_dict()
-        
         if not user_data.get('isRegistered'):
             return jsonify({
                 'success': False,
@@ -1,23 +1,338 @@
 # routes/sensor_routes.py
-from flask import Blueprint, request, jsonify
+import math
+import re
+import time
+import numpy as np
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from middleware.auth_middleware import require_auth
-from utils.dummy_data import generate_dummy_data, generate_historical_data
+from services.sensor_store import (
+    get_sensor_store,
+    readings_to_columns,
+    SENSOR_FIELDS,
+    SENSOR_UNITS,
+    DEFAULT_GREENHOUSE_ID,
+    GREENHOUSE_ID_PATTERN
+)
+from services.rollups import get_rollup_engine
+from services.sensor_stats import (
+    get_sensor_stats,
+    STATS_PERIODS,
+    DEFAULT_STATS_PERIOD,
+    SLOTS_PER_WINDOW,
+    summarize
+)
+from services.sensor_stream import get_sensor_broadcaster
+from services.alert_engine import get_alert_engine, ALERT_CONDITIONS
+from services.firestore_writer import get_firestore_writer
+from services.anomaly_detector import get_anomaly_detector, labels as anomaly_labels
+from services.query_cache import get_query_cache
+from utils.dummy_data import (
+    generate_dummy_data,
+    generate_historical_series,
+    DEFAULT_GREENHOUSE
+)
+from utils.streaming import iter_history_json
+from utils.http_cache import data_etag, bucket_cache_control, not_modified, with_cache_headers
+from utils.wire_format import (
+    negotiate_format,
+    encode_history_columnar,
+    encode_history_binary,
+    encode_stats_columnar,
+    encode_stats_binary,
+    COLUMNAR_MIMETYPE,
+    BINARY_MIMETYPE
+)
+from utils.resample import resample, fill_gaps, AGGREGATIONS, GAP_FILLS
+from utils.export_format import (
+    encode_csv_chunk,
+    encode_export_header,
+    encode_export_block,
+    EXPORT_TRAILER,
+    CSV_HEADER,
+    CSV_MIMETYPE,
+    EXPORT_MIMETYPE
+)
+from utils.time_utils import parse_duration, parse_timestamp, format_timestamp, format_timestamps
 
 sensor_bp = Blueprint('sensors', __name__)
 
+MAX_INGEST_BATCH = 10000
+
+# History responses with more points than this are streamed as chunked JSON
+STREAM_THRESHOLD_POINTS = 1000
+
+# Upper bound on range / interval, so a tiny interval over a long range can't build a huge grid
+MAX_HISTORY_POINTS = 500000
+
+MAX_ALERT_RULES_PER_GREENHOUSE = 1000
+MAX_ALERT_RECIPIENTS = 5
+MAX_ALERT_NAME_LENGTH = 100
+
+# Exports stream straight from storage this many readings at a time
+EXPORT_CHUNK_ROWS = 65536
+MAX_EXPORT_GREENHOUSES = 100
+DEFAULT_EXPORT_RANGE_SECONDS = 30 * 86400
+
+
+def get_greenhouse_id():
+    """Greenhouse requested via ?greenhouse=, defaulting to the test greenhouse"""
+    return request.args.get('greenhouse', DEFAULT_GREENHOUSE_ID)
+
+
+def greenhouse_info(greenhouse_id):
+    """Registered greenhouse metadata, falling back to the built-in test greenhouse"""
+    info = get_sensor_store().greenhouse(greenhouse_id)
+    if greenhouse_id == DEFAULT_GREENHOUSE['id']:
+        return {**DEFAULT_GREENHOUSE, **(info or {})}
+    return info or {'id': greenhouse_id}
+
+
+def format_readings(timestamps, columns, anomalies=None):
+    """Turn columnar history into the list-of-dicts shape the dashboard expects"""
+    readings = [{'timestamp': timestamp} for timestamp in format_timestamps(timestamps)]
+    for field in SENSOR_FIELDS:
+        for reading, value in zip(readings, columns[field].tolist()):
+            reading[field] = round(value, 1)
+    for reading, labels in zip(readings, anomalies or [None] * len(readings)):
+        reading['anomaly'] = labels
+    return readings
+
+
+def cached_body_response(entry):
+    """Response for a query cache hit; compressed variants are shared with the compression middleware"""
+    response = Response(entry.body, mimetype=entry.mimetype)
+    response.compressed_variants = entry.compressed_variants
+    return response
+
+
+def query_history(greenhouse_id, start, end, step, agg='mean', fill='none'):
+    """Serve history from the coarsest rollup tier that fits, falling back to resampling raw readings"""
+    result = get_rollup_engine().history(greenhouse_id, start, end, step, agg)
+    if result is not None:
+        buckets = (result[0] // step).astype(np.int64)
+        return fill_gaps(buckets, result[1], step, fill)
+
+    timestamps, columns = get_sensor_store().query(greenhouse_id, start, end)
+    return resample(timestamps, columns, step, agg, fill)
+
+
+@sensor_bp.route('/ingest', methods=['POST'])
+@require_auth
+def ingest_readings(current_user):
+    """Ingest a batch of sensor readings into the time-series store"""
+    try:
+        data = request.get_json(silent=True)
+
+        if not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'error': 'JSON body with readings is required'
+            }), 400
+
+        greenhouse_id = data.get('greenhouseId', DEFAULT_GREENHOUSE_ID)
+
+        if not isinstance(greenhouse_id, str) or not re.match(GREENHOUSE_ID_PATTERN, greenhouse_id):
+            return jsonify({
+                'success': False,
+                'error': 'greenhouseId must be 1-64 letters, digits, "-", "_" or "."'
+            }), 400
+
+        try:
+            timestamps, values = readings_to_columns(data)
+        except (ValueError, TypeError) as e:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid readings: {str(e)}'
+            }), 400
+
+        if len(timestamps) == 0:
+            return jsonify({
+                'success': False,
+                'error': 'At least one reading is required'
+            }), 400
+
+        if len(timestamps) > MAX_INGEST_BATCH:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large. Maximum {MAX_INGEST_BATCH} readings per request.'
+            }), 413
+
+        store = get_sensor_store()
+        if any(data.get(key) for key in ('farmId', 'name', 'location')):
+            store.register_greenhouse(
+                greenhouse_id,
+                farm_id=data.get('farmId'),
+                name=data.get('name'),
+                location=data.get('location')
+            )
+
+        try:
+            accepted, rejected = store.ingest(greenhouse_id, timestamps, values)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid readings: {str(e)}'
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'message': 'Readings ingested successfully',
+            'data': {
+                'greenhouseId': greenhouse_id,
+                'accepted': accepted,
+                'rejected': rejected
+            }
+        }), 202
+
+    except Exception as e:
+        print(f"❌ Error ingesting readings: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to ingest sensor data'
+        }), 500
+
+
+@sensor_bp.route('/export', methods=['GET'])
+@require_auth
+def export_readings(current_user):
+    """
+    Stream raw readings as CSV (default) or the columnar binary export file (?format=binary).
+    ?greenhouse= takes a comma-separated list and may repeat; the window is ?start=&end=
+    (ISO or epoch) or ?range= ending now. Memory use is bounded by one chunk, whatever the range.
+    """
+    try:
+        greenhouse_ids = [
+            greenhouse_id.strip()
+            for value in request.args.getlist('greenhouse') or [DEFAULT_GREENHOUSE_ID]
+            for greenhouse_id in value.split(',') if greenhouse_id.strip()
+        ]
+        greenhouse_ids = list(dict.fromkeys(greenhouse_ids))
+        export_format = request.args.get('format', 'csv')
+
+        if not greenhouse_ids or len(greenhouse_ids) > MAX_EXPORT_GREENHOUSES:
+            return jsonify({
+                'success': False,
+                'error': f'Export between 1 and {MAX_EXPORT_GREENHOUSES} greenhouses at a time'
+            }), 400
+
+        if not all(re.match(GREENHOUSE_ID_PATTERN, greenhouse_id) for greenhouse_id in greenhouse_ids):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid greenhouse id'
+            }), 400
+
+        if export_format not in ('csv', 'binary'):
+            return jsonify({
+                'success': False,
+                'error': 'format must be csv or binary'
+            }), 400
+
+        try:
+            end = parse_timestamp(request.args.get('end'))
+            if request.args.get('start'):
+                start = parse_timestamp(request.args.get('start'))
+            else:
+                start = end - parse_duration(request.args.get('range'), DEFAULT_EXPORT_RANGE_SECONDS)
+        except (ValueError, TypeError):
+            return jsonify({
+                'success': False,
+                'error': 'start and end must be ISO timestamps or epoch seconds'
+            }), 400
+
+        store = get_sensor_store()
+
+        def generate():
+            yield CSV_HEADER if export_format == 'csv' else encode_export_header()
+            for greenhouse_id in greenhouse_ids:
+                for timestamps, columns in store.iter_query(greenhouse_id, start, end, EXPORT_CHUNK_ROWS):
+                    if export_format == 'csv':
+                        yield encode_csv_chunk(greenhouse_id, timestamps, columns)
+                    else:
+                        yield encode_export_block(greenhouse_id, timestamps, columns)
+            if export_format == 'binary':
+                yield EXPORT_TRAILER
+
+        extension, mimetype = ('csv', CSV_MIMETYPE) if export_format == 'csv' else ('shsx', EXPORT_MIMETYPE)
+        filename = f"sensors-{time.strftime('%Y%m%dT%H%M%S', time.gmtime(end))}.{extension}"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Cache-Control': 'no-store'
+            }
+        )
+
+    except Exception as e:
+        print(f"❌ Error exporting readings: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to export sensor data'
+        }), 500
+
+
+@sensor_bp.route('/greenhouses', methods=['GET'])
+@require_auth
+def list_greenhouses(current_user):
+    """List greenhouses that have reported readings, optionally filtered by ?farm="""
+    try:
+        farm_id = request.args.get('farm')
+        greenhouses = get_sensor_store().list_greenhouses(farm_id)
+
+        return jsonify({
+            'success': True,
+            'message': 'Greenhouses retrieved successfully',
+            'data': {
+                'farm': farm_id,
+                'greenhouses': greenhouses
+            }
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Error listing greenhouses: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve greenhouses'
+        }), 500
+
+
 @sensor_bp.route('/latest', methods=['GET'])
 @require_auth
 def get_latest_readings(current_user):
     """Get latest sensor readings"""
     try:
-        latest_data = generate_dummy_data()
-        
-        return jsonify({
+        greenhouse_id = get_greenhouse_id()
+        store = get_sensor_store()
+
+        info = greenhouse_info(greenhouse_id)
+        # The body embeds greenhouse metadata, so re-registering a greenhouse changes the ETag too
+        etag = data_etag(store.version(greenhouse_id), 'latest', greenhouse_id, *sorted(info.items()))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        latest = store.latest(greenhouse_id)
+        if latest is None:
+            # Nothing ingested yet - keep the dashboard populated with demo data
+            latest_data = generate_dummy_data(info)
+        else:
+            timestamp, values = latest
+            flags = get_anomaly_detector().reading_flags(greenhouse_id, [timestamp])
+            latest_data = {
+                'timestamp': format_timestamp(timestamp),
+                **{field: round(value, 1) for field, value in values.items()},
+                'anomaly': anomaly_labels(flags)[0],
+                'status': 'active',
+                'greenhouse': info
+            }
+
+        return with_cache_headers(jsonify({
             'success': True,
             'message': 'Latest sensor readings retrieved successfully',
             'data': latest_data
-        }), 200
-        
+        }), etag), 200
+
     except Exception as e:
         print(f"❌ Error getting latest readings: {str(e)}")
         return jsonify({
@@ -26,34 +341,147 @@ def get_latest_readings(current_user):
         }), 500
 
 
+@sensor_bp.route('/stream', methods=['GET'])
+@require_auth
+def stream_readings(current_user):
+    """Stream new sensor readings as Server-Sent Events (auth is checked once per connection)"""
+    greenhouse_id = get_greenhouse_id()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+
+    if not re.match(GREENHOUSE_ID_PATTERN, greenhouse_id):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid greenhouse id'
+        }), 400
+
+    def demo_reading():
+        if get_sensor_store().has_data(greenhouse_id):
+            return None
+        reading = generate_dummy_data()
+        return {field: reading[field] for field in ('timestamp', *SENSOR_FIELDS)}
+
+    events = get_sensor_broadcaster().subscribe(greenhouse_id, last_event_id, demo_source=demo_reading)
+
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+        }
+    )
+
+
 @sensor_bp.route('/history', methods=['GET'])
 @require_auth
 def get_historical_data_route(current_user):
-    """Get historical sensor data with optional time range"""
+    """
+    Get historical sensor data with optional time range.
+    ?interval= accepts any duration (30s, 15m, 6h); ?agg=mean|last|max|p5|p50|p95 picks the bucket value
+    and ?fill=none|ffill|linear fills buckets without readings.
+    """
     try:
         # Get query parameters
         time_range = request.args.get('range', '24h')
         interval = request.args.get('interval', '1h')
-        
-        # Parse range parameter (24h, 7d, 30d)
-        hours = 24
-        if time_range.endswith('h'):
-            hours = int(time_range[:-1])
-        elif time_range.endswith('d'):
-            hours = int(time_range[:-1]) * 24
-        
-        historical_data = generate_historical_data(hours, interval)
-        
-        return jsonify({
-            'success': True,
-            'message': 'Historical data retrieved successfully',
-            'data': {
-                'range': time_range,
-                'interval': interval,
-                'readings': historical_data
-            }
-        }), 200
-        
+        agg = request.args.get('agg', 'mean')
+        fill = request.args.get('fill', 'none')
+        greenhouse_id = get_greenhouse_id()
+
+        if agg not in AGGREGATIONS or fill not in GAP_FILLS:
+            return jsonify({
+                'success': False,
+                'error': f"agg must be one of {', '.join(AGGREGATIONS)}; fill one of {', '.join(GAP_FILLS)}"
+            }), 400
+
+        # Parse range (24h, 7d, 30d) and interval (30s, 15m, 6h)
+        try:
+            hours = parse_duration(time_range, 24 * 3600) / 3600
+            step = parse_duration(interval, 3600)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'range and interval must be durations such as 30s, 15m, 6h or 7d'
+            }), 400
+
+        if hours * 3600 / step > MAX_HISTORY_POINTS:
+            return jsonify({
+                'success': False,
+                'error': f'Interval too small for this range. Maximum {MAX_HISTORY_POINTS} points per request.'
+            }), 400
+        wire_format = negotiate_format(request)
+        store = get_sensor_store()
+        end = time.time()
+
+        # The window only changes when data lands or the current interval bucket rolls over
+        etag = data_etag(
+            store.version(greenhouse_id), 'history', greenhouse_id,
+            time_range, interval, agg, fill, wire_format, int(end // step)
+        )
+        cache_control = bucket_cache_control(step, end)
+        cached = not_modified(etag, cache_control)
+        if cached:
+            return cached
+
+        # Dashboards asking for the same window within one interval bucket share an encoded body
+        has_data = store.has_data(greenhouse_id)
+        cache = get_query_cache()
+        cache_key = (greenhouse_id, 'history', time_range, interval, agg, fill, wire_format, int(end // step))
+        start = end - hours * 3600
+
+        if has_data:
+            entry = cache.get(cache_key)
+            if entry:
+                return with_cache_headers(cached_body_response(entry), etag, cache_control), 200
+            generation = cache.generation(greenhouse_id)
+            timestamps, columns = query_history(greenhouse_id, start, end, step, agg, fill)
+            # Each bucket carries the anomalies of the readings inside it, looked up from ingest-time flags
+            anomalies = anomaly_labels(get_anomaly_detector().bucket_flags(greenhouse_id, timestamps, step))
+        else:
+            series = generate_historical_series(hours, interval)
+            timestamps = series.pop('timestamps')
+            columns = series
+            anomalies = None
+
+        message = 'Historical data retrieved successfully'
+
+        if wire_format == 'binary':
+            response = Response(encode_history_binary(timestamps, columns, step), mimetype=BINARY_MIMETYPE)
+        elif wire_format == 'columnar':
+            response = jsonify({
+                'success': True,
+                'message': message,
+                'data': {
+                    'range': time_range,
+                    'interval': interval,
+                    **encode_history_columnar(timestamps, columns, step, anomalies)
+                }
+            })
+            response.mimetype = COLUMNAR_MIMETYPE
+        elif len(timestamps) > STREAM_THRESHOLD_POINTS:
+            # Large ranges are serialized chunk by chunk instead of as one big list of dicts
+            response = Response(
+                stream_with_context(iter_history_json(message, time_range, interval, timestamps, columns, anomalies)),
+                mimetype='application/json'
+            )
+            return with_cache_headers(response, etag, cache_control)
+        else:
+            response = jsonify({
+                'success': True,
+                'message': message,
+                'data': {
+                    'range': time_range,
+                    'interval': interval,
+                    'readings': format_readings(timestamps, columns, anomalies)
+                }
+            })
+
+        if has_data:
+            entry = cache.put(cache_key, response.get_data(), response.mimetype, start, generation)
+            if entry:
+                response.compressed_variants = entry.compressed_variants
+        return with_cache_headers(response, etag, cache_control), 200
+
     except Exception as e:
         print(f"❌ Error getting historical data: {str(e)}")
         return jsonify({
@@ -65,46 +493,321 @@ def get_historical_data_route(current_user):
 @sensor_bp.route('/stats', methods=['GET'])
 @require_auth
 def get_stats(current_user):
-    """Get sensor statistics (min, max, avg)"""
+    """Get sensor statistics (min, max, avg, stddev) over a selectable period"""
     try:
-        historical_data = generate_historical_data(24, '1h')
-        
-        # Extract values
-        temperatures = [d['temperature'] for d in historical_data]
-        humidities = [d['humidity'] for d in historical_data]
-        soil_moistures = [d['soilMoisture'] for d in historical_data]
-        
-        # Calculate statistics
-        def calculate_stats(arr):
-            return {
-                'min': round(min(arr), 1),
-                'max': round(max(arr), 1),
-                'avg': round(sum(arr) / len(arr), 1)
+        greenhouse_id = get_greenhouse_id()
+        period = request.args.get('period', DEFAULT_STATS_PERIOD)
+
+        if period not in STATS_PERIODS:
+            return jsonify({
+                'success': False,
+                'error': f"Invalid period. Use one of: {', '.join(STATS_PERIODS)}"
+            }), 400
+
+        window_seconds, period_label = STATS_PERIODS[period]
+        wire_format = negotiate_format(request)
+
+        # Stats also change when the oldest window slot expires
+        slot_seconds = window_seconds / SLOTS_PER_WINDOW
+        etag = data_etag(
+            get_sensor_store().version(greenhouse_id), 'stats', greenhouse_id,
+            period, wire_format, int(time.time() // slot_seconds)
+        )
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        store = get_sensor_store()
+        has_data = store.has_data(greenhouse_id)
+        cache = get_query_cache()
+        end = time.time()
+        cache_key = (greenhouse_id, 'stats', period, wire_format, int(end // slot_seconds))
+
+        if has_data:
+            entry = cache.get(cache_key)
+            if entry:
+                return with_cache_headers(cached_body_response(entry), etag), 200
+            generation = cache.generation(greenhouse_id)
+
+        stats = get_sensor_stats().get(greenhouse_id, period)
+
+        if stats is None and has_data:
+            # History on disk from before a restart - one vectorized pass over the window
+            stats = summarize(store.query(greenhouse_id, end - window_seconds, end)[1])
+        elif stats is None:
+            # Nothing ingested yet - derive stats from demo history
+            stats = summarize(generate_historical_series(window_seconds // 3600, '1h'))
+
+        if wire_format == 'binary':
+            response = Response(encode_stats_binary(stats, window_seconds), mimetype=BINARY_MIMETYPE)
+        elif wire_format == 'columnar':
+            response = jsonify({
+                'success': True,
+                'message': 'Statistics retrieved successfully',
+                'data': {
+                    **encode_stats_columnar(stats),
+                    'period': period_label
+                }
+            })
+            response.mimetype = COLUMNAR_MIMETYPE
+        else:
+            def format_stats(field):
+                return {
+                    **{
+                        key: (round(value, 1) if isinstance(value, float) else value)
+                        for key, value in stats[field].items()
+                    },
+                    'unit': SENSOR_UNITS[field]
+                }
+
+            response = jsonify({
+                'success': True,
+                'message': 'Statistics retrieved successfully',
+                'data': {
+                    **{field: format_stats(field) for field in SENSOR_FIELDS},
+                    'period': period_label
+                }
+            })
+
+        if has_data:
+            entry = cache.put(cache_key, response.get_data(), response.mimetype, end - window_seconds, generation)
+            if entry:
+                response.compressed_variants = entry.compressed_variants
+        return with_cache_headers(response, etag), 200
+
+    except Exception as e:
+        print(f"❌ Error getting stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve statistics'
+        }), 500
+
+
+@sensor_bp.route('/alerts/rules', methods=['GET'])
+@require_auth
+def list_alert_rules(current_user):
+    """List the caller's alert rules of a greenhouse and whether each is currently firing"""
+    try:
+        greenhouse_id = get_greenhouse_id()
+
+        return jsonify({
+            'success': True,
+            'message': 'Alert rules retrieved successfully',
+            'data': {
+                'greenhouseId': greenhouse_id,
+                'rules': get_alert_engine().list_rules(greenhouse_id, owner=current_user['uid'])
             }
-        
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Error listing alert rules: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve alert rules'
+        }), 500
+
+
+def alert_recipients_allowed(current_user, recipients):
+    """
+    Alert mail only goes to addresses the caller has proven they own, so rules can't turn the
+    server into a relay. That is the account e-mail the caller signed in with (magic-link sign-in
+    proves it); there is no farm membership model yet to widen this to farm members.
+    """
+    email = current_user.get('email')
+    return bool(email) and all(recipient == email.strip().lower() for recipient in recipients)
+
+
+@sensor_bp.route('/alerts/rules', methods=['POST'])
+@require_auth
+def create_alert_rule(current_user):
+    """
+    Create a threshold rule, e.g. soilMoisture below 30 or temperature above 35 for 10m.
+    Alerts are e-mailed to `recipients`, defaulting to the current user; see alert_recipients_allowed().
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        greenhouse_id = data.get('greenhouseId', DEFAULT_GREENHOUSE_ID)
+        field = data.get('field')
+        condition = data.get('condition')
+        name = data.get('name')
+
+        if not isinstance(greenhouse_id, str) or not re.match(GREENHOUSE_ID_PATTERN, greenhouse_id):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid greenhouse id'
+            }), 400
+
+        if name is not None and (not isinstance(name, str) or len(name) > MAX_ALERT_NAME_LENGTH):
+            return jsonify({
+                'success': False,
+                'error': f'name must be a string of at most {MAX_ALERT_NAME_LENGTH} characters'
+            }), 400
+
+        if field not in SENSOR_FIELDS:
+            return jsonify({
+                'success': False,
+                'error': f"field must be one of: {', '.join(SENSOR_FIELDS)}"
+            }), 400
+
+        if condition not in ALERT_CONDITIONS:
+            return jsonify({
+                'success': False,
+                'error': f"condition must be one of: {', '.join(ALERT_CONDITIONS)}"
+            }), 400
+
+        try:
+            threshold = float(data['threshold'])
+            hysteresis = float(data.get('hysteresis', 0))
+            if not (math.isfinite(threshold) and math.isfinite(hysteresis)):
+                raise ValueError('not finite')
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'threshold must be a number'
+            }), 400
+
+        try:
+            duration_seconds = parse_duration(data.get('duration', 0), 0)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'duration must be a duration such as 30s, 15m or 1h'
+            }), 400
+
+        recipients = data.get('recipients') or [current_user.get('email')]
+        if not isinstance(recipients, list) or not all(isinstance(r, str) and '@' in r for r in recipients):
+            return jsonify({
+                'success': False,
+                'error': 'recipients must be a list of e-mail addresses'
+            }), 400
+
+        recipients = list(dict.fromkeys(recipient.strip().lower() for recipient in recipients))
+        if len(recipients) > MAX_ALERT_RECIPIENTS:
+            return jsonify({
+                'success': False,
+                'error': f'An alert rule can have at most {MAX_ALERT_RECIPIENTS} recipients'
+            }), 400
+
+        if not alert_recipients_allowed(current_user, recipients):
+            return jsonify({
+                'success': False,
+                'error': 'Alerts can only be sent to your own account e-mail address'
+            }), 403
+
+        engine = get_alert_engine()
+        if engine.count_rules(greenhouse_id) >= MAX_ALERT_RULES_PER_GREENHOUSE:
+            return jsonify({
+                'success': False,
+                'error': f'A greenhouse can have at most {MAX_ALERT_RULES_PER_GREENHOUSE} alert rules'
+            }), 400
+
+        rule = engine.add_rule(
+            greenhouse_id,
+            field,
+            condition,
+            threshold,
+            duration_seconds=duration_seconds,
+            hysteresis=hysteresis,
+            recipients=recipients,
+            name=name,
+            owner=current_user['uid']
+        )
+
+        return jsonify({
+            'success': True,
+            'message': 'Alert rule created successfully',
+            'data': rule
+        }), 201
+
+    except Exception as e:
+        print(f"❌ Error creating alert rule: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to create alert rule'
+        }), 500
+
+
+@sensor_bp.route('/alerts/rules/<rule_id>', methods=['DELETE'])
+@require_auth
+def delete_alert_rule(current_user, rule_id):
+    """Delete one of the caller's alert rules of the greenhouse given by ?greenhouse="""
+    try:
+        if not get_alert_engine().remove_rule(get_greenhouse_id(), rule_id, owner=current_user['uid']):
+            return jsonify({
+                'success': False,
+                'error': 'Alert rule not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'message': 'Alert rule deleted successfully'
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Error deleting alert rule: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to delete alert rule'
+        }), 500
+
+
+@sensor_bp.route('/alerts', methods=['GET'])
+@require_auth
+def list_alerts(current_user):
+    """Recently fired and resolved alerts of the caller's rules on a greenhouse, newest first"""
+    try:
+        greenhouse_id = get_greenhouse_id()
+
         return jsonify({
             'success': True,
-            'message': 'Statistics retrieved successfully',
+            'message': 'Alerts retrieved successfully',
             'data': {
-                'temperature': {
-                    **calculate_stats(temperatures),
-                    'unit': '°C'
-                },
-                'humidity': {
-                    **calculate_stats(humidities),
-                    'unit': '%'
-                },
-                'soilMoisture': {
-                    **calculate_stats(soil_moistures),
-                    'unit': '%'
-                },
-                'period': '24 hours'
+                'greenhouseId': greenhouse_id,
+                'alerts': get_alert_engine().recent_alerts(greenhouse_id, owner=current_user['uid'])
             }
         }), 200
-        
+
     except Exception as e:
-        print(f"❌ Error getting stats: {str(e)}")
+        print(f"❌ Error listing alerts: {str(e)}")
         return jsonify({
             'success': False,
-            'error': 'Failed to retrieve statistics'
-        }), 500
\ No newline at end of file
+            'error': 'Failed to retrieve alerts'
+        }), 500
+
+
+@sensor_bp.route('/sync', methods=['GET'])
+@require_auth
+def get_sync_status(current_user):
+    """Firestore write-behind metrics: pending readings, flush lag, throughput and failures"""
+    try:
+        return jsonify({
+            'success': True,
+            'message': 'Sync status retrieved successfully',
+            'data': get_firestore_writer().stats()
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Error getting sync status: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve sync status'
+        }), 500
+
+
+@sensor_bp.route('/cache', methods=['GET'])
+@require_auth
+def get_cache_stats(current_user):
+    """Query cache counters (hits, misses, evictions, invalidations) for sizing the cache"""
+    try:
+        return jsonify({
+            'success': True,
+            'message': 'Cache statistics retrieved successfully',
+            'data': get_query_cache().stats()
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Error getting cache statistics: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve cache statistics'
+        }), 500
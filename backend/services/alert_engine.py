@@ -0,0 +1,263 @@
+# services/alert_engine.py
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+from services.sensor_store import get_sensor_store, SENSOR_FIELDS, SENSOR_UNITS
+from services.email_service import send_sensor_alert_email
+from utils.time_utils import format_timestamp
+
+ALERT_CONDITIONS = ('above', 'below')
+
+# A rule that fired is not e-mailed again until this long after its last notification
+ALERT_COOLDOWN_SECONDS = int(os.getenv('SENSOR_ALERT_COOLDOWN_SECONDS', '1800'))
+
+ALERT_HISTORY_SIZE = 200     # fired/resolved alerts kept per greenhouse
+
+# Upper bound on the rules x readings matrix evaluated at once; larger batches are walked in chunks
+EVALUATION_CELLS = 1 << 20
+
+
+class RuleSet:
+    """
+    All rules of one greenhouse as parallel arrays, so a batch is checked against every rule
+    in one vectorized pass. Per-rule state (breached, breach start, fired) carries across batches.
+    """
+
+    def __init__(self):
+        self.rules = []
+        self._rebuild([])
+
+    def _rebuild(self, previous):
+        """Re-pack rule parameters into arrays, keeping the state of rules that survive"""
+        state = {rule['id']: i for i, rule in enumerate(previous)}
+        old = (self.breached, self.breach_start, self.fired, self.notified_at) if previous else None
+
+        count = len(self.rules)
+        self.field_index = np.array([SENSOR_FIELDS.index(rule['field']) for rule in self.rules], dtype=np.int64)
+        # Flip 'below' rules so every comparison is "value > threshold"
+        self.sign = np.array([1.0 if rule['condition'] == 'above' else -1.0 for rule in self.rules])
+        self.enter = self.sign * np.array([rule['threshold'] for rule in self.rules], dtype=np.float64)
+        self.exit = self.enter - np.array([rule['hysteresis'] for rule in self.rules], dtype=np.float64)
+        self.duration = np.array([rule['durationSeconds'] for rule in self.rules], dtype=np.float64)
+
+        self.breached = np.zeros(count, dtype=bool)
+        self.breach_start = np.full(count, np.nan)
+        self.fired = np.zeros(count, dtype=bool)
+        self.notified_at = np.full(count, -np.inf)
+        if old:
+            for i, rule in enumerate(self.rules):
+                j = state.get(rule['id'])
+                if j is not None:
+                    self.breached[i], self.breach_start[i], self.fired[i], self.notified_at[i] = (
+                        old[0][j], old[1][j], old[2][j], old[3][j]
+                    )
+
+    def add(self, rule):
+        previous = list(self.rules)
+        self.rules.append(rule)
+        self._rebuild(previous)
+
+    def remove(self, rule_id, owner=None):
+        previous = list(self.rules)
+        self.rules = [
+            rule for rule in self.rules
+            if rule['id'] != rule_id or (owner is not None and rule['createdBy'] != owner)
+        ]
+        if len(self.rules) == len(previous):
+            return False
+        self._rebuild(previous)
+        return True
+
+    def evaluate(self, timestamps, values):
+        """
+        Advance every rule over a time-ordered batch.
+        Returns (fired, resolved) as lists of (rule index, batch position).
+        """
+        count = len(self.rules)
+        if count == 0 or len(timestamps) == 0:
+            return [], []
+
+        fired, resolved = [], []
+        chunk = max(1, EVALUATION_CELLS // count)
+        for offset in range(0, len(timestamps), chunk):
+            window = slice(offset, offset + chunk)
+            chunk_fired, chunk_resolved = self._advance(
+                np.asarray(timestamps[window], dtype=np.float64),
+                {field: values[field][window] for field in SENSOR_FIELDS}
+            )
+            fired.extend((i, offset + j) for i, j in chunk_fired)
+            resolved.extend((i, offset + j) for i, j in chunk_resolved)
+        return fired, resolved
+
+    def _advance(self, timestamps, values):
+        positions = np.arange(len(timestamps))
+        matrix = np.stack([np.asarray(values[field], dtype=np.float64) for field in SENSOR_FIELDS])
+        signed = self.sign[:, None] * matrix[self.field_index]              # (rules, readings)
+
+        # Hysteresis: crossing `enter` starts a breach, dropping below `exit` ends it,
+        # anything in between (or NaN) keeps the previous state
+        events = np.where(signed > self.enter[:, None], 1, np.where(signed < self.exit[:, None], -1, 0))
+        last_event = np.maximum.accumulate(np.where(events != 0, positions, -1), axis=1)
+        breached = np.where(
+            last_event >= 0,
+            np.take_along_axis(events, np.maximum(last_event, 0), axis=1) > 0,
+            self.breached[:, None]
+        )
+
+        # Start time of the breach each reading belongs to
+        previous = np.concatenate((self.breached[:, None], breached[:, :-1]), axis=1)
+        last_rise = np.maximum.accumulate(np.where(breached & ~previous, positions, -1), axis=1)
+        breach_start = np.where(last_rise >= 0, timestamps[np.maximum(last_rise, 0)], self.breach_start[:, None])
+
+        # A rule fires once per breach, on the first reading that has lasted `duration`
+        held = breached & (timestamps[None, :] - breach_start >= self.duration[:, None])
+        held_before = np.concatenate((self.fired[:, None], held[:, :-1]), axis=1)
+        fired = np.argwhere(held & ~held_before)
+        resolved = np.argwhere(~breached & previous & held_before)
+
+        self.breached = breached[:, -1].copy()
+        self.breach_start = np.where(self.breached, breach_start[:, -1], np.nan)
+        self.fired = held[:, -1].copy()
+        return fired.tolist(), resolved.tolist()
+
+
+class AlertEngine:
+    """
+    Evaluates alert rules on every ingested batch and queues e-mails for fired alerts.
+    Rules belong to the uid that created them; with an owner, listing and removal only see that
+    user's rules and alerts (there is no greenhouse ownership model to widen this to yet).
+    """
+
+    def __init__(self, cooldown_seconds=ALERT_COOLDOWN_SECONDS):
+        self.cooldown_seconds = cooldown_seconds
+        self._rule_sets = {}
+        self._history = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._outbox = queue.Queue()
+        self._worker = None
+
+    def _state_for(self, greenhouse_id):
+        lock = self._locks.get(greenhouse_id)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(greenhouse_id, threading.Lock())
+                self._rule_sets.setdefault(greenhouse_id, RuleSet())
+                self._history.setdefault(greenhouse_id, deque(maxlen=ALERT_HISTORY_SIZE))
+        return lock, self._rule_sets[greenhouse_id], self._history[greenhouse_id]
+
+    def add_rule(self, greenhouse_id, field, condition, threshold, duration_seconds=0,
+                 hysteresis=0.0, recipients=None, name=None, owner=None):
+        rule = {
+            'id': uuid.uuid4().hex,
+            'greenhouseId': greenhouse_id,
+            'name': name or f"{field} {condition} {threshold}",
+            'field': field,
+            'condition': condition,
+            'threshold': float(threshold),
+            'durationSeconds': int(duration_seconds),
+            'hysteresis': abs(float(hysteresis)),
+            'recipients': list(recipients or []),
+            'createdBy': owner,
+            'createdAt': format_timestamp(time.time())
+        }
+        lock, rule_set, _ = self._state_for(greenhouse_id)
+        with lock:
+            rule_set.add(rule)
+        return rule
+
+    def remove_rule(self, greenhouse_id, rule_id, owner=None):
+        lock, rule_set, _ = self._state_for(greenhouse_id)
+        with lock:
+            return rule_set.remove(rule_id, owner)
+
+    def count_rules(self, greenhouse_id):
+        lock, rule_set, _ = self._state_for(greenhouse_id)
+        with lock:
+            return len(rule_set.rules)
+
+    def list_rules(self, greenhouse_id, owner=None):
+        """Rules without their recipients, each with whether it is currently firing"""
+        lock, rule_set, _ = self._state_for(greenhouse_id)
+        with lock:
+            return [
+                {**{key: value for key, value in rule.items() if key != 'recipients'}, 'active': bool(breached and fired)}
+                for rule, breached, fired in zip(rule_set.rules, rule_set.breached, rule_set.fired)
+                if owner is None or rule['createdBy'] == owner
+            ]
+
+    def recent_alerts(self, greenhouse_id, owner=None):
+        lock, _, history = self._state_for(greenhouse_id)
+        with lock:
+            return [alert for rule_owner, alert in reversed(history) if owner is None or rule_owner == owner]
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """Store listener: runs under the shard lock, so e-mails are only queued here"""
+        lock, rule_set, history = self._state_for(greenhouse_id)
+        with lock:
+            fired, resolved = rule_set.evaluate(timestamps, values)
+            if not fired and not resolved:
+                return
+
+            events = [('fired', i, j) for i, j in fired] + [('resolved', i, j) for i, j in resolved]
+            events.sort(key=lambda event: event[2])
+
+            notify = {}
+            for status, i, j in events:
+                rule = rule_set.rules[i]
+                alert = {
+                    'ruleId': rule['id'],
+                    'name': rule['name'],
+                    'status': status,
+                    'field': rule['field'],
+                    'condition': rule['condition'],
+                    'threshold': rule['threshold'],
+                    'value': round(float(values[rule['field']][j]), 1),
+                    'unit': SENSOR_UNITS[rule['field']],
+                    'timestamp': format_timestamp(timestamps[j])
+                }
+                history.append((rule['createdBy'], alert))
+
+                # Dedup: one e-mail per rule per cooldown, however often it flaps
+                if status != 'fired' or timestamps[j] - rule_set.notified_at[i] < self.cooldown_seconds:
+                    continue
+                rule_set.notified_at[i] = timestamps[j]
+                for recipient in rule['recipients']:
+                    notify.setdefault(recipient, {})[rule['id']] = alert
+
+        # Coalesce everything a recipient should hear about from this batch into one e-mail
+        for recipient, alerts in notify.items():
+            self._outbox.put((recipient, greenhouse_id, list(alerts.values())))
+        if notify:
+            self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._deliver, name='alert-mailer', daemon=True)
+                self._worker.start()
+
+    def _deliver(self):
+        while True:
+            recipient, greenhouse_id, alerts = self._outbox.get()
+            try:
+                send_sensor_alert_email(recipient, greenhouse_id, alerts)
+            except Exception as e:
+                print(f"❌ Alert e-mail error: {str(e)}")
+
+
+# Global instance
+alert_engine = AlertEngine()
+get_sensor_store().add_listener(alert_engine.on_ingest)
+
+
+def get_alert_engine():
+    return alert_engine
@@ -0,0 +1,239 @@
+# services/anomaly_detector.py
+import os
+import threading
+import numpy as np
+
+from services.sensor_store import get_sensor_store, SENSOR_FIELDS
+
+# Anomaly kinds; a reading's flags hold one bit per (field, kind)
+ANOMALY_KINDS = ('spike', 'stuck', 'drift')
+
+FAST_ALPHA = 0.05          # ~20-reading memory: what "normal right now" looks like
+SLOW_ALPHA = 0.002         # ~500-reading baseline the fast mean is compared against for drift
+SPIKE_SIGMAS = 4.0
+DRIFT_SIGMAS = 3.0
+WARMUP_READINGS = 30       # no spike/drift flags until the statistics have settled
+DRIFT_WARMUP_READINGS = 500
+STUCK_READINGS = int(os.getenv('SENSOR_STUCK_READINGS', '20'))
+
+# Floor for the standard deviation so a very steady sensor doesn't flag 0.1-unit wobbles
+MIN_STDDEV = {'temperature': 0.3, 'humidity': 1.0, 'soilMoisture': 1.0}
+
+FILTER_BLOCK = 256         # keeps decay ** -i well inside float64 range
+
+# Flagged readings kept per greenhouse (10 bytes each); past this the oldest half is dropped
+FLAG_LOG_MAX_ENTRIES = int(os.getenv('SENSOR_ANOMALY_LOG_ENTRIES', '262144'))
+
+
+def flag_bit(field, kind):
+    return 1 << (SENSOR_FIELDS.index(field) * len(ANOMALY_KINDS) + ANOMALY_KINDS.index(kind))
+
+
+def describe(flags):
+    """Turn a flag word into {'temperature': ['spike'], ...}, or None for a normal reading"""
+    flags = int(flags)
+    if not flags:
+        return None
+    result = {}
+    for field in SENSOR_FIELDS:
+        kinds = [kind for kind in ANOMALY_KINDS if flags & flag_bit(field, kind)]
+        if kinds:
+            result[field] = kinds
+    return result
+
+
+def labels(flags):
+    """describe() for a whole flag array; normal readings map to None without a Python call each"""
+    result = [None] * len(flags)
+    for i in np.flatnonzero(flags).tolist():
+        result[i] = describe(flags[i])
+    return result
+
+
+def linear_filter(inputs, decay, initial):
+    """
+    y_t = decay * y_(t-1) + inputs_t for a whole batch without a Python loop per reading.
+    Uses y_t = decay^t * (y_0 + sum(decay^-i * inputs_i)) in blocks to stay in float64 range.
+    """
+    out = np.empty(len(inputs))
+    powers = decay ** -np.arange(1, FILTER_BLOCK + 1, dtype=np.float64)
+    y = initial
+    for start in range(0, len(inputs), FILTER_BLOCK):
+        chunk = inputs[start:start + FILTER_BLOCK]
+        scale = powers[:len(chunk)]
+        block = (y + np.cumsum(chunk * scale)) / scale
+        out[start:start + len(chunk)] = block
+        y = block[-1]
+    return out
+
+
+class FieldState:
+    """Running statistics of one sensor: O(1) state carried from batch to batch"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.slow_mean = 0.0
+        self.slow_var = 0.0
+        self.last_value = None
+        self.run_length = 0
+
+    def update(self, field, values):
+        """Advance the statistics over a batch; returns the batch's flags for this field"""
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        flags = np.zeros(n, dtype=np.uint16)
+
+        if self.count == 0:
+            # Seed the averages with the very first reading
+            self.mean = self.slow_mean = float(values[0])
+
+        # Fast and slow EWMA mean/variance; each reading is tested against the state *before* it
+        mean = linear_filter(FAST_ALPHA * values, 1 - FAST_ALPHA, self.mean)
+        prev_mean = np.r_[self.mean, mean[:-1]]
+        var = linear_filter((1 - FAST_ALPHA) * FAST_ALPHA * (values - prev_mean) ** 2, 1 - FAST_ALPHA, self.var)
+        prev_var = np.r_[self.var, var[:-1]]
+
+        slow_mean = linear_filter(SLOW_ALPHA * values, 1 - SLOW_ALPHA, self.slow_mean)
+        prev_slow_mean = np.r_[self.slow_mean, slow_mean[:-1]]
+        slow_var = linear_filter((1 - SLOW_ALPHA) * SLOW_ALPHA * (values - prev_slow_mean) ** 2, 1 - SLOW_ALPHA, self.slow_var)
+
+        seen = self.count + np.arange(n)      # readings seen before each one
+        floor = MIN_STDDEV.get(field, 0.0)
+
+        spike = (seen >= WARMUP_READINGS) & (np.abs(values - prev_mean) > SPIKE_SIGMAS * np.maximum(np.sqrt(prev_var), floor))
+        # Drift is measured in units of short-term noise: the slow variance absorbs a level shift within a few dozen readings
+        drift = (seen >= DRIFT_WARMUP_READINGS) & (np.abs(mean - slow_mean) > DRIFT_SIGMAS * np.maximum(np.sqrt(var), floor))
+
+        # Stuck: length of the run of identical values each reading belongs to, continuing the last batch's run
+        same = np.r_[values[0] == self.last_value, values[1:] == values[:-1]]
+        run_start = np.maximum.accumulate(np.where(same, -1, np.arange(n)))
+        run_length = np.where(run_start < 0, self.run_length + np.arange(n) + 1, np.arange(n) - run_start + 1)
+        stuck = run_length >= STUCK_READINGS
+
+        flags[spike] |= flag_bit(field, 'spike')
+        flags[stuck] |= flag_bit(field, 'stuck')
+        flags[drift] |= flag_bit(field, 'drift')
+
+        self.count += n
+        self.mean, self.var = float(mean[-1]), float(var[-1])
+        self.slow_mean, self.slow_var = float(slow_mean[-1]), float(slow_var[-1])
+        self.last_value = float(values[-1])
+        self.run_length = int(run_length[-1])
+        return flags
+
+
+class FlagLog:
+    """
+    Timestamps and flag words of anomalous readings only - normal readings cost nothing.
+    Bounded: once max_entries is exceeded only the newest max_entries // 2 are kept, so a sensor
+    that is anomalous all the time can't grow memory without limit, and trimming stays amortized.
+    """
+
+    def __init__(self, capacity=64, max_entries=FLAG_LOG_MAX_ENTRIES):
+        self.size = 0
+        self.max_entries = max_entries
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.flags = np.empty(capacity, dtype=np.uint16)
+
+    def append(self, timestamps, flags):
+        needed = self.size + len(timestamps)
+        if needed > self.max_entries:
+            keep = self.max_entries // 2
+            # New arrays, like growing: readers may hold the old ones
+            self.timestamps = np.concatenate((self.timestamps[:self.size], timestamps))[-keep:]
+            self.flags = np.concatenate((self.flags[:self.size], flags))[-keep:]
+            self.size = len(self.timestamps)
+            return
+        if needed > len(self.timestamps):
+            capacity = max(needed, 2 * len(self.timestamps))
+            # Copy instead of resizing in place; readers may hold the old arrays
+            grown_timestamps = np.empty(capacity, dtype=np.float64)
+            grown_flags = np.empty(capacity, dtype=np.uint16)
+            grown_timestamps[:self.size] = self.timestamps[:self.size]
+            grown_flags[:self.size] = self.flags[:self.size]
+            self.timestamps, self.flags = grown_timestamps, grown_flags
+        self.timestamps[self.size:needed] = timestamps
+        self.flags[self.size:needed] = flags
+        self.size = needed
+
+    def snapshot(self):
+        size = self.size
+        return self.timestamps[:size], self.flags[:size]
+
+
+class AnomalyDetector:
+    """Flags spikes, stuck values and drift per sensor as readings are ingested"""
+
+    def __init__(self):
+        self._states = {}
+        self._logs = {}
+        self._lock = threading.Lock()
+
+    def _state_for(self, greenhouse_id):
+        states = self._states.get(greenhouse_id)
+        if states is None:
+            with self._lock:
+                states = self._states.setdefault(greenhouse_id, {field: FieldState() for field in SENSOR_FIELDS})
+                self._logs.setdefault(greenhouse_id, FlagLog())
+        return states, self._logs[greenhouse_id]
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """Store listener: runs under the shard lock, so batches arrive in order for each greenhouse"""
+        states, log = self._state_for(greenhouse_id)
+        flags = np.zeros(len(timestamps), dtype=np.uint16)
+        for field in SENSOR_FIELDS:
+            flags |= states[field].update(field, values[field])
+
+        flagged = np.flatnonzero(flags)
+        if len(flagged):
+            log.append(np.asarray(timestamps)[flagged], flags[flagged])
+
+    def reading_flags(self, greenhouse_id, timestamps):
+        """Flag word of each raw reading (exact timestamp match)"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        result = np.zeros(len(timestamps), dtype=np.uint16)
+        log = self._logs.get(greenhouse_id)
+        if log is None or len(timestamps) == 0:
+            return result
+
+        flagged_timestamps, flags = log.snapshot()
+        index = np.minimum(np.searchsorted(flagged_timestamps, timestamps), max(len(flagged_timestamps) - 1, 0))
+        if len(flagged_timestamps):
+            match = flagged_timestamps[index] == timestamps
+            result[match] = flags[index[match]]
+        return result
+
+    def bucket_flags(self, greenhouse_id, bucket_starts, step):
+        """OR of the flags of every reading inside each [start, start + step) bucket"""
+        bucket_starts = np.asarray(bucket_starts, dtype=np.float64)
+        result = np.zeros(len(bucket_starts), dtype=np.uint16)
+        log = self._logs.get(greenhouse_id)
+        if log is None or len(bucket_starts) == 0:
+            return result
+
+        flagged_timestamps, flags = log.snapshot()
+        lo = np.searchsorted(flagged_timestamps, bucket_starts, side='left')
+        hi = np.searchsorted(flagged_timestamps, bucket_starts + step, side='left')
+        nonempty = np.flatnonzero(hi > lo)
+        if len(nonempty) == 0:
+            return result
+
+        # reduceat over [lo0, hi0, lo1, hi1, ...]: even slots OR each bucket's flags, odd slots
+        # (the gaps between buckets) are discarded. A final hi at the end of the log is left
+        # out, since reduceat indices must be in range and the last slice runs to the end anyway.
+        bounds = np.column_stack((lo[nonempty], hi[nonempty])).ravel()
+        if bounds[-1] == len(flags):
+            bounds = bounds[:-1]
+        result[nonempty] = np.bitwise_or.reduceat(flags, bounds)[::2]
+        return result
+
+
+# Global instance
+anomaly_detector = AnomalyDetector()
+get_sensor_store().add_listener(anomaly_detector.on_ingest)
+
+
+def get_anomaly_detector():
+    return anomaly_detector
@@ -4,6 +4,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from datetime import datetime
+from html import escape
 
 
 # ---------------------------------------------------------------------------
@@ -284,3 +285,44 @@ def send_security_notification(email, message):
     </html>
     """
     return send_email(email, subject, body)
+
+
+# ---------------------------------------------------------------------------
+# 🌡️ Sensor Threshold Alert
+# ---------------------------------------------------------------------------
+def send_sensor_alert_email(email, greenhouse_id, alerts):
+    """
+    Send one e-mail listing every alert rule that fired for a greenhouse in an ingest batch.
+    Each alert is a dict with name, field, condition, threshold, value, unit and timestamp.
+    """
+    subject = f"🚨 Sensor Alert: {greenhouse_id} - ShambaSecure"
+    # Rule names and ids come from API clients; escape everything that goes into the HTML
+    greenhouse_id = escape(str(greenhouse_id))
+    alerts = [{key: escape(str(value)) for key, value in alert.items()} for alert in alerts]
+    rows = "".join(
+        f"""
+            <tr><td style="padding: 10px; border: 1px solid #ddd;"><strong>{alert['name']}</strong></td>
+                <td style="padding: 10px; border: 1px solid #ddd;">{alert['value']}{alert['unit']} ({alert['condition']} {alert['threshold']}{alert['unit']})</td>
+                <td style="padding: 10px; border: 1px solid #ddd;">{alert['timestamp']}</td></tr>"""
+        for alert in alerts
+    )
+    body = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: #ff6b6b; padding: 30px; text-align: center;">
+          <h1 style="color: white;">🚨 Sensor Alert</h1>
+        </div>
+        <div style="padding: 30px; background: #f9f9f9;">
+          <h2>Greenhouse {greenhouse_id}</h2>
+          <p>The following readings crossed your alert thresholds:</p>
+          <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">{rows}
+          </table>
+          <p>You will not be alerted again for the same rule for a while, even if the reading keeps crossing the threshold.</p>
+        </div>
+        <div style="background: #333; color: white; padding: 20px; text-align: center;">
+          <p>ShambaSecure Team</p>
+        </div>
+      </body>
+    </html>
+    """
+    return send_email(email, subject, body)
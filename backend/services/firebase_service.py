@@ -2,10 +2,24 @@
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 import os
+import threading
+import time
+
+from services.id_token_cache import get_id_token_cache
 
 # Global instances
 firebase_app = None
 db = None
+key_refresher = None
+
+# Google's ID-token signing certificates (served with a max-age of several hours)
+ID_TOKEN_CERT_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+KEY_REFRESH_SECONDS = float(os.getenv('FIREBASE_KEY_REFRESH_SECONDS', '3600'))
+KEY_RETRY_SECONDS = 60
+
+# Pre-warming reaches into firebase_admin internals (not public API, see refresh_signing_keys), so it
+# only runs on the version pinned in requirements.txt; on any other the SDK fetches keys on demand
+KEY_PREWARM_FIREBASE_ADMIN_VERSION = '6.3.0'
 
 
 def initialize_firebase():
@@ -19,6 +33,7 @@ def initialize_firebase():
             if db is None:
                 db = firestore.client()
             print("ℹ️ Firebase Admin already initialized.")
+            start_key_refresher()
             return firebase_app
 
         # Load service account credentials path
@@ -37,6 +52,7 @@ def initialize_firebase():
         db = firestore.client()
 
         print("✅ Firebase Admin initialized successfully!")
+        start_key_refresher()
         return firebase_app
 
     except Exception as e:
@@ -59,15 +75,77 @@ def get_auth():
     return auth
 
 
+def key_prewarm_supported():
+    return firebase_admin.__version__ == KEY_PREWARM_FIREBASE_ADMIN_VERSION
+
+
+def refresh_signing_keys(app=None):
+    """
+    Fetch Google's public signing keys into the token verifier's HTTP cache.
+    The request bypasses the cached copy, so the keys are replaced before they go stale
+    and verify_id_token never has to fetch them itself.
+    """
+    if not key_prewarm_supported():
+        raise RuntimeError(f"Signing key pre-warming needs firebase-admin {KEY_PREWARM_FIREBASE_ADMIN_VERSION}")
+
+    # firebase_admin keeps its cache-control aware fetcher on the auth client's token verifier; the
+    # public google.auth transport can't be used instead, as verify_id_token would not see its cache
+    client = auth._get_client(app or firebase_admin.get_app())
+    fetch = client._token_verifier.request
+    response = fetch(ID_TOKEN_CERT_URL, headers={'Cache-Control': 'no-cache'})
+    if response.status != 200:
+        raise Exception(f"Signing key fetch returned HTTP {response.status}")
+
+
+class KeyRefresher(threading.Thread):
+    """Daemon thread that pre-warms the signing keys at startup and refreshes them periodically"""
+
+    def __init__(self, interval_seconds=KEY_REFRESH_SECONDS):
+        super().__init__(name='firebase-key-refresher', daemon=True)
+        self.interval_seconds = interval_seconds
+        self.last_refresh = None
+
+    def run(self):
+        while True:
+            try:
+                refresh_signing_keys()
+                self.last_refresh = time.time()
+                delay = self.interval_seconds
+            except Exception as e:
+                print(f"❌ Signing key refresh failed: {str(e)}")
+                delay = KEY_RETRY_SECONDS
+            time.sleep(delay)
+
+
+def start_key_refresher():
+    """Start the signing key refresher once per process; None if this firebase-admin isn't supported"""
+    global key_refresher
+    if not key_prewarm_supported():
+        print(f"ℹ️ Signing key pre-warming needs firebase-admin {KEY_PREWARM_FIREBASE_ADMIN_VERSION} "
+              f"(found {firebase_admin.__version__}); keys are fetched on first verification instead")
+        return None
+    if key_refresher is None:
+        key_refresher = KeyRefresher()
+        key_refresher.start()
+    return key_refresher
+
+
 def verify_id_token(id_token):
-    """Verify Firebase ID token."""
+    """Verify Firebase ID token. Verified claims are cached until the token expires."""
+    cache = get_id_token_cache()
+    decoded_token = cache.get(id_token)
+    if decoded_token is not None:
+        return decoded_token
+
     try:
         auth_instance = get_auth()
         decoded_token = auth_instance.verify_id_token(id_token)
-        return decoded_token
     except Exception as e:
         raise Exception(f"Token verification failed: {str(e)}")
 
+    cache.put(id_token, decoded_token)
+    return decoded_token
+
 
 def get_user_by_email(email):
     """Retrieve Firebase user by email."""
@@ -0,0 +1,373 @@
+# services/firestore_writer.py
+import fcntl
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from services.sensor_store import get_sensor_store, SENSOR_FIELDS
+from services.segment_store import RECORD_DTYPE
+from utils.time_utils import format_timestamps
+
+# Opt in with SENSOR_FIRESTORE_SYNC=1; ingest never waits on Firestore either way
+FIRESTORE_SYNC_ENABLED = os.getenv('SENSOR_FIRESTORE_SYNC', '').lower() in ('1', 'true', 'yes')
+
+FIRESTORE_BATCH_LIMIT = 500                                  # Firestore's maximum writes per batch
+FLUSH_INTERVAL_SECONDS = float(os.getenv('SENSOR_FIRESTORE_FLUSH_SECONDS', '5'))
+MAX_RETRY_SECONDS = 60
+# Past this many unflushed readings new batches are not journaled or queued, so an outage can't grow
+# memory or the journal without limit (~24 bytes each in both); they stay in the sensor store
+MAX_PENDING_READINGS = int(os.getenv('SENSOR_FIRESTORE_MAX_PENDING', '1000000'))
+
+# Each process journals to JOURNAL_PATH.<pid>, so gunicorn workers never truncate each other's frames
+JOURNAL_PATH = os.getenv(
+    'SENSOR_FIRESTORE_JOURNAL',
+    os.path.join(os.getenv('SENSOR_DATA_DIR') or '.', 'firestore_journal.bin')
+)
+
+# Journal frame: greenhouse id length, record count, then the id and JOURNAL_DTYPE records.
+# seq numbers readings of one greenhouse that share a millisecond, so their document ids differ.
+FRAME_HEADER = struct.Struct('<HI')
+JOURNAL_DTYPE = np.dtype(RECORD_DTYPE.descr + [('seq', '<u4')])
+
+
+def document_id(timestamp_ms, seq):
+    """Readings document id: the millisecond timestamp, suffixed when several readings share it"""
+    return str(timestamp_ms) if seq == 0 else f'{timestamp_ms}-{seq}'
+
+
+def read_frames(journal, offset, record_dtype=JOURNAL_DTYPE):
+    """
+    Parse whole frames from offset on. Returns ([(greenhouse_id, records, frame_end)], end of the last whole frame);
+    a torn trailing frame from a crash mid-write was never acknowledged by ingest and is left out.
+    """
+    frames = []
+    while offset + FRAME_HEADER.size <= len(journal):
+        id_length, count = FRAME_HEADER.unpack_from(journal, offset)
+        end = offset + FRAME_HEADER.size + id_length + count * record_dtype.itemsize
+        if end > len(journal):
+            break
+        greenhouse_id = journal[offset + FRAME_HEADER.size:offset + FRAME_HEADER.size + id_length].decode()
+        records = np.frombuffer(journal, dtype=record_dtype, count=count,
+                                offset=offset + FRAME_HEADER.size + id_length)
+        if record_dtype != JOURNAL_DTYPE:
+            # Journals written before readings carried a seq
+            upgraded = np.zeros(count, dtype=JOURNAL_DTYPE)
+            for name in record_dtype.names:
+                upgraded[name] = records[name]
+            records = upgraded
+        frames.append((greenhouse_id, records.copy(), end))
+        offset = end
+    return frames, offset
+
+
+def read_checkpoint(checkpoint_path):
+    try:
+        with open(checkpoint_path) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+class PendingBatch:
+    """Readings of one ingested batch still waiting for Firestore, plus where its journal frame ends"""
+
+    def __init__(self, greenhouse_id, records, journal_end, enqueued_at):
+        self.greenhouse_id = greenhouse_id
+        self.records = records
+        self.journal_end = journal_end
+        self.enqueued_at = enqueued_at
+
+
+class FirestoreWriter:
+    """
+    Write-behind buffer between the sensor store and Firestore.
+    Accepted batches are appended to this process's journal and queued; a background thread commits
+    them with batched writes of up to 500 documents whenever the buffer fills or the flush interval passes.
+    Document ids are the reading's millisecond timestamp plus the seq stored in the journal, so replaying
+    the journal after a crash is idempotent. Journals left by dead processes are adopted on start().
+    """
+
+    def __init__(self, journal_path=JOURNAL_PATH, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 batch_limit=FIRESTORE_BATCH_LIMIT, client_factory=None, max_pending=MAX_PENDING_READINGS):
+        self.journal_base = journal_path
+        self.journal_path = None
+        self.checkpoint_path = None
+        self.flush_interval = flush_interval
+        self.batch_limit = batch_limit
+        self.max_pending = max_pending
+        self._client_factory = client_factory
+        self._pending = deque()
+        self._pending_count = 0
+        self._dropping = False
+        self._condition = threading.Condition()
+        self._journal_size = 0
+        self._fd = None
+        self._thread = None
+        self._last_ids = {}        # greenhouse id -> (timestamp ms, seq) of its newest journaled reading
+        self.metrics = {
+            'flushedReadings': 0,
+            'flushedBatches': 0,
+            'failedBatches': 0,
+            'droppedReadings': 0,
+            'lastFlushAt': None,
+            'lastFlushSeconds': None,
+            'readingsPerSecond': None,
+        }
+
+    def start(self):
+        """Replay this process's journal, adopt journals of dead processes, then start the flusher thread"""
+        directory = os.path.dirname(self.journal_base)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.journal_path = f'{self.journal_base}.{os.getpid()}'
+        self.checkpoint_path = self.journal_path + '.checkpoint'
+        while True:
+            self._fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            # Held for the life of the process; a journal whose lock can be taken belongs to nobody.
+            # Blocks while another worker adopts a journal left under this pid, which it then deletes.
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            if os.fstat(self._fd).st_nlink:
+                break
+            os.close(self._fd)
+        self._replay()
+        self._adopt_orphans()
+
+        self._thread = threading.Thread(target=self._run, name='firestore-writer', daemon=True)
+        self._thread.start()
+
+    def _write_checkpoint(self, offset):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _replay(self):
+        """Queue frames of our own journal (left by an earlier process with the same pid) beyond its checkpoint"""
+        with open(self.journal_path, 'rb') as f:
+            journal = f.read()
+        frames, offset = read_frames(journal, min(read_checkpoint(self.checkpoint_path), len(journal)))
+
+        replayed = 0
+        for greenhouse_id, records, end in frames:
+            self._queue(greenhouse_id, records, end)
+            replayed += len(records)
+
+        if offset < len(journal):
+            os.truncate(self.journal_path, offset)
+        self._journal_size = offset
+        if replayed:
+            print(f"ℹ️ Replaying {replayed} unflushed readings from {self.journal_path}")
+
+    def _orphan_journals(self):
+        """(path, record dtype) of journals other than ours: per-pid ones and the old shared journal"""
+        directory = os.path.dirname(self.journal_base) or '.'
+        prefix = os.path.basename(self.journal_base) + '.'
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if path == self.journal_path:
+                continue
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                yield path, JOURNAL_DTYPE
+            elif path == self.journal_base:
+                yield path, RECORD_DTYPE
+
+    def _adopt_orphans(self):
+        """Move unflushed frames of journals whose process has exited into ours, then delete them"""
+        for path, record_dtype in self._orphan_journals():
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue    # its worker is still running
+                if os.fstat(fd).st_nlink == 0:
+                    continue    # another worker adopted it while we waited for the lock
+
+                with open(path, 'rb') as f:
+                    journal = f.read()
+                checkpoint_path = path + '.checkpoint'
+                frames, _ = read_frames(journal, min(read_checkpoint(checkpoint_path), len(journal)), record_dtype)
+                for greenhouse_id, records, _ in frames:
+                    self._journal(greenhouse_id, records)
+                # Our copy must be durable before the orphan goes away
+                os.fsync(self._fd)
+
+                for stale in (checkpoint_path, path):
+                    try:
+                        os.unlink(stale)
+                    except FileNotFoundError:
+                        pass
+                if frames:
+                    print(f"ℹ️ Adopted {sum(len(r) for _, r, _ in frames)} unflushed readings from {path}")
+            finally:
+                os.close(fd)
+
+    def _queue(self, greenhouse_id, records, journal_end):
+        """Queue journaled records. Caller must hold the condition (or be starting up)."""
+        self._pending.append(PendingBatch(greenhouse_id, records, journal_end, time.time()))
+        self._pending_count += len(records)
+        if len(records):
+            self._last_ids[greenhouse_id] = (int(records['timestamp'][-1] * 1000), int(records['seq'][-1]))
+
+    def _journal(self, greenhouse_id, records):
+        """Append a frame to our journal and queue it. Caller must hold the condition (or be starting up)."""
+        encoded_id = greenhouse_id.encode()
+        frame = FRAME_HEADER.pack(len(encoded_id), len(records)) + encoded_id + records.tobytes()
+        os.write(self._fd, frame)
+        self._journal_size += len(frame)
+        self._queue(greenhouse_id, records, self._journal_size)
+
+    def _sequence(self, greenhouse_id, timestamps):
+        """seq of each reading among the greenhouse's readings in the same millisecond (timestamps are sorted)"""
+        millis = (timestamps * 1000).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, millis[1:] != millis[:-1]])
+        seqs = np.arange(len(millis)) - np.repeat(starts, np.diff(np.r_[starts, len(millis)]))
+        last = self._last_ids.get(greenhouse_id)
+        if last is not None and last[0] == millis[0]:
+            first_run = starts[1] if len(starts) > 1 else len(millis)
+            seqs[:first_run] += last[1] + 1
+        return seqs
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """Store listener: journal and queue the batch, leaving the Firestore round trip to the flusher"""
+        records = np.empty(len(timestamps), dtype=JOURNAL_DTYPE)
+        records['timestamp'] = timestamps
+        for field in SENSOR_FIELDS:
+            records[field] = values[field]
+
+        with self._condition:
+            if self._pending_count + len(records) > self.max_pending:
+                if not self._dropping:
+                    print(f"❌ Firestore sync is {self._pending_count} readings behind; "
+                          f"not syncing new readings until it catches up")
+                self._dropping = True
+                self.metrics['droppedReadings'] += len(records)
+                return
+            self._dropping = False
+            records['seq'] = self._sequence(greenhouse_id, timestamps)
+            self._journal(greenhouse_id, records)
+            if self._pending_count >= self.batch_limit:
+                self._condition.notify()
+
+    def _take(self):
+        """Up to batch_limit readings from the head of the queue, split into (greenhouse_id, records) runs"""
+        runs, taken = [], 0
+        for batch in self._pending:
+            if taken == self.batch_limit:
+                break
+            records = batch.records[:self.batch_limit - taken]
+            runs.append((batch.greenhouse_id, records))
+            taken += len(records)
+        return runs, taken
+
+    def _commit(self, runs):
+        client = self._client_factory() if self._client_factory else get_default_client()
+        batch = client.batch()
+        for greenhouse_id, records in runs:
+            readings = client.collection('greenhouses').document(greenhouse_id).collection('readings')
+            isoformats = format_timestamps(records['timestamp'])
+            columns = {field: np.round(records[field].astype(np.float64), 1).tolist() for field in SENSOR_FIELDS}
+            seqs = records['seq'].tolist()
+            for i, (timestamp, isoformat) in enumerate(zip(records['timestamp'].tolist(), isoformats)):
+                batch.set(readings.document(document_id(int(timestamp * 1000), seqs[i])), {
+                    'timestamp': isoformat,
+                    'epoch': timestamp,
+                    **{field: columns[field][i] for field in SENSOR_FIELDS}
+                })
+        batch.commit()
+
+    def _acknowledge(self, taken):
+        """Drop committed readings from the queue and advance the checkpoint past fully written frames"""
+        with self._condition:
+            checkpoint = None
+            while taken:
+                head = self._pending[0]
+                if len(head.records) <= taken:
+                    taken -= len(head.records)
+                    self._pending_count -= len(head.records)
+                    checkpoint = head.journal_end
+                    self._pending.popleft()
+                else:
+                    head.records = head.records[taken:]
+                    self._pending_count -= taken
+                    taken = 0
+
+            if not self._pending:
+                # Everything is in Firestore - start the journal over instead of letting it grow.
+                # Reset the checkpoint first: a crash in between only replays (idempotent) writes.
+                self._write_checkpoint(0)
+                os.ftruncate(self._fd, 0)
+                self._journal_size = 0
+                return
+
+        if checkpoint is not None:
+            self._write_checkpoint(checkpoint)
+
+    def _run(self):
+        backoff = 1
+        while True:
+            with self._condition:
+                if self._pending_count < self.batch_limit:
+                    self._condition.wait(self.flush_interval)
+                if not self._pending:
+                    continue
+                runs, taken = self._take()
+
+            # Journal appends only reach the page cache on ingest; make them durable once per flush
+            os.fsync(self._fd)
+            started = time.time()
+            try:
+                self._commit(runs)
+            except Exception as e:
+                self.metrics['failedBatches'] += 1
+                print(f"❌ Firestore flush failed ({taken} readings), retrying in {backoff}s: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RETRY_SECONDS)
+                continue
+
+            backoff = 1
+            elapsed = time.time() - started
+            self._acknowledge(taken)
+
+            self.metrics['flushedReadings'] += taken
+            self.metrics['flushedBatches'] += 1
+            self.metrics['lastFlushAt'] = started
+            self.metrics['lastFlushSeconds'] = round(elapsed, 4)
+            self.metrics['readingsPerSecond'] = round(taken / elapsed, 1) if elapsed > 0 else None
+
+    def stats(self):
+        """Flush metrics: queue depth, lag of the oldest unflushed reading, throughput and failures"""
+        with self._condition:
+            oldest = self._pending[0].enqueued_at if self._pending else None
+            pending = self._pending_count
+            journal_bytes = self._journal_size
+        return {
+            'enabled': self._thread is not None,
+            'pendingReadings': pending,
+            'lagSeconds': round(time.time() - oldest, 3) if oldest else 0.0,
+            'journalBytes': journal_bytes,
+            **self.metrics
+        }
+
+
+def get_default_client():
+    from services.firebase_service import get_firestore
+    return get_firestore()
+
+
+# Global instance
+firestore_writer = FirestoreWriter()
+if FIRESTORE_SYNC_ENABLED:
+    firestore_writer.start()
+    get_sensor_store().add_listener(firestore_writer.on_ingest)
+
+
+def get_firestore_writer():
+    return firestore_writer
@@ -0,0 +1,88 @@
+# services/id_token_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ID_TOKEN_CACHE_ENTRIES = int(os.getenv('AUTH_TOKEN_CACHE_ENTRIES', '10000'))
+
+# Cached claims are dropped this long before the token's exp, so clock differences never let an expired token through
+ID_TOKEN_CACHE_SKEW_SECONDS = float(os.getenv('AUTH_TOKEN_CACHE_SKEW_SECONDS', '30'))
+
+
+def token_key(id_token):
+    """The raw token is a bearer credential, so only its digest is kept in memory"""
+    return hashlib.sha256(id_token.encode()).digest()
+
+
+class IdTokenCache:
+    """
+    LRU cache of verified ID-token claims, valid until the token's exp (minus skew).
+    A dashboard polls with the same token for up to an hour, so only the first request
+    pays for the RS256 signature check and claim validation.
+    """
+
+    def __init__(self, max_entries=ID_TOKEN_CACHE_ENTRIES, skew_seconds=ID_TOKEN_CACHE_SKEW_SECONDS):
+        self.max_entries = max_entries
+        self.skew_seconds = skew_seconds
+        self._entries = OrderedDict()    # token digest -> (claims, expires_at)
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, id_token):
+        """Decoded claims for a previously verified token, or None"""
+        key = token_key(id_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.counters['expirations'] += 1
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return claims
+
+    def put(self, id_token, claims):
+        """Remember verified claims; tokens without a usable exp are not cached"""
+        try:
+            expires_at = float(claims['exp']) - self.skew_seconds
+        except (KeyError, TypeError, ValueError):
+            return
+        if expires_at <= time.time():
+            return
+
+        key = token_key(id_token)
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'hitRatio': round(self.counters['hits'] / lookups, 4) if lookups else None,
+                **self.counters
+            }
+
+
+# Global instance
+id_token_cache = IdTokenCache()
+
+
+def get_id_token_cache():
+    return id_token_cache
@@ -0,0 +1,236 @@
+# services/login_history.py
+import atexit
+import os
+import threading
+import time
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+
+from services.user_documents import USERS_COLLECTION
+
+LOGIN_HISTORY_LIMIT = 10
+FLUSH_INTERVAL_SECONDS = float(os.getenv('AUTH_LOGIN_HISTORY_FLUSH_SECONDS', '1'))
+
+# Each user costs up to two writes in a batch (append, then trim); Firestore allows 500 per batch
+USERS_PER_BATCH = 250
+# Past this many queued users the oldest activity is dropped rather than growing memory during an outage
+MAX_PENDING_USERS = 10000
+MAX_RETRY_SECONDS = 60
+# A user whose update keeps failing on its own (e.g. deleted meanwhile) is given up after this many attempts
+MAX_ATTEMPTS = 5
+# Seconds the exit hook spends writing what is still queued
+DRAIN_TIMEOUT_SECONDS = float(os.getenv('AUTH_LOGIN_HISTORY_DRAIN_SECONDS', '5'))
+
+# Errors that fail a whole batch whoever is in it; the batch is retried as is and no user is charged an attempt.
+# Anything else may come from a single document, so the batch is split to find it.
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.Aborted,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class PendingLogins:
+    def __init__(self):
+        self.activities = []
+        self.history = []       # loginHistory as last read by a request
+        self.last_login = None
+        self.attempts = 0
+
+
+class LoginHistoryWriter:
+    """
+    Write-behind recorder for loginHistory and lastLogin.
+    verify-token only queues the activity; a background thread coalesces queued logins per user
+    and commits them for many users in one batched write. New entries are added with ArrayUnion
+    and entries past the last LOGIN_HISTORY_LIMIT removed with ArrayRemove, so concurrent logins
+    never overwrite each other's entries the way a read-modify-write of the whole array did.
+    A failing batch is split until the users whose updates fail are isolated; only they are retried
+    and eventually dropped. drain() writes whatever is queued when the process exits.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL_SECONDS, client_factory=None):
+        self.flush_interval = flush_interval
+        self._client_factory = client_factory
+        self._pending = {}     # uid -> PendingLogins, in arrival order
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()     # held while a batch is out, so drain() can wait for it
+        self._thread = None
+        self.metrics = {'recorded': 0, 'flushedUsers': 0, 'flushedBatches': 0, 'failedBatches': 0, 'dropped': 0}
+
+    def record(self, uid, activity, history=()):
+        """
+        Queue one login. `history` is the user's loginHistory as read by this request;
+        entries that fall out of the last LOGIN_HISTORY_LIMIT once the queued logins are added get trimmed.
+        """
+        with self._condition:
+            pending = self._pending.get(uid)
+            if pending is None:
+                if len(self._pending) >= MAX_PENDING_USERS:
+                    self._pending.pop(next(iter(self._pending)))
+                    self.metrics['dropped'] += 1
+                pending = self._pending[uid] = PendingLogins()
+            pending.activities.append(activity)
+            pending.history = list(history)
+            pending.last_login = activity['timestamp']
+            self.metrics['recorded'] += 1
+            if len(self._pending) >= USERS_PER_BATCH:
+                self._condition.notify()
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='login-history-writer', daemon=True)
+                self._thread.start()
+
+    def _take(self):
+        uids = list(self._pending)[:USERS_PER_BATCH]
+        return [(uid, self._pending.pop(uid)) for uid in uids]
+
+    def _requeue(self, taken, charge=True):
+        """
+        Put failed users back in front of anything that arrived meanwhile. With charge, each is charged
+        an attempt and dropped after MAX_ATTEMPTS; batch-wide (transient) failures aren't charged.
+        """
+        retry = []
+        for uid, pending in taken:
+            if charge:
+                pending.attempts += 1
+            if pending.attempts < MAX_ATTEMPTS:
+                retry.append((uid, pending))
+            else:
+                print(f"❌ Dropping {len(pending.activities)} login history entries for {uid} after {MAX_ATTEMPTS} failed attempts")
+        with self._condition:
+            self.metrics['dropped'] += len(taken) - len(retry)
+            newer = self._pending
+            self._pending = dict(retry)
+            for uid, pending in newer.items():
+                if uid in self._pending:
+                    merged = self._pending[uid]
+                    merged.activities.extend(pending.activities)
+                    merged.history = pending.history
+                    merged.last_login = pending.last_login
+                else:
+                    self._pending[uid] = pending
+
+    def _commit(self, taken):
+        client = self._client_factory() if self._client_factory else get_default_client()
+        batch = client.batch()
+        for uid, pending in taken:
+            reference = client.collection(USERS_COLLECTION).document(uid)
+            activities = pending.activities[-LOGIN_HISTORY_LIMIT:]
+            # Trim the oldest stored entries, and logins queued in this flush that are already too old
+            overflow = len(pending.history) + len(pending.activities) - LOGIN_HISTORY_LIMIT
+            stale = pending.history[:max(overflow, 0)] + pending.activities[:-LOGIN_HISTORY_LIMIT]
+            batch.update(reference, {
+                'loginHistory': firestore.ArrayUnion(activities),
+                'lastLogin': pending.last_login
+            })
+            if stale:
+                batch.update(reference, {'loginHistory': firestore.ArrayRemove(stale)})
+        batch.commit()
+
+    def _flush(self, taken):
+        """
+        Commit taken users, splitting the batch on a non-transient failure so one bad document
+        can't sink everyone else's entries. Returns (failed users, error); a transient error fails all of them.
+        """
+        try:
+            self._commit(taken)
+        except TRANSIENT_ERRORS as e:
+            self.metrics['failedBatches'] += 1
+            return taken, e
+        except Exception as e:
+            self.metrics['failedBatches'] += 1
+            if len(taken) == 1:
+                print(f"❌ Login history update failed for {taken[0][0]}: {str(e)}")
+                return taken, e
+            middle = len(taken) // 2
+            failed, error = self._flush(taken[:middle])
+            if isinstance(error, TRANSIENT_ERRORS):
+                return failed + taken[middle:], error
+            rest, rest_error = self._flush(taken[middle:])
+            return failed + rest, rest_error or error
+
+        self.metrics['flushedUsers'] += len(taken)
+        self.metrics['flushedBatches'] += 1
+        return [], None
+
+    def _flush_taken(self, taken):
+        """Flush and requeue what failed; returns the error if the batch as a whole couldn't be written"""
+        failed, error = self._flush(taken)
+        if isinstance(error, TRANSIENT_ERRORS):
+            self._requeue(failed, charge=False)
+            return error
+        if failed:
+            self._requeue(failed)
+        return None
+
+    def _run(self):
+        backoff = 1
+        while True:
+            with self._condition:
+                if len(self._pending) < USERS_PER_BATCH:
+                    self._condition.wait(self.flush_interval)
+                if not self._pending:
+                    continue
+
+            # Taken and written under the flush lock, so drain() never misses a batch in flight
+            with self._flush_lock:
+                with self._condition:
+                    taken = self._take()
+                if not taken:
+                    continue
+                error = self._flush_taken(taken)
+
+            if error is not None:
+                print(f"❌ Login history flush failed ({len(taken)} users), retrying in {backoff}s: {str(error)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RETRY_SECONDS)
+                continue
+            backoff = 1
+
+    def drain(self, timeout=DRAIN_TIMEOUT_SECONDS):
+        """Write everything still queued from the calling thread; registered to run at interpreter exit"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self._flush_lock.acquire(timeout=max(deadline - time.time(), 0)):
+                break
+            try:
+                with self._condition:
+                    taken = self._take()
+                if not taken:
+                    return True
+                if self._flush_taken(taken) is not None:
+                    break
+            finally:
+                self._flush_lock.release()
+        with self._condition:
+            if self._pending:
+                print(f"❌ Exiting with login history for {len(self._pending)} users unwritten")
+            return not self._pending
+
+    def stats(self):
+        with self._condition:
+            return {'pendingUsers': len(self._pending), **self.metrics}
+
+
+def get_default_client():
+    from services.firebase_service import get_firestore
+    return get_firestore()
+
+
+# Global instance
+login_history_writer = LoginHistoryWriter()
+atexit.register(login_history_writer.drain)
+
+
+def get_login_history_writer():
+    return login_history_writer
@@ -0,0 +1,129 @@
+# services/query_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.sensor_store import get_sensor_store, LISTENER_PRIORITY_INVALIDATE
+
+QUERY_CACHE_ENTRIES = int(os.getenv('SENSOR_QUERY_CACHE_ENTRIES', '1024'))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('SENSOR_QUERY_CACHE_TTL_SECONDS', '60'))
+
+# Bodies larger than this are streamed per request instead of being held in the cache
+MAX_ENTRY_BYTES = 1 << 20
+
+
+class CacheEntry:
+    def __init__(self, body, mimetype, window_start, expires_at):
+        self.body = body
+        self.mimetype = mimetype
+        self.window_start = window_start
+        self.expires_at = expires_at
+        self.compressed_variants = {}    # Content-Encoding -> bytes, filled by the compression middleware
+
+    def size(self):
+        return len(self.body) + sum(len(variant) for variant in self.compressed_variants.values())
+
+
+class QueryCache:
+    """
+    LRU + TTL cache of encoded /history and /stats bodies.
+    Keys start with the greenhouse id and end with the aligned time bucket, so every dashboard asking
+    for the same range/interval within a bucket shares one entry. New readings drop the entries whose
+    window they fall into.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._by_greenhouse = {}     # greenhouse id -> set of keys
+        self._generations = {}       # greenhouse id -> invalidation count
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """The fresh CacheEntry for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.counters['expirations'] += 1
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry
+
+    def generation(self, greenhouse_id):
+        """Take before computing a body and hand to put(), so results that raced an ingest are not cached"""
+        return self._generations.get(greenhouse_id, 0)
+
+    def put(self, key, body, mimetype, window_start, generation):
+        """
+        Store an encoded body; key[0] must be the greenhouse id, window_start the oldest time it covers.
+        Returns the new CacheEntry, or None when the body was not cached.
+        """
+        if len(body) > MAX_ENTRY_BYTES:
+            return None
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return None
+            if key in self._entries:
+                self._remove(key)
+            entry = self._entries[key] = CacheEntry(body, mimetype, window_start, time.time() + self.ttl_seconds)
+            self._by_greenhouse.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.counters['evictions'] += 1
+            return entry
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_greenhouse.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_greenhouse[key[0]]
+
+    def invalidate(self, greenhouse_id, newest=None):
+        """Drop a greenhouse's entries whose window contains `newest` (all of them when newest is None)"""
+        with self._lock:
+            self._generations[greenhouse_id] = self._generations.get(greenhouse_id, 0) + 1
+            keys = self._by_greenhouse.get(greenhouse_id)
+            if not keys:
+                return
+            stale = [key for key in keys if newest is None or self._entries[key].window_start <= newest]
+            for key in stale:
+                self._remove(key)
+            self.counters['invalidations'] += len(stale)
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """Store listener: new readings invalidate every cached window they land in"""
+        self.invalidate(greenhouse_id, float(timestamps[-1]))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'bytes': sum(entry.size() for entry in self._entries.values()),
+                'hitRatio': round(self.counters['hits'] / lookups, 4) if lookups else None,
+                **self.counters
+            }
+
+
+# Global instance
+query_cache = QueryCache()
+# Invalidate after rollups, stats and anomaly flags have taken the batch, so a miss never rebuilds stale data
+get_sensor_store().add_listener(query_cache.on_ingest, priority=LISTENER_PRIORITY_INVALIDATE)
+
+
+def get_query_cache():
+    return query_cache
@@ -0,0 +1,157 @@
+# services/rate_limiter.py
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.sqlite_db import SQLiteDatabase
+
+# 'sqlite' enforces one limit across all gunicorn workers; 'memory' counts per process
+RATE_LIMIT_BACKEND = os.getenv('AUTH_RATE_LIMIT_STORE', 'sqlite').lower()
+RATE_LIMIT_PATH = os.getenv('AUTH_RATE_LIMIT_PATH', 'auth_rate_limits.db')
+
+# Hard cap on tracked keys in memory; idle keys are evicted well before this under normal traffic
+RATE_LIMIT_MAX_KEYS = int(os.getenv('AUTH_RATE_LIMIT_MAX_KEYS', '100000'))
+
+# Idle SQLite rows are deleted at most this often per process
+EVICT_INTERVAL_SECONDS = 60
+
+
+def slide(state, now, limit, window_seconds):
+    """
+    Sliding-window counter: the previous fixed window's count, weighted by how much of it still
+    overlaps the sliding window, plus the current window's count. O(1) state per key:
+    (window index, current count, previous count).
+    Returns (new state, allowed, retry_after seconds).
+    """
+    index = int(now // window_seconds)
+    current = previous = 0
+    if state is not None:
+        state_index, state_current, state_previous = state
+        if state_index == index:
+            current, previous = state_current, state_previous
+        elif state_index == index - 1:
+            previous = state_current
+
+    elapsed = now / window_seconds - index
+    if previous * (1 - elapsed) + current + 1 <= limit:
+        return (index, current + 1, previous), True, 0
+
+    # Rejected requests are not counted; work out when the weighted estimate leaves room again
+    window_end = (index + 1) * window_seconds
+    if current + 1 > limit or previous == 0:
+        retry_after = window_end - now
+    else:
+        overlap_needed = (limit - current - 1) / previous
+        retry_after = (index + 1 - overlap_needed) * window_seconds - now
+    return (index, current, previous), False, max(1, math.ceil(retry_after))
+
+
+class MemoryRateLimitBackend:
+    """Per-process counters in an LRU: idle keys fall off the front, so scanning traffic can't grow memory"""
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._states = OrderedDict()     # key -> (state, idle_at)
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window_seconds, now):
+        with self._lock:
+            entry = self._states.pop(key, None)
+            state, allowed, retry_after = slide(entry[0] if entry else None, now, limit, window_seconds)
+            # After two windows without requests the counter is zero again and can be forgotten
+            self._states[key] = (state, (state[0] + 2) * window_seconds)
+
+            while self._states:
+                oldest_key, (_, idle_at) = next(iter(self._states.items()))
+                if idle_at > now and len(self._states) <= self.max_keys:
+                    break
+                del self._states[oldest_key]
+        return allowed, retry_after
+
+    def count(self):
+        return len(self._states)
+
+
+class SQLiteRateLimitBackend:
+    """Counters shared by every worker process through one SQLite file in WAL mode"""
+
+    def __init__(self, path=RATE_LIMIT_PATH):
+        self.db = SQLiteDatabase(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits ('
+            ' key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, current INTEGER NOT NULL,'
+            ' previous INTEGER NOT NULL, idle_at REAL NOT NULL) WITHOUT ROWID'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS rate_limits_idle ON rate_limits (idle_at)')
+        self.last_eviction = 0.0
+
+    def hit(self, key, limit, window_seconds, now):
+        connection = self.db.connection()
+        # IMMEDIATE takes the write lock up front, so concurrent workers can't both read the old count
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT window_index, current, previous FROM rate_limits WHERE key = ?', (key,)
+            ).fetchone()
+            state, allowed, retry_after = slide(row, now, limit, window_seconds)
+            if state != row:
+                connection.execute(
+                    'INSERT OR REPLACE INTO rate_limits (key, window_index, current, previous, idle_at)'
+                    ' VALUES (?, ?, ?, ?, ?)',
+                    (key, *state, (state[0] + 2) * window_seconds)
+                )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        if now - self.last_eviction >= EVICT_INTERVAL_SECONDS:
+            self.last_eviction = now
+            self.db.execute('DELETE FROM rate_limits WHERE idle_at <= ?', (now,))
+        return allowed, retry_after
+
+    def count(self):
+        return self.db.execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Named limits over a shared backend; keys are namespaced per limit.
+    When the SQLite store fails (locked past its timeout, disk full, unreadable file) the request is
+    counted in per-process memory instead, so limits loosen to per worker rather than switching off.
+    """
+
+    def __init__(self, backend, fallback=None):
+        self.backend = backend
+        self.fallback = fallback or MemoryRateLimitBackend()
+        self.fallback_hits = 0
+
+    def hit(self, name, key, limit, window_seconds, now=None):
+        """Record a request; returns (allowed, retry_after seconds)"""
+        now = time.time() if now is None else now
+        key = f"{name}:{key}"
+        try:
+            return self.backend.hit(key, limit, window_seconds, now)
+        except sqlite3.Error as e:
+            self.fallback_hits += 1
+            print(f"❌ Rate limit store error, counting in this process instead: {str(e)}")
+            return self.fallback.hit(key, limit, window_seconds, now)
+
+
+def create_rate_limiter(backend=RATE_LIMIT_BACKEND):
+    if backend == 'memory':
+        return RateLimiter(MemoryRateLimitBackend())
+    if backend == 'sqlite':
+        return RateLimiter(SQLiteRateLimitBackend())
+    raise ValueError(f"Unknown AUTH_RATE_LIMIT_STORE backend: {backend}")
+
+
+# Global instance
+rate_limiter = create_rate_limiter()
+
+
+def get_rate_limiter():
+    return rate_limiter
@@ -0,0 +1,301 @@
+# services/rollups.py
+import threading
+import numpy as np
+
+from services.sensor_store import get_sensor_store, SENSOR_FIELDS
+from services.quantile_sketch import KLLSketch, merged
+from utils.resample import PERCENTILE_AGGREGATIONS
+
+# (name, bucket size in seconds, buckets retained)
+ROLLUP_TIERS = (
+    ('1m', 60, 7 * 24 * 60),      # 7 days of minute buckets
+    ('1h', 3600, 400 * 24),       # ~13 months of hourly buckets
+    ('1d', 86400, 5 * 366),       # ~5 years of daily buckets
+)
+
+# Tiers whose buckets also carry a KLL sketch per field, so percentiles merge over any range.
+# Minute buckets hold a few readings each; partial hours at the edges of a range are read raw instead.
+SKETCH_TIERS = ('1h', '1d')
+
+INITIAL_CAPACITY = 256
+
+# Bucket aggregates that can be regrouped into coarser steps ('last' needs raw readings)
+ROLLUP_AGGREGATIONS = ('mean', 'max', *PERCENTILE_AGGREGATIONS)
+
+
+def sketch_of(values):
+    sketch = KLLSketch()
+    sketch.update(values)
+    return sketch
+
+
+class RollupSeries:
+    """
+    Columnar count/sum/min/max aggregates per fixed-size bucket, kept in bucket order.
+    With sketches=True every bucket also keeps a mergeable quantile sketch per field.
+    """
+
+    def __init__(self, bucket_seconds, retention, capacity=INITIAL_CAPACITY, complete_from=None, sketches=False):
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.sketches = sketches
+        self.trimmed = False
+        # First bucket holding every reading; older ones miss history restored from disk
+        self.complete_from = complete_from
+        self.size = 0
+        self._arrays = {
+            'bucket': np.empty(capacity, dtype=np.int64),
+            'count': np.empty(capacity, dtype=np.int64),
+        }
+        for field in SENSOR_FIELDS:
+            self._arrays[f'{field}.sum'] = np.empty(capacity, dtype=np.float64)
+            self._arrays[f'{field}.min'] = np.empty(capacity, dtype=np.float32)
+            self._arrays[f'{field}.max'] = np.empty(capacity, dtype=np.float32)
+            if sketches:
+                self._arrays[f'{field}.sketch'] = np.empty(capacity, dtype=object)
+
+    def _reserve(self, needed):
+        """Make room for `needed` buckets, dropping buckets beyond retention first"""
+        capacity = len(self._arrays['bucket'])
+        if needed <= capacity:
+            return
+
+        # Trim to the retention window before growing; arrays are copied so readers keep valid views
+        drop = max(0, self.size - self.retention)
+        keep = self.size - drop
+        self.trimmed = self.trimmed or drop > 0
+        new_capacity = max(capacity, INITIAL_CAPACITY)
+        while new_capacity < keep + (needed - self.size):
+            new_capacity *= 2
+
+        for name, array in self._arrays.items():
+            resized = np.empty(new_capacity, dtype=array.dtype)
+            resized[:keep] = array[drop:self.size]
+            self._arrays[name] = resized
+        self.size = keep
+
+    def update(self, timestamps, values):
+        """Fold a time-ordered batch of raw readings into the bucket aggregates"""
+        if len(timestamps) == 0:
+            return
+
+        buckets = (timestamps // self.bucket_seconds).astype(np.int64)
+        # Start index of each run of equal buckets (batch is already sorted)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        batch_buckets = buckets[starts]
+        batch_counts = np.diff(np.r_[starts, len(buckets)])
+
+        batch = {'count': batch_counts}
+        for field in SENSOR_FIELDS:
+            column = values[field]
+            batch[f'{field}.sum'] = np.add.reduceat(column.astype(np.float64), starts)
+            batch[f'{field}.min'] = np.minimum.reduceat(column, starts)
+            batch[f'{field}.max'] = np.maximum.reduceat(column, starts)
+            if self.sketches:
+                # One sketch per bucket in the batch; a batch rarely spans more than one or two
+                sketches = np.empty(len(starts), dtype=object)
+                sketches[:] = [sketch_of(group) for group in np.split(column, starts[1:])]
+                batch[f'{field}.sketch'] = sketches
+
+        arrays = self._arrays
+        offset = 0
+        if self.size and arrays['bucket'][self.size - 1] == batch_buckets[0]:
+            # First bucket of the batch continues the open bucket
+            last = self.size - 1
+            arrays['count'][last] += batch['count'][0]
+            for field in SENSOR_FIELDS:
+                arrays[f'{field}.sum'][last] += batch[f'{field}.sum'][0]
+                arrays[f'{field}.min'][last] = min(arrays[f'{field}.min'][last], batch[f'{field}.min'][0])
+                arrays[f'{field}.max'][last] = max(arrays[f'{field}.max'][last], batch[f'{field}.max'][0])
+                if self.sketches:
+                    arrays[f'{field}.sketch'][last].merge(batch[f'{field}.sketch'][0])
+            offset = 1
+
+        remaining = len(batch_buckets) - offset
+        if remaining <= 0:
+            return
+
+        self._reserve(self.size + remaining)
+        arrays = self._arrays
+        end = self.size + remaining
+        arrays['bucket'][self.size:end] = batch_buckets[offset:]
+        for name, column in batch.items():
+            arrays[name][self.size:end] = column[offset:]
+        self.size = end
+
+    def covers(self, start):
+        """True if buckets from `start` on are complete and none were dropped by retention"""
+        if self.complete_from is not None and start // self.bucket_seconds < self.complete_from:
+            return False
+        if not self.trimmed:
+            return True
+        return self.size > 0 and self._arrays['bucket'][0] * self.bucket_seconds <= start
+
+    def query(self, start, end):
+        """Return {name: view} for buckets overlapping [start, end]"""
+        size = self.size
+        arrays = {name: array[:size] for name, array in self._arrays.items()}
+        buckets = arrays['bucket']
+        lo = np.searchsorted(buckets, int(start // self.bucket_seconds), side='left')
+        hi = np.searchsorted(buckets, int(end // self.bucket_seconds), side='right')
+        return {name: array[lo:hi] for name, array in arrays.items()}
+
+    def snapshot(self, start, end):
+        """
+        query() copied for use outside the lock. The open (last) bucket's sketches are copied too,
+        since later batches keep merging into them; closed buckets' sketches never change.
+        """
+        buckets = {name: array.copy() for name, array in self.query(start, end).items()}
+        if self.sketches and len(buckets['bucket']) and buckets['bucket'][-1] == self._arrays['bucket'][self.size - 1]:
+            for field in SENSOR_FIELDS:
+                buckets[f'{field}.sketch'][-1] = merged([buckets[f'{field}.sketch'][-1]])
+        return buckets
+
+
+class RollupEngine:
+    """Keeps 1m/1h/1d rollups per greenhouse up to date as readings are ingested"""
+
+    def __init__(self, tiers=ROLLUP_TIERS):
+        self.tiers = tiers
+        self._series = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _tiers_for(self, greenhouse_id):
+        tiers = self._series.get(greenhouse_id)
+        if tiers is None:
+            with self._lock:
+                tiers = self._series.get(greenhouse_id)
+                if tiers is None:
+                    self._locks[greenhouse_id] = threading.Lock()
+                    # Readings restored from disk were never folded in; queries reaching them scan raw data
+                    restored = get_sensor_store().restored_until(greenhouse_id)
+                    tiers = {
+                        name: RollupSeries(
+                            seconds, retention,
+                            complete_from=None if restored is None else int(restored // seconds) + 1,
+                            sketches=name in SKETCH_TIERS
+                        )
+                        for name, seconds, retention in self.tiers
+                    }
+                    self._series[greenhouse_id] = tiers
+        return tiers
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """Store listener: fold a newly appended batch into every tier"""
+        tiers = self._tiers_for(greenhouse_id)
+        # Retention trimming shifts arrays, so updates and queries are serialized per greenhouse
+        with self._locks[greenhouse_id]:
+            for series in tiers.values():
+                series.update(timestamps, values)
+
+    def select_tier(self, greenhouse_id, start, step, sketches=False):
+        """
+        Pick the coarsest tier whose buckets divide `step` evenly and still cover `start`,
+        only among tiers with quantile sketches when `sketches` is set.
+        Returns None when only raw data can answer the query.
+        """
+        tiers = self._series.get(greenhouse_id)
+        if not tiers:
+            return None
+
+        for name, seconds, _ in reversed(self.tiers):
+            if seconds > step or step % seconds:
+                continue
+            series = tiers[name]
+            if sketches and not series.sketches:
+                continue
+            if series.covers(start):
+                return series
+        return None
+
+    def history(self, greenhouse_id, start, end, step, agg='mean'):
+        """
+        Aggregate rollup buckets into `step`-second points between start and end.
+        Returns (bucket_start_timestamps, {field: mean, max or percentile}) or None if no tier fits.
+        """
+        lock = self._locks.get(greenhouse_id)
+        if lock is None or agg not in ROLLUP_AGGREGATIONS:
+            return None
+
+        with lock:
+            series = self.select_tier(greenhouse_id, start, step, sketches=agg in PERCENTILE_AGGREGATIONS)
+            if series is None:
+                return None
+            buckets = series.snapshot(start, end)
+        if len(buckets['bucket']) == 0:
+            return np.empty(0, dtype=np.float64), {field: np.empty(0) for field in SENSOR_FIELDS}
+
+        # Regroup tier buckets into the requested step (tier size divides step evenly)
+        group = buckets['bucket'] * series.bucket_seconds // step
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        counts = np.add.reduceat(buckets['count'], starts)
+
+        aggregated = {}
+        for field in SENSOR_FIELDS:
+            if agg == 'max':
+                aggregated[field] = np.maximum.reduceat(buckets[f'{field}.max'], starts).astype(np.float64)
+            elif agg in PERCENTILE_AGGREGATIONS:
+                fraction = PERCENTILE_AGGREGATIONS[agg]
+                aggregated[field] = np.array([
+                    merged(sketches).quantiles([fraction])[0]
+                    for sketches in np.split(buckets[f'{field}.sketch'], starts[1:])
+                ], dtype=np.float64)
+            else:
+                aggregated[field] = np.add.reduceat(buckets[f'{field}.sum'], starts) / counts
+        return (group[starts] * step).astype(np.float64), aggregated
+
+    def percentiles(self, greenhouse_id, start, end, fractions):
+        """
+        Estimated quantiles of every field over readings in [start, end): whole buckets of the
+        sketch tiers are merged, coarsest first, and the partial hours at either edge are read raw.
+        Returns {field: [estimate per fraction]}, with None estimates when there are no readings.
+        """
+        tiers = self._series.get(greenhouse_id, {})
+        sketch_tiers = sorted(
+            (series for series in tiers.values() if series.sketches),
+            key=lambda series: series.bucket_seconds, reverse=True
+        )
+        pieces = []        # snapshots of whole buckets
+        raw_ranges = []    # [lo, hi) ranges no sketch bucket fits in
+
+        def cover(lo, hi, level):
+            if lo >= hi:
+                return
+            if level == len(sketch_tiers):
+                raw_ranges.append((lo, hi))
+                return
+            series = sketch_tiers[level]
+            seconds = series.bucket_seconds
+            first, last = int(-(-lo // seconds)), int(hi // seconds)    # whole buckets first..last-1
+            if first >= last or not series.covers(first * seconds):
+                cover(lo, hi, level + 1)
+                return
+            pieces.append(series.snapshot(first * seconds, (last - 1) * seconds))
+            cover(lo, first * seconds, level + 1)
+            cover(last * seconds, hi, level + 1)
+
+        lock = self._locks.get(greenhouse_id)
+        if lock is None:
+            raw_ranges.append((start, end))
+        else:
+            with lock:
+                cover(start, end, 0)
+
+        raw = [get_sensor_store().query(greenhouse_id, lo, np.nextafter(hi, -np.inf))[1] for lo, hi in raw_ranges]
+        result = {}
+        for field in SENSOR_FIELDS:
+            sketches = [sketch for piece in pieces for sketch in piece[f'{field}.sketch']]
+            sketches += [sketch_of(columns[field]) for columns in raw]
+            result[field] = merged(sketches).quantiles(fractions)
+        return result
+
+
+# Process-wide rollup engine, fed by every batch the sensor store accepts
+rollup_engine = RollupEngine()
+get_sensor_store().add_listener(rollup_engine.on_ingest)
+
+
+def get_rollup_engine():
+    """Return the shared rollup engine"""
+    return rollup_engine
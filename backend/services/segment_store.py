@@ -0,0 +1,249 @@
+# services/segment_store.py
+import fcntl
+import json
+import mmap
+import os
+import threading
+from bisect import bisect_right
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from services.sensor_store import SENSOR_FIELDS
+
+# Fixed-width little-endian record: timestamp + one float32 per sensor (20 bytes)
+RECORD_DTYPE = np.dtype([('timestamp', '<f8')] + [(field, '<f4') for field in SENSOR_FIELDS])
+
+# Records per segment file before a new one is started (~20 MB)
+SEGMENT_RECORDS = int(os.getenv('SENSOR_SEGMENT_RECORDS', str(1 << 20)))
+
+SEGMENT_SUFFIX = '.seg'
+METADATA_FILE = 'greenhouse.json'
+LOCK_FILE = '.lock'
+
+# Data directories this process holds the lock of: root -> open lock file
+_held_locks = {}
+_held_locks_lock = threading.Lock()
+
+
+def lock_data_dir(root):
+    """
+    Take an exclusive flock on a data directory, or raise RuntimeError if another process has it.
+    Re-opening a directory this process already holds (e.g. a store reopened in tests) is allowed.
+    """
+    root = os.path.realpath(root)
+    with _held_locks_lock:
+        if root in _held_locks:
+            return
+        lock_file = open(os.path.join(root, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Sensor data directory {root} is in use by another process. Segment files are appended "
+                f"without coordination, so run a single worker or give each worker its own SENSOR_DATA_DIR."
+            )
+        _held_locks[root] = lock_file
+
+
+class Segment:
+    """One time-ordered segment file, mapped read-only on demand"""
+
+    def __init__(self, path, count):
+        self.path = path
+        self.count = count
+        self._mapped = None
+
+    def records(self):
+        """Zero-copy structured view over the first `count` records"""
+        count = self.count
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        mapped = self._mapped
+        if mapped is None or len(mapped) < count:
+            # The active segment grows, so remap when readers need records past the old mapping
+            with open(self.path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), count * RECORD_DTYPE.itemsize, access=mmap.ACCESS_READ)
+            mapped = self._mapped = np.frombuffer(buffer, dtype=RECORD_DTYPE, count=count)
+        return mapped[:count]
+
+    def read_record(self, index):
+        """One record read with pread, without mapping the file"""
+        with open(self.path, 'rb') as f:
+            data = os.pread(f.fileno(), RECORD_DTYPE.itemsize, index * RECORD_DTYPE.itemsize)
+        return np.frombuffer(data, dtype=RECORD_DTYPE)[0]
+
+
+class SegmentSeries:
+    """
+    Disk-backed series for one greenhouse with the same interface as SensorSeries.
+    Appends go to the active segment file; reads mmap segments and binary-search timestamps.
+    """
+
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.segments = []
+        self.first_timestamps = []
+        self.size = 0
+        self._last_timestamp = None
+        self._fd = None
+
+        os.makedirs(directory, exist_ok=True)
+        names = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            path = os.path.join(directory, name)
+            count = self._recover(path)
+            if count:
+                self._add_segment(Segment(path, count))
+
+        if self.segments:
+            last = self.segments[-1]
+            self._last_timestamp = float(last.read_record(last.count - 1)['timestamp'])
+
+    @staticmethod
+    def _recover(path):
+        """Drop a torn trailing record left by a crash mid-write; returns whole records"""
+        size = os.path.getsize(path)
+        whole = size - size % RECORD_DTYPE.itemsize
+        if whole != size:
+            os.truncate(path, whole)
+        return whole // RECORD_DTYPE.itemsize
+
+    def _add_segment(self, segment):
+        self.segments.append(segment)
+        self.first_timestamps.append(float(segment.read_record(0)['timestamp']))
+        self.size += segment.count
+
+    @property
+    def last_timestamp(self):
+        return self._last_timestamp
+
+    def _active_segment(self):
+        if self.segments and self.segments[-1].count < self.segment_records:
+            return self.segments[-1]
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        index = len(self.segments)
+        path = os.path.join(self.directory, f'{index:08d}{SEGMENT_SUFFIX}')
+        segment = Segment(path, 0)
+        self.segments.append(segment)
+        self.first_timestamps.append(None)
+        return segment
+
+    def append(self, timestamps, values):
+        """Append a time-ordered batch. Caller must hold the store lock."""
+        offset = 0
+        while offset < len(timestamps):
+            segment = self._active_segment()
+            take = min(len(timestamps) - offset, self.segment_records - segment.count)
+
+            records = np.empty(take, dtype=RECORD_DTYPE)
+            records['timestamp'] = timestamps[offset:offset + take]
+            for field in SENSOR_FIELDS:
+                records[field] = values[field][offset:offset + take]
+
+            if self._fd is None:
+                self._fd = os.open(segment.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self._fd, records.tobytes())
+
+            if segment.count == 0:
+                self.first_timestamps[-1] = float(timestamps[offset])
+            # Publish counts only after the bytes are in the page cache
+            segment.count += take
+            self.size += take
+            self._last_timestamp = float(timestamps[offset + take - 1])
+            offset += take
+
+    def version(self):
+        return (self.size, self._last_timestamp) if self.size else None
+
+    def latest(self):
+        if not self.size:
+            return None
+        # A freshly rolled active segment is empty until its first append lands
+        segment = next(segment for segment in reversed(self.segments) if segment.count)
+        record = segment.records()[-1]
+        return float(record['timestamp']), {field: float(record[field]) for field in SENSOR_FIELDS}
+
+    def query(self, start=None, end=None):
+        """Binary-search segments and rows; a range inside one segment comes back as mmap views"""
+        segments = [segment for segment in self.segments if segment.count]
+        firsts = self.first_timestamps[:len(segments)]
+
+        lo_segment = 0 if start is None else max(bisect_right(firsts, start) - 1, 0)
+        hi_segment = len(segments) if end is None else bisect_right(firsts, end)
+
+        parts = []
+        for segment in segments[lo_segment:hi_segment]:
+            records = segment.records()
+            timestamps = records['timestamp']
+            lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+            hi = len(records) if end is None else np.searchsorted(timestamps, end, side='right')
+            if hi > lo:
+                parts.append(records[lo:hi])
+
+        if not parts:
+            return np.empty(0, dtype=np.float64), {field: np.empty(0, dtype=np.float32) for field in SENSOR_FIELDS}
+
+        records = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return records['timestamp'], {field: records[field] for field in SENSOR_FIELDS}
+
+    def iter_query(self, start=None, end=None, chunk_rows=65536):
+        """Yield the range as mmap views of at most chunk_rows records - nothing is concatenated"""
+        for segment in [segment for segment in self.segments if segment.count]:
+            records = segment.records()
+            timestamps = records['timestamp']
+            if (start is not None and timestamps[-1] < start) or (end is not None and timestamps[0] > end):
+                continue
+            lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+            hi = len(records) if end is None else np.searchsorted(timestamps, end, side='right')
+            for offset in range(lo, hi, chunk_rows):
+                chunk = records[offset:min(offset + chunk_rows, hi)]
+                yield chunk['timestamp'], {field: chunk[field] for field in SENSOR_FIELDS}
+
+
+class SegmentDirectory:
+    """
+    Root data directory holding one sub-directory of segments per greenhouse.
+    Only one process may write a data directory; see lock_data_dir(). The lock is taken when the
+    store is created, so don't create it in a gunicorn --preload master that forks the workers.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        lock_data_dir(root)
+
+    def _path(self, greenhouse_id):
+        return os.path.join(self.root, quote(greenhouse_id, safe=''))
+
+    def discover(self):
+        """Yield (greenhouse_id, metadata) for every greenhouse already on disk - no data is read"""
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            metadata = {}
+            metadata_path = os.path.join(path, METADATA_FILE)
+            if os.path.exists(metadata_path):
+                with open(metadata_path) as f:
+                    metadata = json.load(f)
+            yield unquote(name), metadata
+
+    def open_series(self, greenhouse_id):
+        return SegmentSeries(self._path(greenhouse_id))
+
+    def save_metadata(self, greenhouse_id, metadata):
+        path = self._path(greenhouse_id)
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            tmp_path = os.path.join(path, METADATA_FILE + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(metadata, f)
+            os.replace(tmp_path, os.path.join(path, METADATA_FILE))
@@ -0,0 +1,215 @@
+# services/sensor_stats.py
+import threading
+import time
+import numpy as np
+
+from services.sensor_store import get_sensor_store, SENSOR_FIELDS
+from services.rollups import get_rollup_engine
+
+# period param -> (window seconds, label)
+STATS_PERIODS = {
+    '1h': (3600, '1 hour'),
+    '24h': (24 * 3600, '24 hours'),
+    '7d': (7 * 86400, '7 days'),
+    '30d': (30 * 86400, '30 days'),
+}
+DEFAULT_STATS_PERIOD = '24h'
+
+# Every window is split into this many slots; a query merges at most this many accumulators
+SLOTS_PER_WINDOW = 60
+
+# Percentiles reported for every sensor, merged from the KLL sketches on the hourly and daily
+# rollup buckets (see RollupEngine.percentiles), so they cover exactly the window's readings
+PERCENTILES = (5, 50, 95)
+
+
+def empty_stats():
+    return {
+        'count': 0, 'min': None, 'max': None, 'avg': None, 'stddev': None,
+        **{f'p{p}': None for p in PERCENTILES}
+    }
+
+
+class WindowStats:
+    """
+    Sliding-window count/mean/M2/min/max for every sensor field, kept in a ring of slots.
+    Slots expire as time moves on, so the window covers the last (SLOTS-1, SLOTS] slot widths.
+    """
+
+    def __init__(self, window_seconds, slots=SLOTS_PER_WINDOW):
+        self.slots = slots
+        self.slot_seconds = window_seconds / slots
+        self.slot_ids = np.full(slots, -1, dtype=np.int64)
+        self.count = np.zeros(slots, dtype=np.int64)
+        self.mean = {field: np.zeros(slots) for field in SENSOR_FIELDS}
+        self.m2 = {field: np.zeros(slots) for field in SENSOR_FIELDS}
+        self.min = {field: np.full(slots, np.inf) for field in SENSOR_FIELDS}
+        self.max = {field: np.full(slots, -np.inf) for field in SENSOR_FIELDS}
+        self._lock = threading.Lock()
+
+    def update(self, timestamps, values):
+        """Merge a time-ordered batch into its slots with Chan's parallel update"""
+        ids = (timestamps // self.slot_seconds).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        counts = np.diff(np.r_[starts, len(ids)])
+
+        # Groups more than one window older than the newest one can never be live again
+        recent = np.flatnonzero(ids[starts] > ids[-1] - self.slots)
+        if recent[0] > 0:
+            skip = starts[recent[0]]
+            ids = ids[skip:]
+            values = {field: column[skip:] for field, column in values.items()}
+            starts = starts[recent] - skip
+            counts = counts[recent]
+
+        group_ids = ids[starts]
+        positions = group_ids % self.slots
+
+        with self._lock:
+            # Slots last used for an older id are reset before merging
+            stale = self.slot_ids[positions] != group_ids
+            self.slot_ids[positions] = group_ids
+            self.count[positions[stale]] = 0
+
+            n_a = self.count[positions].astype(np.float64)
+            n_b = counts.astype(np.float64)
+            n = n_a + n_b
+
+            for field in SENSOR_FIELDS:
+                column = values[field].astype(np.float64)
+                mean_b = np.add.reduceat(column, starts) / n_b
+                # Two-pass M2 inside each group keeps the batch contribution stable
+                deviations = column - np.repeat(mean_b, counts)
+                m2_b = np.add.reduceat(deviations * deviations, starts)
+
+                mean_a = np.where(stale, 0.0, self.mean[field][positions])
+                m2_a = np.where(stale, 0.0, self.m2[field][positions])
+                delta = mean_b - mean_a
+
+                self.mean[field][positions] = mean_a + delta * n_b / n
+                self.m2[field][positions] = m2_a + m2_b + delta * delta * n_a * n_b / n
+
+                min_a = np.where(stale, np.inf, self.min[field][positions])
+                max_a = np.where(stale, -np.inf, self.max[field][positions])
+                self.min[field][positions] = np.minimum(min_a, np.minimum.reduceat(column, starts))
+                self.max[field][positions] = np.maximum(max_a, np.maximum.reduceat(column, starts))
+
+            self.count[positions] = n.astype(np.int64)
+
+    def start(self, now=None):
+        """Timestamp where the oldest live slot begins"""
+        now = time.time() if now is None else now
+        return (int(now // self.slot_seconds) - self.slots + 1) * self.slot_seconds
+
+    def end(self, now=None):
+        """Timestamp where the current slot ends; readings in [start, end) are in the window"""
+        now = time.time() if now is None else now
+        return (int(now // self.slot_seconds) + 1) * self.slot_seconds
+
+    def snapshot(self, now=None):
+        """Merge the live slots into {field: {count, min, max, avg, stddev}}; percentiles are left None"""
+        now = time.time() if now is None else now
+        current = int(now // self.slot_seconds)
+
+        with self._lock:
+            live = (self.slot_ids > current - self.slots) & (self.slot_ids <= current) & (self.count > 0)
+            counts = self.count[live].astype(np.float64)
+            total = counts.sum()
+
+            result = {}
+            for field in SENSOR_FIELDS:
+                if total == 0:
+                    result[field] = empty_stats()
+                    continue
+
+                means = self.mean[field][live]
+                mean = float(np.dot(counts, means) / total)
+                m2 = float(self.m2[field][live].sum() + np.dot(counts, (means - mean) ** 2))
+
+                result[field] = {
+                    **empty_stats(),
+                    'count': int(total),
+                    'min': float(self.min[field][live].min()),
+                    'max': float(self.max[field][live].max()),
+                    'avg': mean,
+                    'stddev': float(np.sqrt(m2 / total)),
+                }
+        return result
+
+
+class SensorStats:
+    """Running per-greenhouse statistics for every supported period"""
+
+    def __init__(self, periods=STATS_PERIODS, rollups=None):
+        self.periods = periods
+        self._rollups = rollups
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _windows_for(self, greenhouse_id):
+        windows = self._windows.get(greenhouse_id)
+        if windows is None:
+            with self._lock:
+                windows = self._windows.get(greenhouse_id)
+                if windows is None:
+                    windows = {
+                        period: WindowStats(seconds)
+                        for period, (seconds, _) in self.periods.items()
+                    }
+                    self._windows[greenhouse_id] = windows
+        return windows
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """Store listener: fold a newly appended batch into every window"""
+        for window in self._windows_for(greenhouse_id).values():
+            window.update(timestamps, values)
+
+    def get(self, greenhouse_id, period, now=None):
+        """
+        Return stats for one period, or None if the window can't answer it: nothing was ingested
+        for the greenhouse, or the period still reaches back into history restored from disk.
+        """
+        windows = self._windows.get(greenhouse_id)
+        if windows is None:
+            return None
+        window = windows[period]
+        restored = get_sensor_store().restored_until(greenhouse_id)
+        if restored is not None and restored >= window.start(now):
+            return None
+
+        stats = window.snapshot(now)
+        rollups = self._rollups or get_rollup_engine()
+        estimates = rollups.percentiles(greenhouse_id, window.start(now), window.end(now), [p / 100 for p in PERCENTILES])
+        for field in SENSOR_FIELDS:
+            stats[field].update({f'p{p}': estimate for p, estimate in zip(PERCENTILES, estimates[field])})
+        return stats
+
+
+def summarize(columns):
+    """One-off stats over raw columns, in the same shape as WindowStats.snapshot()"""
+    result = {}
+    for field in SENSOR_FIELDS:
+        values = np.asarray(columns[field], dtype=np.float64)
+        if len(values) == 0:
+            result[field] = empty_stats()
+            continue
+        percentiles = np.percentile(values, PERCENTILES, method='inverted_cdf').tolist()
+        result[field] = {
+            'count': len(values),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'avg': float(values.mean()),
+            'stddev': float(values.std()),
+            **{f'p{p}': value for p, value in zip(PERCENTILES, percentiles)}
+        }
+    return result
+
+
+# Process-wide statistics, fed by every batch the sensor store accepts
+sensor_stats = SensorStats()
+get_sensor_store().add_listener(sensor_stats.on_ingest)
+
+
+def get_sensor_stats():
+    """Return the shared running statistics"""
+    return sensor_stats
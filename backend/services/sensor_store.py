@@ -0,0 +1,357 @@
+# services/sensor_store.py
+import os
+import threading
+import time
+import zlib
+import numpy as np
+
+from utils.time_utils import parse_timestamp
+
+# Sensor columns kept for every greenhouse
+SENSOR_FIELDS = ('temperature', 'humidity', 'soilMoisture')
+SENSOR_UNITS = {'temperature': '°C', 'humidity': '%', 'soilMoisture': '%'}
+
+DEFAULT_GREENHOUSE_ID = 'GH-001'
+# Ids name on-disk segment directories and stream channels, so keep them to a safe character set
+GREENHOUSE_ID_PATTERN = r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$'
+INITIAL_CAPACITY = 1024
+SHARD_COUNT = int(os.getenv('SENSOR_STORE_SHARDS', '16'))
+
+# Ingest listener priorities: lower runs first. Caches of derived data must see a batch only after
+# everything they are derived from (rollups, stats, anomaly flags) has folded it in.
+LISTENER_PRIORITY_DEFAULT = 0
+LISTENER_PRIORITY_INVALIDATE = 100
+
+# Device clocks drift, but a reading this far ahead of the server clock is a bad timestamp
+MAX_FUTURE_SECONDS = 86400
+
+
+class SensorSeries:
+    """Append-only columnar arrays (timestamps + one array per sensor) for one greenhouse"""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.columns = {field: np.empty(capacity, dtype=np.float32) for field in SENSOR_FIELDS}
+
+    @property
+    def last_timestamp(self):
+        return float(self.timestamps[self.size - 1]) if self.size else None
+
+    def _ensure_capacity(self, needed):
+        capacity = len(self.timestamps)
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+
+        # Readers hold references to the old arrays, so copy instead of resizing in place
+        timestamps = np.empty(capacity, dtype=np.float64)
+        timestamps[:self.size] = self.timestamps[:self.size]
+        self.timestamps = timestamps
+
+        for field in SENSOR_FIELDS:
+            column = np.empty(capacity, dtype=np.float32)
+            column[:self.size] = self.columns[field][:self.size]
+            self.columns[field] = column
+
+    def append(self, timestamps, values):
+        """Append a time-ordered batch. Caller must hold the store lock."""
+        count = len(timestamps)
+        if count == 0:
+            return
+
+        self._ensure_capacity(self.size + count)
+        end = self.size + count
+        self.timestamps[self.size:end] = timestamps
+        for field in SENSOR_FIELDS:
+            self.columns[field][self.size:end] = values[field]
+
+        # Publish the new size only after the data is written
+        self.size = end
+
+    def snapshot(self):
+        """Return (timestamps, columns) views covering everything written so far"""
+        size = self.size
+        timestamps = self.timestamps[:size]
+        columns = {field: self.columns[field][:size] for field in SENSOR_FIELDS}
+        return timestamps, columns
+
+    def version(self):
+        size = self.size
+        return (size, float(self.timestamps[size - 1])) if size else None
+
+    def latest(self):
+        timestamps, columns = self.snapshot()
+        if len(timestamps) == 0:
+            return None
+        return float(timestamps[-1]), {field: float(column[-1]) for field, column in columns.items()}
+
+    def query(self, start=None, end=None):
+        timestamps, columns = self.snapshot()
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, side='right')
+        return timestamps[lo:hi], {field: column[lo:hi] for field, column in columns.items()}
+
+    def iter_query(self, start=None, end=None, chunk_rows=65536):
+        """Yield query() results as views of at most chunk_rows readings"""
+        timestamps, columns = self.query(start, end)
+        for offset in range(0, len(timestamps), chunk_rows):
+            window = slice(offset, offset + chunk_rows)
+            yield timestamps[window], {field: column[window] for field, column in columns.items()}
+
+
+class StoreShard:
+    """A group of greenhouse series sharing one ingest lock"""
+
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+class SensorStore:
+    """
+    In-process, append-only columnar time-series store keyed by greenhouse id.
+    Greenhouses are spread over shards, each with its own lock, so ingest for one greenhouse
+    never waits on another shard. Reads take no lock at all.
+    """
+
+    def __init__(self, shard_count=SHARD_COUNT, data_dir=None):
+        self._shards = [StoreShard() for _ in range(shard_count)]
+        self._shard_index = {}     # greenhouse id -> shard
+        self._greenhouses = {}     # greenhouse id -> {'id', 'farmId', 'name', 'location'}
+        self._farm_index = {}      # farm id -> set of greenhouse ids
+        self._listeners = []       # (priority, listener), sorted by priority
+        self._index_lock = threading.Lock()
+        self._segments = None
+        self._restored = {}        # greenhouse id -> newest timestamp already on disk at startup
+
+        if data_dir:
+            # Disk tier: series live in mmap'd segment files instead of the Python heap
+            from services.segment_store import SegmentDirectory
+            self._segments = SegmentDirectory(data_dir)
+            for greenhouse_id, metadata in self._segments.discover():
+                series = self._segments.open_series(greenhouse_id)
+                self.shard_for(greenhouse_id).series[greenhouse_id] = series
+                if series.last_timestamp is not None:
+                    self._restored[greenhouse_id] = series.last_timestamp
+                self._register(greenhouse_id, metadata)
+
+    def _new_series(self, greenhouse_id):
+        if self._segments is not None:
+            return self._segments.open_series(greenhouse_id)
+        return SensorSeries()
+
+    def add_listener(self, listener, priority=LISTENER_PRIORITY_DEFAULT):
+        """
+        Register listener(greenhouse_id, timestamps, values), called with every accepted batch.
+        Listeners run in priority order (ties in registration order), whatever order modules were imported in.
+        They run inside the shard lock, so they see each greenhouse's batches in timestamp order.
+        A listener that raises is logged and skipped; the batch stays stored and later listeners still run.
+        """
+        with self._index_lock:
+            listeners = self._listeners + [(priority, listener)]
+            # Sorting is stable, so equal priorities keep registration order; ingest reads the list without a lock
+            self._listeners = sorted(listeners, key=lambda entry: entry[0])
+
+    def _notify(self, greenhouse_id, timestamps, values):
+        for _, listener in self._listeners:
+            try:
+                listener(greenhouse_id, timestamps, values)
+            except Exception as e:
+                name = getattr(listener, '__qualname__', repr(listener))
+                print(f"❌ Ingest listener {name} failed for {greenhouse_id}: {str(e)}")
+
+    def shard_for(self, greenhouse_id):
+        """Look up (or assign) the shard that owns a greenhouse"""
+        shard = self._shard_index.get(greenhouse_id)
+        if shard is None:
+            with self._index_lock:
+                shard = self._shard_index.get(greenhouse_id)
+                if shard is None:
+                    # crc32 is stable across processes, unlike hash()
+                    shard = self._shards[zlib.crc32(greenhouse_id.encode()) % len(self._shards)]
+                    self._shard_index[greenhouse_id] = shard
+        return shard
+
+    def _series_for(self, greenhouse_id):
+        shard = self._shard_index.get(greenhouse_id)
+        return shard.series.get(greenhouse_id) if shard else None
+
+    def register_greenhouse(self, greenhouse_id, farm_id=None, name=None, location=None):
+        """Create or update greenhouse metadata and the farm -> greenhouses index"""
+        info = self._register(greenhouse_id, {'farmId': farm_id, 'name': name, 'location': location})
+        if self._segments is not None:
+            self._segments.save_metadata(greenhouse_id, info)
+        return info
+
+    def _register(self, greenhouse_id, updates):
+        with self._index_lock:
+            info = self._greenhouses.setdefault(greenhouse_id, {'id': greenhouse_id})
+            previous_farm = info.get('farmId')
+            info.update({key: value for key, value in updates.items() if value is not None and key != 'id'})
+
+            farm_id = info.get('farmId')
+            if farm_id is not None and farm_id != previous_farm:
+                if previous_farm is not None:
+                    self._farm_index.get(previous_farm, set()).discard(greenhouse_id)
+                self._farm_index.setdefault(farm_id, set()).add(greenhouse_id)
+            return dict(info)
+
+    def greenhouse(self, greenhouse_id):
+        """Metadata for one greenhouse, or None if it was never registered"""
+        info = self._greenhouses.get(greenhouse_id)
+        return dict(info) if info else None
+
+    def list_greenhouses(self, farm_id=None):
+        """All registered greenhouses, optionally only those of one farm"""
+        with self._index_lock:
+            if farm_id is None:
+                ids = list(self._greenhouses)
+            else:
+                ids = list(self._farm_index.get(farm_id, ()))
+            return [dict(self._greenhouses[greenhouse_id]) for greenhouse_id in sorted(ids)]
+
+    def ingest(self, greenhouse_id, timestamps, values):
+        """
+        Append a batch of readings for a greenhouse.
+        Readings older than the newest stored timestamp are rejected to keep the series ordered.
+        Raises ValueError, before anything is stored, if the batch fails validate_readings().
+        Returns: (accepted, rejected)
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = {field: np.asarray(values[field], dtype=np.float32) for field in SENSOR_FIELDS}
+        validate_readings(timestamps, values)
+
+        # Sort the batch so out-of-order readings inside it are still accepted
+        if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            values = {field: column[order] for field, column in values.items()}
+
+        if greenhouse_id not in self._greenhouses:
+            self.register_greenhouse(greenhouse_id)
+
+        shard = self.shard_for(greenhouse_id)
+        with shard.lock:
+            series = shard.series.get(greenhouse_id)
+            if series is None:
+                series = shard.series[greenhouse_id] = self._new_series(greenhouse_id)
+
+            last_timestamp = series.last_timestamp
+            if last_timestamp is not None:
+                keep = np.searchsorted(timestamps, last_timestamp, side='left')
+                if keep:
+                    timestamps = timestamps[keep:]
+                    values = {field: column[keep:] for field, column in values.items()}
+            else:
+                keep = 0
+
+            series.append(timestamps, values)
+
+            if len(timestamps):
+                self._notify(greenhouse_id, timestamps, values)
+
+        return len(timestamps), int(keep)
+
+    def restored_until(self, greenhouse_id):
+        """
+        Newest timestamp that was already on disk when the store opened, or None.
+        Listeners never saw readings up to it, so aggregates they keep don't cover that span.
+        """
+        return self._restored.get(greenhouse_id)
+
+    def has_data(self, greenhouse_id):
+        series = self._series_for(greenhouse_id)
+        return series is not None and series.size > 0
+
+    def version(self, greenhouse_id):
+        """Data version (reading count, newest timestamp) - changes whenever a batch is accepted"""
+        series = self._series_for(greenhouse_id)
+        return series.version() if series is not None else None
+
+    def latest(self, greenhouse_id):
+        """Return the newest reading as (timestamp, {field: value}) or None"""
+        series = self._series_for(greenhouse_id)
+        return series.latest() if series is not None else None
+
+    def query(self, greenhouse_id, start=None, end=None):
+        """Return (timestamps, columns) for start <= timestamp <= end, as views where possible"""
+        series = self._series_for(greenhouse_id)
+        if series is None:
+            return np.empty(0, dtype=np.float64), {field: np.empty(0, dtype=np.float32) for field in SENSOR_FIELDS}
+        return series.query(start, end)
+
+    def iter_query(self, greenhouse_id, start=None, end=None, chunk_rows=65536):
+        """Like query() but in chunks of at most chunk_rows, so long ranges never materialize at once"""
+        series = self._series_for(greenhouse_id)
+        if series is None:
+            return iter(())
+        return series.iter_query(start, end, chunk_rows)
+
+
+def validate_readings(timestamps, values, now=None):
+    """
+    Raise ValueError unless every timestamp and value is finite and no timestamp is more than
+    MAX_FUTURE_SECONDS ahead of the server clock. One bad reading rejects the whole batch.
+    """
+    if not np.all(np.isfinite(timestamps)):
+        raise ValueError('timestamps must be finite')
+    for field in SENSOR_FIELDS:
+        column = values[field]
+        if len(column) != len(timestamps):
+            raise ValueError(f'{field} must have one value per timestamp')
+        if not np.all(np.isfinite(column)):
+            raise ValueError(f'{field} values must be finite numbers')
+    if len(timestamps) and float(timestamps.max()) > (time.time() if now is None else now) + MAX_FUTURE_SECONDS:
+        raise ValueError('timestamps must not be in the future')
+
+
+def readings_to_columns(payload):
+    """
+    Convert an ingest payload into columnar arrays.
+    Accepts either {'readings': [{timestamp, temperature, humidity, soilMoisture}, ...]}
+    or columnar {'timestamps': [...], 'temperature': [...], 'humidity': [...], 'soilMoisture': [...]}.
+    Raises ValueError on malformed input, including non-finite or far-future readings.
+    """
+    if 'readings' in payload:
+        readings = payload['readings']
+        if not isinstance(readings, list):
+            raise ValueError('readings must be a list')
+
+        timestamps = np.empty(len(readings), dtype=np.float64)
+        values = {field: np.empty(len(readings), dtype=np.float32) for field in SENSOR_FIELDS}
+        for i, reading in enumerate(readings):
+            if not isinstance(reading, dict):
+                raise ValueError(f'reading {i} must be an object')
+            timestamps[i] = parse_timestamp(reading.get('timestamp'))
+            for field in SENSOR_FIELDS:
+                if reading.get(field) is None:
+                    raise ValueError(f'reading {i} is missing {field}')
+                values[field][i] = reading[field]
+        validate_readings(timestamps, values)
+        return timestamps, values
+
+    if 'timestamps' in payload:
+        timestamps = np.array([parse_timestamp(t) for t in payload['timestamps']], dtype=np.float64)
+        values = {}
+        for field in SENSOR_FIELDS:
+            column = payload.get(field)
+            if column is None or len(column) != len(timestamps):
+                raise ValueError(f'{field} must have one value per timestamp')
+            values[field] = np.asarray(column, dtype=np.float32)
+        validate_readings(timestamps, values)
+        return timestamps, values
+
+    raise ValueError('Payload must contain readings or timestamps')
+
+
+# Process-wide store instance; set SENSOR_DATA_DIR to keep history in mmap'd segment files.
+# A data directory belongs to one process: with more than one gunicorn worker, each needs its own.
+sensor_store = SensorStore(data_dir=os.getenv('SENSOR_DATA_DIR'))
+
+
+def get_sensor_store():
+    """Return the shared sensor store"""
+    return sensor_store
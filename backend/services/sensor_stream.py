@@ -0,0 +1,211 @@
+# services/sensor_stream.py
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from itertools import islice
+
+from services.sensor_store import get_sensor_store, SENSOR_FIELDS, GREENHOUSE_ID_PATTERN
+from utils.time_utils import format_timestamp, format_timestamps
+
+HEARTBEAT_SECONDS = 15
+REPLAY_BUFFER_SIZE = 1000     # events kept per greenhouse for Last-Event-ID resume
+RETRY_MILLISECONDS = 3000
+DEMO_INTERVAL_SECONDS = 5
+
+
+class StreamEvent:
+    """
+    One published event. The SSE frame is built on first read, by whichever subscriber gets there
+    first, so publishing from inside the ingest lock only queues the batch.
+    """
+
+    def __init__(self, event_id, event, build_data):
+        self.event_id = event_id
+        self.event = event
+        self._build_data = build_data
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def frame(self):
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    payload = json.dumps(self._build_data(), separators=(',', ':'))
+                    self._frame = f"id: {self.event_id}\nevent: {self.event}\ndata: {payload}\n\n".encode()
+                    self._build_data = None
+        return self._frame
+
+
+class StreamChannel:
+    """Per-greenhouse event ring; one notify_all wakes every subscriber"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self.seq = 0
+        self.subscribers = 0
+        self.demo_thread = None
+
+    def events_since(self, seq):
+        """Events newer than seq. Caller must hold the condition; encode them after releasing it."""
+        missing = min(self.seq - seq, len(self.events))
+        if missing <= 0:
+            return []
+        # Walk from the newest end - caught-up subscribers only need the last event or two
+        events = list(islice(reversed(self.events), missing))
+        events.reverse()
+        return events
+
+
+class SensorBroadcaster:
+    """Fans ingested readings out to Server-Sent Events subscribers"""
+
+    def __init__(self):
+        # Event ids carry a per-process prefix so ids from before a restart are recognised
+        self.epoch = uuid.uuid4().hex[:8]
+        self._channels = {}    # greenhouse id -> StreamChannel, created by the first subscriber
+        self._lock = threading.Lock()
+
+    def _channel(self, greenhouse_id):
+        channel = self._channels.get(greenhouse_id)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.setdefault(greenhouse_id, StreamChannel())
+        return channel
+
+    def publish(self, greenhouse_id, event, data):
+        """Queue an event and wake every subscriber of the greenhouse"""
+        self._publish(self._channel(greenhouse_id), event, lambda: data)
+
+    def _publish(self, channel, event, build_data):
+        with channel.condition:
+            channel.seq += 1
+            channel.events.append(StreamEvent(f"{self.epoch}-{channel.seq}", event, build_data))
+            channel.condition.notify_all()
+
+    def publish_readings(self, greenhouse_id, readings):
+        """Publish a 'readings' event with a list of {timestamp, temperature, humidity, soilMoisture}"""
+        self.publish(greenhouse_id, 'readings', {
+            'greenhouseId': greenhouse_id,
+            'readings': readings
+        })
+
+    def on_ingest(self, greenhouse_id, timestamps, values):
+        """
+        Store listener: push every accepted batch to the greenhouse's subscribers.
+        Batches arriving while nobody is subscribed are skipped, and formatting happens outside the
+        ingest lock when a subscriber first reads the event (the batch arrays are never modified).
+        """
+        channel = self._channels.get(greenhouse_id)
+        if channel is None or channel.subscribers <= 0:
+            return
+
+        def build_data():
+            readings = [{'timestamp': timestamp} for timestamp in format_timestamps(timestamps)]
+            for field in SENSOR_FIELDS:
+                for reading, value in zip(readings, values[field].tolist()):
+                    reading[field] = round(value, 1)
+            return {'greenhouseId': greenhouse_id, 'readings': readings}
+
+        self._publish(channel, 'readings', build_data)
+
+    def _resume_seq(self, channel, last_event_id):
+        """Sequence number to resume after, given the client's Last-Event-ID; None for an id from another epoch"""
+        if not last_event_id:
+            return channel.seq
+
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return min(int(seq), channel.seq)
+
+    def _snapshot(self, greenhouse_id, seq):
+        """
+        'readings' event with just the greenhouse's newest stored reading, or None without data.
+        Sent instead of a replay to clients resuming from another process lifetime: this ring's
+        events are unrelated to what they saw, and all they need is the current state.
+        """
+        latest = get_sensor_store().latest(greenhouse_id)
+        if latest is None:
+            return None
+        timestamp, values = latest
+        reading = {'timestamp': format_timestamp(timestamp), **{field: round(values[field], 1) for field in SENSOR_FIELDS}}
+        return StreamEvent(f"{self.epoch}-{seq}", 'readings', lambda: {'greenhouseId': greenhouse_id, 'readings': [reading]})
+
+    def subscribe(self, greenhouse_id, last_event_id=None, demo_source=None):
+        """
+        Generator of SSE frames for one connection.
+        demo_source, if given, is called to produce a reading while the greenhouse has no real data
+        and should return None once real readings exist.
+        Raises ValueError for a greenhouse id that doesn't match GREENHOUSE_ID_PATTERN.
+        """
+        if not isinstance(greenhouse_id, str) or not re.match(GREENHOUSE_ID_PATTERN, greenhouse_id):
+            raise ValueError(f"Invalid greenhouse id: {greenhouse_id!r}")
+        return self._frames(greenhouse_id, last_event_id, demo_source)
+
+    def _frames(self, greenhouse_id, last_event_id, demo_source):
+        channel = self._channel(greenhouse_id)
+
+        with channel.condition:
+            channel.subscribers += 1
+            last_seq = self._resume_seq(channel, last_event_id)
+            snapshot = last_seq is None
+            if snapshot:
+                last_seq = channel.seq
+
+        if demo_source is not None:
+            self._ensure_demo_feed(greenhouse_id, channel, demo_source)
+
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+
+            event = self._snapshot(greenhouse_id, last_seq) if snapshot else None
+            if event is not None:
+                yield event.frame()
+
+            while True:
+                with channel.condition:
+                    channel.condition.wait_for(lambda: channel.seq > last_seq, timeout=HEARTBEAT_SECONDS)
+                    events = channel.events_since(last_seq)
+                    last_seq = channel.seq
+
+                if events:
+                    yield b''.join(event.frame() for event in events)
+                else:
+                    yield b": heartbeat\n\n"
+        finally:
+            with channel.condition:
+                channel.subscribers -= 1
+
+    def _ensure_demo_feed(self, greenhouse_id, channel, demo_source):
+        """Start one shared demo publisher per greenhouse while it has subscribers"""
+        with channel.condition:
+            if channel.demo_thread is not None and channel.demo_thread.is_alive():
+                return
+
+            def run():
+                while True:
+                    time.sleep(DEMO_INTERVAL_SECONDS)
+                    with channel.condition:
+                        if channel.subscribers <= 0:
+                            channel.demo_thread = None
+                            return
+                    reading = demo_source()
+                    if reading is not None:
+                        self.publish_readings(greenhouse_id, [reading])
+
+            channel.demo_thread = threading.Thread(target=run, name=f'sensor-demo-{greenhouse_id}', daemon=True)
+            channel.demo_thread.start()
+
+
+# Process-wide broadcaster, fed by every batch the sensor store accepts
+sensor_broadcaster = SensorBroadcaster()
+get_sensor_store().add_listener(sensor_broadcaster.on_ingest)
+
+
+def get_sensor_broadcaster():
+    """Return the shared SSE broadcaster"""
+    return sensor_broadcaster
@@ -0,0 +1,175 @@
+# services/token_store.py
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from utils.sqlite_db import SQLiteDatabase
+
+# 'sqlite' shares tokens between gunicorn workers; 'memory' is per process (single-worker dev server)
+TOKEN_STORE_BACKEND = os.getenv('AUTH_TOKEN_STORE', 'sqlite').lower()
+TOKEN_STORE_PATH = os.getenv('AUTH_TOKEN_STORE_PATH', 'auth_tokens.db')
+
+# Expired rows are deleted at most this often per process, by whichever request gets there first
+PURGE_INTERVAL_SECONDS = 30
+
+# Token kinds
+LOGIN_TOKEN = 'login'
+DEVICE_TOKEN = 'device'
+
+
+class TokenStore(ABC):
+    """
+    One-time tokens (magic links, device verification) with an expiry time.
+    Records are returned as issued, expired or not, until the purge removes them,
+    so callers can tell "expired" from "unknown".
+    """
+
+    @abstractmethod
+    def issue(self, kind, token, data, expires_at):
+        """Store a token's record until expires_at, replacing any record under the same token"""
+
+    @abstractmethod
+    def get(self, kind, token):
+        """The record for a token, or None"""
+
+    @abstractmethod
+    def consume(self, kind, token):
+        """Atomically remove and return the record for a token, or None if another request used it first"""
+
+    @abstractmethod
+    def purge_expired(self, now=None):
+        """Delete expired tokens; returns how many were removed"""
+
+    @abstractmethod
+    def count(self):
+        """Number of stored tokens, expired ones included"""
+
+
+class MemoryTokenStore(TokenStore):
+    """Per-process store; a min-heap on expiry makes each purge cost O(expired log n) instead of a full scan"""
+
+    def __init__(self):
+        self._tokens = {}     # (kind, token) -> (record, expires_at)
+        self._expiry = []     # heap of (expires_at, kind, token); consumed tokens are skipped when popped
+        self._lock = threading.Lock()
+
+    def issue(self, kind, token, data, expires_at):
+        with self._lock:
+            self._tokens[(kind, token)] = (data, expires_at)
+            heapq.heappush(self._expiry, (expires_at, kind, token))
+
+    def get(self, kind, token):
+        entry = self._tokens.get((kind, token))
+        return entry[0] if entry else None
+
+    def consume(self, kind, token):
+        with self._lock:
+            entry = self._tokens.pop((kind, token), None)
+        return entry[0] if entry else None
+
+    def purge_expired(self, now=None):
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, kind, token = heapq.heappop(self._expiry)
+                entry = self._tokens.get((kind, token))
+                # A token re-issued under the same key carries a later expiry; leave it alone
+                if entry is not None and entry[1] <= now:
+                    del self._tokens[(kind, token)]
+                    removed += 1
+        return removed
+
+    def count(self):
+        return len(self._tokens)
+
+
+class SQLiteTokenStore(TokenStore):
+    """
+    Store shared by every worker process through one SQLite file in WAL mode.
+    Only the SHA-256 of each token is written to disk; consume() reads and deletes the row in one
+    BEGIN IMMEDIATE transaction, so two workers can never both accept the same link.
+    """
+
+    def __init__(self, path=TOKEN_STORE_PATH):
+        self.db = SQLiteDatabase(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS tokens ('
+            ' kind TEXT NOT NULL, digest BLOB NOT NULL, data TEXT NOT NULL, expires_at REAL NOT NULL,'
+            ' PRIMARY KEY (kind, digest)) WITHOUT ROWID'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS tokens_expiry ON tokens (expires_at)')
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def issue(self, kind, token, data, expires_at):
+        self.db.execute(
+            'INSERT OR REPLACE INTO tokens (kind, digest, data, expires_at) VALUES (?, ?, ?, ?)',
+            (kind, self._digest(token), json.dumps(data), expires_at)
+        )
+
+    def get(self, kind, token):
+        row = self.db.execute(
+            'SELECT data FROM tokens WHERE kind = ? AND digest = ?', (kind, self._digest(token))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def consume(self, kind, token):
+        # SELECT then DELETE rather than DELETE ... RETURNING, which needs SQLite 3.35+.
+        # IMMEDIATE takes the write lock up front, so only one worker sees the row.
+        key = (kind, self._digest(token))
+        connection = self.db.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT data FROM tokens WHERE kind = ? AND digest = ?', key).fetchone()
+            if row is not None:
+                connection.execute('DELETE FROM tokens WHERE kind = ? AND digest = ?', key)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return json.loads(row[0]) if row else None
+
+    def purge_expired(self, now=None):
+        now = time.time() if now is None else now
+        return self.db.execute('DELETE FROM tokens WHERE expires_at <= ?', (now,)).rowcount
+
+    def count(self):
+        return self.db.execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+
+
+def create_token_store(backend=TOKEN_STORE_BACKEND):
+    if backend == 'memory':
+        return MemoryTokenStore()
+    if backend == 'sqlite':
+        return SQLiteTokenStore()
+    raise ValueError(f"Unknown AUTH_TOKEN_STORE backend: {backend}")
+
+
+# Global instance
+token_store = create_token_store()
+last_purge = 0.0
+
+
+def get_token_store():
+    return token_store
+
+
+def purge_expired_tokens():
+    """Purge expired tokens if the last purge in this process was more than PURGE_INTERVAL_SECONDS ago"""
+    global last_purge
+    now = time.time()
+    if now - last_purge < PURGE_INTERVAL_SECONDS:
+        return 0
+    last_purge = now
+    try:
+        return token_store.purge_expired(now)
+    except Exception as e:
+        print(f"❌ Error purging expired tokens: {str(e)}")
+        return 0
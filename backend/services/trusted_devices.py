@@ -0,0 +1,256 @@
+# services/trusted_devices.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from services.user_documents import get_user_documents, field_path
+from utils.sqlite_db import SQLiteDatabase
+
+# users/{uid}.trustedDeviceMap: {fingerprint: device info}, so a trust check is one key lookup
+# and bumping lastUsed touches a single nested field
+DEVICE_MAP_FIELD = 'trustedDeviceMap'
+LEGACY_DEVICE_LIST_FIELD = 'trustedDevices'
+MAX_TRUSTED_DEVICES = 5
+
+TRUSTED_DEVICE_CACHE_ENTRIES = int(os.getenv('AUTH_TRUSTED_DEVICE_CACHE_ENTRIES', '10000'))
+TRUSTED_DEVICE_CACHE_SECONDS = float(os.getenv('AUTH_TRUSTED_DEVICE_CACHE_SECONDS', '300'))
+
+# 'sqlite' shares per-user device generations between gunicorn workers, so a device removed through
+# one worker stops being trusted by every worker's cache at once; 'memory' only covers this process
+DEVICE_GENERATION_BACKEND = os.getenv('AUTH_DEVICE_GENERATION_STORE', 'sqlite').lower()
+DEVICE_GENERATION_PATH = os.getenv('AUTH_DEVICE_GENERATION_PATH', 'auth_devices.db')
+
+
+class MemoryDeviceGenerations:
+    """Per-process generation counters"""
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, uid):
+        with self._lock:
+            return self._generations.get(uid, 0)
+
+    def bump(self, uid):
+        with self._lock:
+            self._generations[uid] = self._generations.get(uid, 0) + 1
+
+
+class SQLiteDeviceGenerations:
+    """Generation counters shared by every worker process through one SQLite file in WAL mode"""
+
+    def __init__(self, path=DEVICE_GENERATION_PATH):
+        self.db = SQLiteDatabase(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS device_generations ('
+            ' uid TEXT PRIMARY KEY, generation INTEGER NOT NULL) WITHOUT ROWID'
+        )
+
+    def get(self, uid):
+        row = self.db.execute('SELECT generation FROM device_generations WHERE uid = ?', (uid,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, uid):
+        self.db.execute('INSERT OR IGNORE INTO device_generations (uid, generation) VALUES (?, 0)', (uid,))
+        self.db.execute('UPDATE device_generations SET generation = generation + 1 WHERE uid = ?', (uid,))
+
+
+def create_device_generations(backend=DEVICE_GENERATION_BACKEND):
+    if backend == 'memory':
+        return MemoryDeviceGenerations()
+    if backend == 'sqlite':
+        return SQLiteDeviceGenerations()
+    raise ValueError(f"Unknown AUTH_DEVICE_GENERATION_STORE backend: {backend}")
+
+
+class TrustedDeviceCache:
+    """
+    LRU of (uid, fingerprint) pairs known to be trusted, with a TTL; only positive answers are cached.
+    Each entry records the user's device generation when Firestore was read; removing a device bumps
+    the generation, so a hit is only served while the shared counter still matches.
+    """
+
+    def __init__(self, generations=None, max_entries=TRUSTED_DEVICE_CACHE_ENTRIES, ttl_seconds=TRUSTED_DEVICE_CACHE_SECONDS):
+        self.generations = generations or MemoryDeviceGenerations()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()    # (uid, fingerprint) -> (expires_at, generation)
+        self._lock = threading.Lock()
+
+    def generation(self, uid):
+        """The user's current device generation, or None when the shared store can't be read"""
+        try:
+            return self.generations.get(uid)
+        except sqlite3.Error as e:
+            print(f"❌ Error reading trusted device generation: {str(e)}")
+            return None
+
+    def is_trusted(self, uid, fingerprint):
+        key = (uid, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return False
+        if self.generation(uid) != entry[1]:
+            self.invalidate(uid, fingerprint)
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return True
+
+    def remember(self, uid, fingerprint, generation):
+        """Cache a positive answer read from Firestore at the given generation"""
+        if generation is None:
+            return
+        with self._lock:
+            self._entries[(uid, fingerprint)] = (time.time() + self.ttl_seconds, generation)
+            self._entries.move_to_end((uid, fingerprint))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uid, fingerprint=None):
+        """Forget one device, or every device of a user when fingerprint is None (this process only)"""
+        with self._lock:
+            if fingerprint is not None:
+                self._entries.pop((uid, fingerprint), None)
+                return
+            for key in [key for key in self._entries if key[0] == uid]:
+                del self._entries[key]
+
+    def bump(self, uid):
+        """Invalidate every worker's cached devices for a user; call once the removal is written"""
+        self.invalidate(uid)
+        try:
+            self.generations.bump(uid)
+        except sqlite3.Error as e:
+            print(f"❌ Error bumping trusted device generation, other workers may trust removed devices "
+                  f"for up to {self.ttl_seconds:.0f}s: {str(e)}")
+
+
+# Global instance
+trusted_device_cache = TrustedDeviceCache(create_device_generations())
+
+
+def get_trusted_device_cache():
+    return trusted_device_cache
+
+
+def device_map(user_data):
+    """A user's trusted devices by fingerprint, reading the old trustedDevices array if not migrated yet"""
+    devices = user_data.get(DEVICE_MAP_FIELD)
+    if isinstance(devices, dict):
+        return devices
+    return {
+        device['fingerprint']: device
+        for device in user_data.get(LEGACY_DEVICE_LIST_FIELD, [])
+        if device.get('fingerprint')
+    }
+
+
+def list_trusted_devices(user_data):
+    """Trusted devices as a list, most recently used first"""
+    return sorted(device_map(user_data).values(), key=lambda device: device.get('lastUsed', ''), reverse=True)
+
+
+def _write_devices(uid, user_data, fields):
+    """Single-field updates once migrated; the first write after migration stores the whole map"""
+    user_documents = get_user_documents()
+    if not isinstance(user_data.get(DEVICE_MAP_FIELD), dict):
+        devices = dict(device_map(user_data))
+        for path, value in fields.items():
+            # Paths are trustedDeviceMap.<fingerprint>[.<field>]; apply them to the migrated copy
+            _, fingerprint, *rest = FieldPath.from_string(path).parts
+            if value is firestore.DELETE_FIELD:
+                devices.pop(fingerprint, None)
+            elif not rest:
+                devices[fingerprint] = value
+            else:
+                devices[fingerprint] = {**devices.get(fingerprint, {}), rest[0]: value}
+        fields = {DEVICE_MAP_FIELD: devices, LEGACY_DEVICE_LIST_FIELD: firestore.DELETE_FIELD}
+    user_documents.update(uid, fields)
+
+
+def is_trusted_device(uid, device_fingerprint):
+    """Check if device is trusted for this user"""
+    cache = get_trusted_device_cache()
+    if cache.is_trusted(uid, device_fingerprint):
+        return True
+
+    try:
+        # Read before Firestore, so a removal committed in between leaves the entry stale, not trusted
+        generation = cache.generation(uid)
+        user_data = get_user_documents().get(uid)
+        if user_data is None or device_fingerprint not in device_map(user_data):
+            return False
+
+        # Update last used timestamp (at most once per cache TTL per device)
+        _write_devices(uid, user_data, {
+            field_path(DEVICE_MAP_FIELD, device_fingerprint, 'lastUsed'): datetime.utcnow().isoformat()
+        })
+        cache.remember(uid, device_fingerprint, generation)
+        return True
+
+    except Exception as e:
+        print(f"❌ Error checking trusted device: {str(e)}")
+        return False
+
+
+def add_trusted_device(uid, device_info):
+    """Add device to trusted devices, keeping the MAX_TRUSTED_DEVICES most recently used"""
+    try:
+        cache = get_trusted_device_cache()
+        generation = cache.generation(uid)
+        user_documents = get_user_documents()
+        user_data = user_documents.get(uid)
+        if user_data is None:
+            return False
+
+        fingerprint = device_info['fingerprint']
+        devices = device_map(user_data)
+        now = datetime.utcnow().isoformat()
+        device = {**device_info, 'addedAt': devices.get(fingerprint, {}).get('addedAt', now), 'lastUsed': now}
+        fields = {field_path(DEVICE_MAP_FIELD, fingerprint): device}
+
+        # Drop the least recently used devices beyond the limit
+        others = sorted(
+            (other for other in devices.values() if other.get('fingerprint') != fingerprint),
+            key=lambda other: other.get('lastUsed', ''), reverse=True
+        )
+        stale = others[MAX_TRUSTED_DEVICES - 1:]
+        for device in stale:
+            fields[field_path(DEVICE_MAP_FIELD, device['fingerprint'])] = firestore.DELETE_FIELD
+
+        _write_devices(uid, user_data, fields)
+        if stale:
+            # The new generation makes this entry stale too; it is re-read on the next check
+            user_documents.after_commit(lambda: cache.bump(uid))
+        cache.remember(uid, fingerprint, generation)
+        return True
+
+    except Exception as e:
+        print(f"❌ Error adding trusted device: {str(e)}")
+        return False
+
+
+def remove_trusted_device(uid, device_fingerprint):
+    """Remove a device; returns False when the user does not exist"""
+    user_documents = get_user_documents()
+    user_data = user_documents.get(uid)
+    if user_data is None:
+        return False
+    cache = get_trusted_device_cache()
+    cache.invalidate(uid, device_fingerprint)
+    _write_devices(uid, user_data, {field_path(DEVICE_MAP_FIELD, device_fingerprint): firestore.DELETE_FIELD})
+    # Other workers re-read Firestore once the removal is written, not before
+    user_documents.after_commit(lambda: cache.bump(uid))
+    return True
@@ -0,0 +1,144 @@
+# services/user_documents.py
+from flask import current_app, g, has_request_context, jsonify
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from services.firebase_service import get_firestore
+
+USERS_COLLECTION = 'users'
+
+
+def field_path(*parts):
+    """Update path for a nested map field, quoting keys (e.g. fingerprints) that aren't plain identifiers"""
+    return FieldPath(*parts).to_api_repr()
+
+
+def apply_update(document, fields):
+    """Apply Firestore-style updates (dotted paths address nested map fields, DELETE_FIELD removes) to a local dict"""
+    for path, value in fields.items():
+        *parents, leaf = FieldPath.from_string(path).parts
+        target = document
+        for key in parents:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            target = child
+        if value is firestore.DELETE_FIELD:
+            target.pop(leaf, None)
+        else:
+            target[leaf] = value
+
+
+class UserDocumentSession:
+    """
+    Unit of work over users/{uid} documents for one request.
+    Each document is read from Firestore at most once; updates are applied to the
+    cached copy and buffered, then written with one update per document in commit().
+    """
+
+    def __init__(self, db=None):
+        self._db = db
+        self._documents = {}    # uid -> dict, or None when the document does not exist
+        self._pending = {}      # uid -> {field path: value}
+        self._after_commit = []
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_firestore()
+        return self._db
+
+    def _reference(self, uid):
+        return self.db.collection(USERS_COLLECTION).document(uid)
+
+    def get(self, uid):
+        """The request's working copy of the user document (pending updates applied), or None"""
+        if uid not in self._documents:
+            snapshot = self._reference(uid).get()
+            self._documents[uid] = snapshot.to_dict() if snapshot.exists else None
+        return self._documents[uid]
+
+    def update(self, uid, fields):
+        """Buffer a field update; it is visible to get() immediately and written on commit()"""
+        document = self.get(uid)
+        if document is None:
+            raise ValueError(f"User document {uid} does not exist")
+        apply_update(document, fields)
+        pending = self._pending.setdefault(uid, {})
+        for path, value in fields.items():
+            self._buffer(pending, path, value)
+
+    @staticmethod
+    def _buffer(pending, path, value):
+        """
+        Add one update to a document's pending fields. Firestore rejects an update that names both
+        a field and one of its parents, so overlapping paths are merged here.
+        """
+        parts = FieldPath.from_string(path).parts
+        for other in list(pending):
+            other_parts = FieldPath.from_string(other).parts
+            if other_parts[:len(parts)] == parts:
+                # The new value replaces this pending child (or the same field)
+                del pending[other]
+            elif parts[:len(other_parts)] == other_parts and isinstance(pending[other], dict):
+                # A pending parent map is being written anyway; fold the change into it
+                merged = dict(pending[other])
+                apply_update(merged, {FieldPath(*parts[len(other_parts):]).to_api_repr(): value})
+                pending[other] = merged
+                return
+        pending[path] = value
+
+    def forget(self, uid):
+        """Drop the cached copy so the next get() reads Firestore again"""
+        self._documents.pop(uid, None)
+
+    def after_commit(self, callback):
+        """Run callback once the buffered updates have been written; dropped if the write fails"""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        """Write all buffered updates: one update() for a single document, one batch for several"""
+        pending, self._pending = self._pending, {}
+        callbacks, self._after_commit = self._after_commit, []
+        if len(pending) == 1:
+            (uid, fields), = pending.items()
+            self._reference(uid).update(fields)
+        elif pending:
+            batch = self.db.batch()
+            for uid, fields in pending.items():
+                batch.update(self._reference(uid), fields)
+            batch.commit()
+        for callback in callbacks:
+            callback()
+
+
+def get_user_documents():
+    """The current request's session; outside a request the caller must commit() itself"""
+    if not has_request_context():
+        return UserDocumentSession()
+    session = g.get('user_documents')
+    if session is None:
+        session = g.user_documents = UserDocumentSession()
+    return session
+
+
+def commit_user_documents(response):
+    """
+    after_request hook: write the request's buffered user document updates.
+    If the write fails, a successful response is replaced with a 500 - the client must not
+    believe auth state (trusted devices, consumed tokens) was saved when it wasn't.
+    """
+    session = g.pop('user_documents', None)
+    if session is None:
+        return response
+    try:
+        session.commit()
+    except Exception:
+        current_app.logger.exception('Error committing user document updates')
+        if response.status_code < 400:
+            response = jsonify({
+                'success': False,
+                'error': 'Failed to save changes. Please try again.'
+            })
+            response.status_code = 500
+    return response
@@ -0,0 +1,80 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# Run from backend/ like the app, with the in-memory sensor tier and no Firestore sync;
+# keep shared auth state in memory instead of SQLite files in the cwd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('AUTH_TOKEN_STORE', 'memory')
+os.environ.setdefault('AUTH_RATE_LIMIT_STORE', 'memory')
+os.environ.setdefault('AUTH_DEVICE_GENERATION_STORE', 'memory')
+os.environ.pop('SENSOR_DATA_DIR', None)
+os.environ.pop('SENSOR_FIRESTORE_SYNC', None)
+
+AUTH_HEADERS = {'Authorization': 'Bearer test-token'}
+SENSOR_FIELDS = ('temperature', 'humidity', 'soilMoisture')
+
+
+@pytest.fixture
+def sensor_client(monkeypatch):
+    """Test client for the sensor blueprint with ID-token verification stubbed out"""
+    import middleware.auth_middleware as auth_middleware
+    from flask import Flask
+    from routes.sensor_routes import sensor_bp
+
+    monkeypatch.setattr(auth_middleware, 'verify_id_token', lambda token: {'uid': 'u1', 'email': 'farmer@example.com'})
+    app = Flask(__name__)
+    app.register_blueprint(sensor_bp, url_prefix='/api/sensors')
+    return app.test_client()
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeUserDocument:
+    """users/{uid} reference over a plain dict; reads are counted and updates recorded in users['_writes']"""
+
+    def __init__(self, users, uid):
+        self.users = users
+        self.uid = uid
+
+    def get(self):
+        self.users['_reads'] = self.users.get('_reads', 0) + 1
+        return FakeSnapshot(self.users.get(self.uid))
+
+    def update(self, fields):
+        self.users.setdefault('_writes', []).append(fields)
+
+
+class FakeUserFirestore:
+    def __init__(self, users):
+        self.users = users
+
+    def collection(self, name):
+        return self
+
+    def document(self, uid):
+        return FakeUserDocument(self.users, uid)
+
+    def batch(self):
+        users = self.users
+
+        class Batch:
+            def __init__(self):
+                self.updates = []
+
+            def update(self, reference, fields):
+                self.updates.append((reference.uid, fields))
+
+            def commit(self):
+                users.setdefault('_batches', []).append(self.updates)
+
+        return Batch()
@@ -0,0 +1,146 @@
+# tests/test_alert_engine.py
+import uuid
+
+import numpy as np
+import pytest
+
+import middleware.auth_middleware as auth_middleware
+import services.email_service as email_service
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.alert_engine import AlertEngine, get_alert_engine
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Engine whose e-mails stay in the outbox instead of going to a mailer thread"""
+    monkeypatch.setattr(AlertEngine, '_ensure_worker', lambda self: None)
+    return AlertEngine(cooldown_seconds=3600)
+
+
+def feed(engine, timestamps, temperatures):
+    values = {field: np.zeros(len(timestamps), dtype=np.float32) for field in SENSOR_FIELDS}
+    values['temperature'] = np.asarray(temperatures, dtype=np.float32)
+    engine.on_ingest('GH-1', np.asarray(timestamps, dtype=np.float64), values)
+
+
+def history(engine):
+    return [(alert['status'], alert['timestamp'][-8:]) for alert in reversed(engine.recent_alerts('GH-1'))]
+
+
+def outbox(engine):
+    sent = []
+    while not engine._outbox.empty():
+        sent.append(engine._outbox.get_nowait())
+    return sent
+
+
+def test_rule_fires_once_the_breach_has_lasted_its_duration(engine):
+    engine.add_rule('GH-1', 'temperature', 'above', 30, duration_seconds=600, recipients=['a@example.com'])
+    feed(engine, np.arange(0, 1200, 60), [31] * 20)
+
+    assert history(engine) == [('fired', '00:10:00')]
+    ((recipient, greenhouse_id, alerts),) = outbox(engine)
+    assert (recipient, greenhouse_id, alerts[0]['value']) == ('a@example.com', 'GH-1', 31.0)
+    assert engine.list_rules('GH-1')[0]['active']
+
+
+def test_short_breach_never_fires(engine):
+    engine.add_rule('GH-1', 'temperature', 'above', 30, duration_seconds=600)
+    feed(engine, np.arange(0, 1200, 60), [31] * 5 + [20] + [31] * 5 + [20] * 9)
+    assert history(engine) == []
+
+
+def test_hysteresis_keeps_the_alert_open_until_exit_threshold(engine):
+    engine.add_rule('GH-1', 'temperature', 'above', 30, hysteresis=2)
+    feed(engine, [0, 60, 120, 180, 240], [31, 29, 28.5, 27, 31])
+    assert history(engine) == [('fired', '00:00:00'), ('resolved', '00:03:00'), ('fired', '00:04:00')]
+
+
+def test_batches_split_anywhere_give_the_same_alerts(engine):
+    rng = np.random.default_rng(4)
+    timestamps = np.arange(0, 6000, 10.0)
+    temperatures = 30 + rng.normal(0, 2, len(timestamps))
+
+    other = AlertEngine(cooldown_seconds=3600)
+    for target in (engine, other):
+        target.add_rule('GH-1', 'temperature', 'above', 31, duration_seconds=30, hysteresis=1)
+        target.add_rule('GH-1', 'temperature', 'below', 28, duration_seconds=0)
+
+    feed(engine, timestamps, temperatures)
+    for chunk in np.array_split(np.arange(len(timestamps)), 13):
+        feed(other, timestamps[chunk], temperatures[chunk])
+    assert history(engine) == history(other)
+    assert len(history(engine)) > 4
+
+
+def test_cooldown_sends_one_mail_per_rule(engine):
+    engine.add_rule('GH-1', 'temperature', 'above', 30, recipients=['a@example.com'])
+    feed(engine, [0, 60, 120, 180], [31, 20, 31, 20])
+    assert len(outbox(engine)) == 1
+    assert [status for status, _ in history(engine)] == ['fired', 'resolved', 'fired', 'resolved']
+
+
+def test_removed_rule_no_longer_fires(engine):
+    rule = engine.add_rule('GH-1', 'temperature', 'above', 30)
+    assert engine.remove_rule('GH-1', rule['id'])
+    assert not engine.remove_rule('GH-1', rule['id'])
+    feed(engine, [0], [40])
+    assert history(engine) == []
+
+
+def create_rule(client, **fields):
+    body = {'greenhouseId': f'GH-{uuid.uuid4().hex[:8]}', 'field': 'temperature', 'condition': 'above', 'threshold': 30, **fields}
+    return client.post('/api/sensors/alerts/rules', json=body, headers=AUTH_HEADERS)
+
+
+def test_rules_only_mail_the_callers_own_address(sensor_client):
+    assert create_rule(sensor_client, recipients=['someone@example.org']).status_code == 403
+    assert create_rule(sensor_client, recipients=['farmer@example.com', 'someone@example.org']).status_code == 403
+
+    response = create_rule(sensor_client, recipients=[' Farmer@Example.com', 'farmer@example.com'])
+    assert response.status_code == 201
+    assert response.get_json()['data']['recipients'] == ['farmer@example.com']
+
+
+def test_rules_and_alerts_are_only_visible_to_their_creator(sensor_client, monkeypatch):
+    monkeypatch.setattr(AlertEngine, '_ensure_worker', lambda self: None)
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    rule = create_rule(sensor_client, greenhouseId=greenhouse_id).get_json()['data']
+    values = {field: np.zeros(1, dtype=np.float32) for field in SENSOR_FIELDS}
+    values['temperature'][:] = 40
+    get_alert_engine().on_ingest(greenhouse_id, np.array([0.0]), values)
+
+    rules_url = f'/api/sensors/alerts/rules?greenhouse={greenhouse_id}'
+    (listed,) = sensor_client.get(rules_url, headers=AUTH_HEADERS).get_json()['data']['rules']
+    assert listed['id'] == rule['id'] and 'recipients' not in listed
+    assert len(sensor_client.get(f'/api/sensors/alerts?greenhouse={greenhouse_id}', headers=AUTH_HEADERS).get_json()['data']['alerts']) == 1
+
+    monkeypatch.setattr(auth_middleware, 'verify_id_token', lambda token: {'uid': 'u2', 'email': 'other@example.com'})
+    assert sensor_client.get(rules_url, headers=AUTH_HEADERS).get_json()['data']['rules'] == []
+    assert sensor_client.get(f'/api/sensors/alerts?greenhouse={greenhouse_id}', headers=AUTH_HEADERS).get_json()['data']['alerts'] == []
+    delete_url = f"/api/sensors/alerts/rules/{rule['id']}?greenhouse={greenhouse_id}"
+    assert sensor_client.delete(delete_url, headers=AUTH_HEADERS).status_code == 404
+    assert get_alert_engine().count_rules(greenhouse_id) == 1
+
+
+@pytest.mark.parametrize('fields', [
+    {'greenhouseId': '../GH'},
+    {'name': 'x' * 101},
+    {'threshold': 'inf'},
+    {'hysteresis': float('nan')},
+    {'duration': '10x'},
+])
+def test_invalid_rules_are_rejected(sensor_client, fields):
+    assert create_rule(sensor_client, **fields).status_code == 400
+
+
+def test_alert_email_escapes_client_supplied_text(monkeypatch):
+    sent = []
+    monkeypatch.setattr(email_service, 'send_email', lambda recipient, subject, body: sent.append(body) or True)
+    alert = {'name': '<script>x</script>', 'field': 'temperature', 'condition': 'above', 'threshold': 30,
+             'value': 31.0, 'unit': '°C', 'timestamp': '2024-01-01T00:00:00Z'}
+    email_service.send_sensor_alert_email('farmer@example.com', 'GH-<b>', [alert])
+
+    (body,) = sent
+    assert '<script>' not in body and '&lt;script&gt;' in body
+    assert 'GH-&lt;b&gt;' in body
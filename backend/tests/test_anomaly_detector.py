@@ -0,0 +1,117 @@
+# tests/test_anomaly_detector.py
+import json
+import time
+import uuid
+
+import numpy as np
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.anomaly_detector import (
+    AnomalyDetector, FieldState, FlagLog, linear_filter, describe, labels, flag_bit, STUCK_READINGS
+)
+
+
+def noisy(n, seed=3, level=20.0):
+    return level + np.random.default_rng(seed).normal(0, 0.5, n)
+
+
+def feed(detector, greenhouse_id, values, start=0.0):
+    timestamps = start + np.arange(len(values), dtype=np.float64)
+    detector.on_ingest(greenhouse_id, timestamps, {field: values for field in SENSOR_FIELDS})
+    return timestamps
+
+
+def test_linear_filter_matches_the_recurrence():
+    inputs = np.random.default_rng(1).normal(size=1000)
+    expected, y = [], 5.0
+    for value in inputs:
+        y = 0.9 * y + value
+        expected.append(y)
+    np.testing.assert_allclose(linear_filter(inputs, 0.9, 5.0), expected)
+
+
+def test_split_batches_flag_the_same_readings():
+    values = noisy(2000)
+    values[700] += 10
+    values[1200:1200 + STUCK_READINGS] = 21.0
+
+    whole = FieldState().update('temperature', values)
+    state = FieldState()
+    parts = [state.update('temperature', chunk) for chunk in np.array_split(values, 13)]
+    assert np.array_equal(whole, np.concatenate(parts))
+
+
+def test_spike_stuck_and_drift_are_flagged():
+    values = noisy(3000)
+    values[800] += 10
+    values[1200:1200 + STUCK_READINGS] = 21.0
+    values[2000:] += 5
+
+    flags = FieldState().update('temperature', values)
+    assert flags[800] & flag_bit('temperature', 'spike')
+    assert flags[1200 + STUCK_READINGS - 1] & flag_bit('temperature', 'stuck')
+    assert not flags[1200 + STUCK_READINGS - 2] & flag_bit('temperature', 'stuck')
+    assert np.any(flags[2000:2200] & flag_bit('temperature', 'drift'))
+    assert not np.any(flags[100:700])
+
+
+def test_labels_describe_only_flagged_readings():
+    flags = np.array([0, flag_bit('humidity', 'spike') | flag_bit('humidity', 'stuck'), 0], dtype=np.uint16)
+    assert labels(flags) == [None, {'humidity': ['spike', 'stuck']}, None]
+    assert describe(0) is None
+
+
+def test_reading_and_bucket_flags_come_from_the_log():
+    detector = AnomalyDetector()
+    values = noisy(200)
+    values[150] += 10
+    timestamps = feed(detector, 'GH-1', values)
+
+    spike = flag_bit('temperature', 'spike')
+    assert detector.reading_flags('GH-1', [timestamps[150]])[0] & spike
+    assert detector.reading_flags('GH-1', [timestamps[149], 150.5]).tolist() == [0, 0]
+    buckets = detector.bucket_flags('GH-1', [0.0, 100.0, 200.0], 100)
+    assert [bool(flags & spike) for flags in buckets] == [False, True, False]
+    assert detector.reading_flags('GH-unknown', [1.0]).tolist() == [0]
+
+
+def test_bucket_flags_or_every_reading_in_each_bucket():
+    rng = np.random.default_rng(8)
+    detector = AnomalyDetector()
+    log = detector._state_for('GH-1')[1]
+    timestamps = np.sort(rng.choice(1000, 300, replace=False)).astype(np.float64)
+    flags = rng.integers(1, 1 << 9, len(timestamps)).astype(np.uint16)
+    log.append(timestamps, flags)
+
+    # Gaps between buckets, adjacent buckets, empty buckets and a last bucket running to the end of the log
+    starts = np.array([-50.0, 0.0, 10.0, 20.0, 95.0, 400.0, 500.0, 990.0, 2000.0])
+    expected = [int(np.bitwise_or.reduce(flags[(timestamps >= start) & (timestamps < start + 10)], initial=0)) for start in starts]
+    assert detector.bucket_flags('GH-1', starts, 10).tolist() == expected
+
+
+def test_flag_log_keeps_the_newest_entries_past_its_cap():
+    log = FlagLog(capacity=4, max_entries=100)
+    for offset in range(0, 250, 10):
+        log.append(np.arange(offset, offset + 10, dtype=np.float64), np.ones(10, dtype=np.uint16))
+    timestamps, _ = log.snapshot()
+    assert len(timestamps) <= 100
+    assert timestamps[-1] == 249
+    assert np.all(np.diff(timestamps) == 1)
+
+
+def test_latest_reports_the_anomaly(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    values = noisy(100).tolist()
+    values[-1] += 10
+    readings = [
+        {'timestamp': now - 100 + i, **{field: value for field in SENSOR_FIELDS}}
+        for i, value in enumerate(values)
+    ]
+    sensor_client.post(
+        '/api/sensors/ingest', data=json.dumps({'greenhouseId': greenhouse_id, 'readings': readings}),
+        headers={**AUTH_HEADERS, 'Content-Type': 'application/json'}
+    )
+
+    latest = sensor_client.get(f'/api/sensors/latest?greenhouse={greenhouse_id}', headers=AUTH_HEADERS).get_json()['data']
+    assert latest['anomaly'] == {field: ['spike'] for field in SENSOR_FIELDS}
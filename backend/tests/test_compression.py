@@ -0,0 +1,95 @@
+# tests/test_compression.py
+import gzip
+import json
+import time
+import uuid
+
+import numpy as np
+import pytest
+from flask import Flask, Response, jsonify
+
+import middleware.compression as compression
+import middleware.auth_middleware as auth_middleware
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from routes.sensor_routes import sensor_bp
+from services.sensor_store import get_sensor_store
+
+brotli = pytest.importorskip('brotli')
+
+BIG_BODY = {'values': list(range(2000))}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    compression.init_compression(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify(BIG_BODY)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/binary')
+    def binary():
+        return Response(b'\0' * 5000, mimetype='application/vnd.shambasecure.columnar+binary')
+
+    @app.route('/stream')
+    def stream():
+        return Response((json.dumps(BIG_BODY)[n:n + 100].encode() for n in range(0, 20000, 100)), mimetype='application/json')
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('accept, encoding, decode', [
+    ('gzip', 'gzip', gzip.decompress),
+    ('gzip, br', 'br', brotli.decompress),
+    ('br;q=0.5, gzip', 'gzip', gzip.decompress),
+])
+def test_encoding_is_negotiated(client, accept, encoding, decode):
+    response = client.get('/big', headers={'Accept-Encoding': accept})
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.vary
+    assert json.loads(decode(response.get_data())) == BIG_BODY
+
+
+def test_small_binary_and_unrequested_bodies_are_sent_as_is(client):
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/binary', headers={'Accept-Encoding': 'gzip'}).headers
+    assert client.get('/big').get_json() == BIG_BODY
+
+
+def test_streamed_body_is_compressed_chunk_by_chunk(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert json.loads(gzip.decompress(response.get_data())) == BIG_BODY
+
+
+def test_cached_history_is_compressed_once_and_revalidates(monkeypatch):
+    monkeypatch.setattr(auth_middleware, 'verify_id_token', lambda token: {'uid': 'u1'})
+    app = Flask(__name__)
+    app.register_blueprint(sensor_bp, url_prefix='/api/sensors')
+    compression.init_compression(app)
+    client = app.test_client()
+
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    get_sensor_store().ingest(greenhouse_id, now - 3600 + np.arange(120) * 30.0, {field: np.linspace(0, 50, 120) for field in SENSOR_FIELDS})
+
+    calls = []
+    real_compress = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda body, encoding: calls.append(encoding) or real_compress(body, encoding))
+
+    url = f'/api/sensors/history?greenhouse={greenhouse_id}&range=2h&interval=1m'
+    headers = {**AUTH_HEADERS, 'Accept-Encoding': 'gzip'}
+    first = client.get(url, headers=headers)
+    second = client.get(url, headers=headers)
+    assert first.get_data() == second.get_data()
+    assert calls == ['gzip']
+
+    etag, weak = first.get_etag()
+    assert weak
+    assert client.get(url, headers={**headers, 'If-None-Match': f'W/"{etag}"'}).status_code == 304
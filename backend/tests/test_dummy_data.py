@@ -0,0 +1,36 @@
+# tests/test_dummy_data.py
+import numpy as np
+
+from utils.dummy_data import RANDOM_WALKS, generate_historical_series, generate_historical_data
+
+
+def test_same_seed_gives_the_same_history():
+    first = generate_historical_series(24, '15m', seed=42, end=1_700_000_000)
+    second = generate_historical_series(24, '15m', seed=42, end=1_700_000_000)
+    other = generate_historical_series(24, '15m', seed=43, end=1_700_000_000)
+
+    for key in first:
+        np.testing.assert_array_equal(first[key], second[key])
+    assert not np.array_equal(first['temperature'], other['temperature'])
+
+
+def test_points_are_evenly_spaced_and_end_at_end():
+    series = generate_historical_series(2, '30m', seed=1, end=1_700_000_000)
+    assert series['timestamps'].tolist() == [1_700_000_000 - n * 1800.0 for n in (4, 3, 2, 1, 0)]
+
+
+def test_long_walks_stay_inside_their_bounds():
+    series = generate_historical_series(365 * 24, '1m', seed=5)
+    for field, (_, step, low, high) in RANDOM_WALKS.items():
+        column = series[field]
+        assert len(column) == 365 * 24 * 60 + 1
+        assert column.min() >= low and column.max() <= high
+        # Reflecting off a bound never makes a single step bigger than the walk's step
+        assert np.abs(np.diff(column.astype(np.float64))).max() <= step + 0.1
+
+
+def test_row_output_matches_the_series():
+    rows = generate_historical_data(6, '1h', seed=9)
+    series = generate_historical_series(6, '1h', seed=9)
+    assert len(rows) == 7
+    assert [row['humidity'] for row in rows] == [round(value, 1) for value in series['humidity'].tolist()]
@@ -0,0 +1,128 @@
+# tests/test_export_format.py
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import get_sensor_store
+from utils.export_format import (
+    decimal_bytes,
+    encode_csv_chunk,
+    encode_export_header,
+    encode_export_block,
+    iter_export_blocks,
+    EXPORT_TRAILER,
+    CSV_HEADER
+)
+from utils.time_utils import format_timestamp, format_timestamps, parse_timestamp
+
+
+def columns(values):
+    return {field: np.asarray(values, dtype=np.float32) for field in SENSOR_FIELDS}
+
+
+def test_csv_rows_match_per_value_formatting():
+    timestamps = np.array([0.0, 951782400.5, 1_700_000_000.123456, 4102444799.0])
+    values = [-12.34, 0.0, 1234.56, 25.0]
+    rows = encode_csv_chunk('GH-1', timestamps, columns(values)).decode().splitlines()
+
+    expected = [
+        'GH-1,%s,%s' % (timestamp, ','.join(['%.1f' % value] * 3))
+        for timestamp, value in zip(format_timestamps(timestamps), np.asarray(values, dtype=np.float32).tolist())
+    ]
+    assert rows == expected
+    assert rows[1].startswith('GH-1,2000-02-29T00:00:00.500000,')
+
+
+def test_vectorized_timestamps_match_format_timestamp():
+    rng = np.random.default_rng(6)
+    timestamps = np.concatenate((
+        rng.uniform(0, 4102444800, 20000),
+        np.round(rng.uniform(0, 4102444800, 1000)),          # whole seconds: no '.ffffff'
+        [0.0, 0.9999996, 2.5e-6, 1_700_000_000.0000005, 4102444799.9999995]
+    ))
+    expected = [format_timestamp(timestamp) for timestamp in timestamps.tolist()]
+    assert format_timestamps(timestamps) == expected
+    rows = encode_csv_chunk('GH-1', timestamps, columns(np.zeros(len(timestamps)))).decode().splitlines()
+    assert [row.split(',')[1] for row in rows] == expected
+
+
+def formatted(values):
+    matrix = decimal_bytes(values)
+    return [row[row != 0].tobytes().decode() for row in matrix]
+
+
+@pytest.mark.parametrize('values', [
+    [0.0, -0.0, -0.04, 0.04, -0.05, 0.05, -0.06, 0.25, 0.35, -0.35, 2.675, 999.95, -999.95, 999.94],
+    [1000.0, -1234.56, 12345678.9, -99999999.95, 1e8 + 0.05, 1e12, -3.4e38, float('inf'), float('-inf')],
+    [-0.01, 5.0, 123456.7],
+])
+def test_decimal_bytes_match_percent_formatting(values):
+    assert formatted(values) == ['%.1f' % value for value in values]
+
+
+def test_decimal_bytes_match_percent_formatting_on_random_values():
+    rng = np.random.default_rng(16)
+    for scale in (1, 100, 1e4, 1e7, 1e10):
+        values = rng.normal(0, scale, 5000)
+        values[::7] = np.round(values[::7], 2)          # plenty of exact-looking ties
+        for dtype in (np.float64, np.float32):
+            cast = values.astype(dtype).astype(np.float64)
+            assert formatted(cast) == ['%.1f' % value for value in cast.tolist()]
+
+
+def test_missing_values_are_empty_csv_fields():
+    (row,) = encode_csv_chunk('GH-1', np.array([0.0]), columns([np.nan])).decode().splitlines()
+    assert row == 'GH-1,1970-01-01T00:00:00,,,'
+    assert encode_csv_chunk('GH-1', np.empty(0), columns([])) == b''
+
+
+def test_binary_export_round_trips_and_detects_truncation():
+    payload = (
+        encode_export_header()
+        + encode_export_block('GH-1', np.array([1.0, 2.0]), columns([1.5, 2.5]))
+        + encode_export_block('GH-2', np.array([3.0]), columns([-4]))
+        + EXPORT_TRAILER
+    )
+    blocks = list(iter_export_blocks(payload))
+    assert [(greenhouse_id, timestamps.tolist()) for greenhouse_id, timestamps, _ in blocks] == [('GH-1', [1.0, 2.0]), ('GH-2', [3.0])]
+    assert blocks[0][2]['soilMoisture'].tolist() == [1.5, 2.5]
+
+    with pytest.raises(ValueError):
+        list(iter_export_blocks(payload[:-len(EXPORT_TRAILER)]))
+
+
+def test_export_route_streams_every_greenhouse(sensor_client, monkeypatch):
+    import routes.sensor_routes as sensor_routes
+
+    monkeypatch.setattr(sensor_routes, 'EXPORT_CHUNK_ROWS', 3)
+    first, second = (f'GH-{uuid.uuid4().hex[:8]}' for _ in range(2))
+    now = time.time()
+    get_sensor_store().ingest(first, now - 100 + np.arange(7.0), columns(np.arange(7)))
+    get_sensor_store().ingest(second, [now - 50], columns([9]))
+
+    response = sensor_client.get(f'/api/sensors/export?greenhouse={first},{second}&range=1h', headers=AUTH_HEADERS)
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data().splitlines(keepends=True)
+    assert lines[0] == CSV_HEADER
+    assert [line.split(b',')[0] for line in lines[1:]] == [first.encode()] * 7 + [second.encode()]
+
+    assert sensor_client.get('/api/sensors/export?greenhouse=../etc', headers=AUTH_HEADERS).status_code == 400
+    assert sensor_client.get(f'/api/sensors/export?greenhouse={first}&start=yesterday', headers=AUTH_HEADERS).status_code == 400
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e300', float('nan'), -1, 4102444800, True, '2100-01-01T00:00:00Z'])
+def test_parse_timestamp_rejects_non_finite_and_out_of_range_values(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+
+def test_parse_timestamp_accepts_seconds_milliseconds_and_iso():
+    assert parse_timestamp('1704067200') == parse_timestamp(1704067200000) == parse_timestamp('2024-01-01T00:00:00Z') == 1704067200
+
+
+def test_export_rejects_non_finite_start(sensor_client):
+    response = sensor_client.get('/api/sensors/export?greenhouse=GH-001&start=nan', headers=AUTH_HEADERS)
+    assert response.status_code == 400
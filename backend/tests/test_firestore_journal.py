@@ -0,0 +1,199 @@
+# tests/test_firestore_journal.py
+import os
+
+import numpy as np
+import pytest
+
+import services.firestore_writer as firestore_writer
+from conftest import SENSOR_FIELDS
+from services.firestore_writer import FirestoreWriter
+
+
+class FakeReference:
+    def __init__(self, path=''):
+        self.path = path
+
+    def collection(self, name):
+        return FakeReference(f'{self.path}/{name}')
+
+    def document(self, name):
+        return FakeReference(f'{self.path}/{name}')
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, reference, data):
+        self.writes.append(reference.path)
+
+    def commit(self):
+        if self.client.offline:
+            raise ConnectionError('offline')
+        self.client.documents.extend(self.writes)
+
+
+class FakeFirestore(FakeReference):
+    def __init__(self, offline=False):
+        super().__init__()
+        self.offline = offline
+        self.documents = []
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+def values(count):
+    return {field: np.ones(count, dtype=np.float32) for field in SENSOR_FIELDS}
+
+
+def flush(writer):
+    """One pass of the flusher thread's loop"""
+    with writer._condition:
+        runs, taken = writer._take()
+    writer._commit(runs)
+    writer._acknowledge(taken)
+
+
+@pytest.fixture
+def start_writer(tmp_path):
+    """Start a writer as if it ran in process `pid`; flushes are driven by the test, not the thread"""
+    writers = []
+
+    def start(pid, client):
+        writer = FirestoreWriter(str(tmp_path / 'journal.bin'), flush_interval=3600, client_factory=lambda: client)
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(firestore_writer.os, 'getpid', lambda: pid)
+            writer.start()
+        writers.append(writer)
+        return writer
+
+    yield start
+    for writer in writers:
+        try:
+            os.close(writer._fd)
+        except OSError:
+            pass
+
+
+def test_unflushed_readings_are_replayed_after_a_crash(start_writer):
+    first_client = FakeFirestore()
+    crashed = start_writer(1, first_client)
+    crashed.on_ingest('GH-A', np.array([1000.0]), values(1))
+    crashed.on_ingest('GH-A', np.array([1001.0, 1002.0]), values(2))
+    # A two-reading flush commits one full frame and half of the next before the process dies
+    crashed.batch_limit = 2
+    flush(crashed)
+    assert first_client.documents == ['/greenhouses/GH-A/readings/1000000', '/greenhouses/GH-A/readings/1001000']
+    os.close(crashed._fd)
+
+    client = FakeFirestore()
+    restarted = start_writer(2, client)
+    assert restarted.stats()['pendingReadings'] == 2
+    flush(restarted)
+    # The half-committed frame is replayed whole; document ids make the rewrite idempotent
+    assert client.documents == ['/greenhouses/GH-A/readings/1001000', '/greenhouses/GH-A/readings/1002000']
+    assert restarted.stats()['journalBytes'] == 0
+
+
+def test_torn_trailing_frame_is_dropped(start_writer):
+    writer = start_writer(1, FakeFirestore(offline=True))
+    writer.on_ingest('GH-A', np.array([1000.0]), values(1))
+    intact = os.path.getsize(writer.journal_path)
+    os.write(writer._fd, b'\x04\x00\x09\x00\x00\x00GH')
+    os.close(writer._fd)
+
+    restarted = start_writer(2, FakeFirestore())
+    assert restarted.stats()['pendingReadings'] == 1
+    assert os.path.getsize(restarted.journal_path) == intact
+
+
+def test_failed_commit_keeps_the_queue(start_writer):
+    client = FakeFirestore(offline=True)
+    writer = start_writer(1, client)
+    writer.on_ingest('GH-A', np.array([1000.0, 1001.0]), values(2))
+    with pytest.raises(ConnectionError):
+        flush(writer)
+    assert writer.stats()['pendingReadings'] == 2
+
+    client.offline = False
+    flush(writer)
+    assert len(client.documents) == 2
+    assert writer.stats()['pendingReadings'] == 0
+
+
+def test_an_outage_stops_queueing_past_the_pending_cap(start_writer):
+    client = FakeFirestore(offline=True)
+    writer = start_writer(1, client)
+    writer.max_pending = 5
+    writer.on_ingest('GH-A', np.array([1000.0, 1001.0, 1002.0]), values(3))
+    journal_bytes = writer.stats()['journalBytes']
+    writer.on_ingest('GH-A', np.array([1003.0, 1004.0, 1005.0]), values(3))
+
+    stats = writer.stats()
+    assert (stats['pendingReadings'], stats['droppedReadings'], stats['journalBytes']) == (3, 3, journal_bytes)
+
+    client.offline = False
+    flush(writer)
+    writer.on_ingest('GH-A', np.array([1006.0]), values(1))
+    flush(writer)
+    assert [path.rsplit('/', 1)[1] for path in client.documents] == ['1000000', '1001000', '1002000', '1006000']
+
+
+def test_draining_one_worker_keeps_another_workers_journal(start_writer):
+    stuck = start_writer(101, FakeFirestore(offline=True))
+    healthy_client = FakeFirestore()
+    healthy = start_writer(102, healthy_client)
+    assert stuck.journal_path != healthy.journal_path
+
+    stuck.on_ingest('GH-A', np.array([1000.0, 1001.0]), values(2))
+    healthy.on_ingest('GH-B', np.array([2000.0]), values(1))
+    stuck_journal = os.path.getsize(stuck.journal_path)
+
+    # The healthy worker's queue drains, which truncates its own journal only
+    flush(healthy)
+    assert healthy_client.documents == ['/greenhouses/GH-B/readings/2000000']
+    assert os.path.getsize(healthy.journal_path) == 0
+    assert os.path.getsize(stuck.journal_path) == stuck_journal
+
+
+def test_journal_of_a_crashed_worker_is_adopted_once(start_writer):
+    crashed = start_writer(201, FakeFirestore(offline=True))
+    crashed.on_ingest('GH-A', np.array([1000.0, 1001.0]), values(2))
+    # A crash releases the journal lock without flushing anything
+    os.close(crashed._fd)
+
+    client = FakeFirestore()
+    survivor = start_writer(202, client)
+    assert not os.path.exists(crashed.journal_path)
+    flush(survivor)
+    assert client.documents == ['/greenhouses/GH-A/readings/1000000', '/greenhouses/GH-A/readings/1001000']
+
+    # A later worker finds nothing left to adopt
+    late_client = FakeFirestore()
+    late = start_writer(203, late_client)
+    assert late.stats()['pendingReadings'] == 0
+
+
+def test_live_worker_journal_is_not_adopted(start_writer):
+    live = start_writer(301, FakeFirestore(offline=True))
+    live.on_ingest('GH-A', np.array([1000.0]), values(1))
+
+    other = start_writer(302, FakeFirestore())
+    assert other.stats()['pendingReadings'] == 0
+    assert os.path.getsize(live.journal_path) > 0
+
+
+def test_readings_in_the_same_millisecond_get_distinct_document_ids(start_writer):
+    client = FakeFirestore()
+    writer = start_writer(401, client)
+    writer.on_ingest('GH-A', np.array([1000.0001, 1000.0002]), values(2))
+    writer.on_ingest('GH-A', np.array([1000.0003, 1000.5]), values(2))
+    flush(writer)
+    assert client.documents == [
+        '/greenhouses/GH-A/readings/1000000',
+        '/greenhouses/GH-A/readings/1000000-1',
+        '/greenhouses/GH-A/readings/1000000-2',
+        '/greenhouses/GH-A/readings/1000500',
+    ]
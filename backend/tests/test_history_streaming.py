@@ -0,0 +1,45 @@
+# tests/test_history_streaming.py
+import json
+import time
+import uuid
+
+import numpy as np
+
+import routes.sensor_routes as sensor_routes
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import get_sensor_store
+from utils.streaming import iter_history_json
+
+
+def test_streamed_envelope_is_valid_json_across_chunks():
+    timestamps = 1_700_000_000 + np.arange(4500) * 60.0
+    columns = {field: np.linspace(0, 99.96, 4500, dtype=np.float32) for field in SENSOR_FIELDS}
+
+    chunks = list(iter_history_json('ok', '7d', '1m', timestamps, columns))
+    assert len(chunks) > 3
+    body = json.loads(b''.join(chunks))
+    assert body['success'] is True
+    assert (body['data']['range'], body['data']['interval']) == ('7d', '1m')
+    readings = body['data']['readings']
+    assert len(readings) == 4500
+    assert readings[-1]['temperature'] == 100.0
+    assert [reading['humidity'] for reading in readings[:3]] == [0.0, 0.0, 0.0]
+
+
+def test_large_history_is_streamed_with_the_same_body(sensor_client, monkeypatch):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    timestamps = now - 12 * 3600 + np.arange(12 * 60) * 60.0
+    get_sensor_store().ingest(greenhouse_id, timestamps, {field: np.full(len(timestamps), 21.5) for field in SENSOR_FIELDS})
+    url = f'/api/sensors/history?greenhouse={greenhouse_id}&range=24h&interval=1m'
+
+    monkeypatch.setattr(sensor_routes, 'STREAM_THRESHOLD_POINTS', 100)
+    streamed = sensor_client.get(url, headers=AUTH_HEADERS)
+    assert 'Content-Length' not in streamed.headers
+
+    monkeypatch.setattr(sensor_routes, 'STREAM_THRESHOLD_POINTS', 10 ** 6)
+    buffered = sensor_client.get(url, headers=AUTH_HEADERS)
+    assert 'Content-Length' in buffered.headers
+
+    assert json.loads(streamed.get_data()) == buffered.get_json()
+    assert len(buffered.get_json()['data']['readings']) == 12 * 60
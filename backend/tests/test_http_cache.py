@@ -0,0 +1,71 @@
+# tests/test_http_cache.py
+import time
+import uuid
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import get_sensor_store
+from utils.http_cache import data_etag, bucket_cache_control
+
+
+def ingest_one(greenhouse_id, timestamp, value=20.0):
+    get_sensor_store().ingest(greenhouse_id, [timestamp], {field: [value] for field in SENSOR_FIELDS})
+
+
+def test_etag_depends_on_version_and_params():
+    assert data_etag(None, 'latest') is None
+    assert data_etag((1, 10.0), 'latest', 'GH-1') == data_etag((1, 10.0), 'latest', 'GH-1')
+    assert data_etag((1, 10.0), 'latest', 'GH-1') != data_etag((2, 10.0), 'latest', 'GH-1')
+    assert data_etag((1, 10.0), 'latest', 'GH-1') != data_etag((1, 10.0), 'latest', 'GH-2')
+
+
+def test_cache_lifetime_ends_with_the_bucket():
+    assert bucket_cache_control(60, now=1000) == 'private, no-cache'
+    assert bucket_cache_control(3600, now=3600 * 5 + 600) == 'private, max-age=3000'
+    assert bucket_cache_control(3600, now=3600 * 6 - 0.2).endswith('max-age=1')
+
+
+def test_latest_revalidates_until_new_data_arrives(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    url = f'/api/sensors/latest?greenhouse={greenhouse_id}'
+
+    # Random demo data is never cached
+    assert sensor_client.get(url, headers=AUTH_HEADERS).headers.get('ETag') is None
+
+    ingest_one(greenhouse_id, time.time() - 60)
+    first = sensor_client.get(url, headers=AUTH_HEADERS)
+    etag = first.headers['ETag']
+    assert {'Accept', 'Authorization'} <= set(first.vary)
+
+    cached = sensor_client.get(url, headers={**AUTH_HEADERS, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+
+    ingest_one(greenhouse_id, time.time() - 30, 25.0)
+    fresh = sensor_client.get(url, headers={**AUTH_HEADERS, 'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+    assert fresh.get_json()['data']['temperature'] == 25.0
+
+
+def test_latest_etag_changes_when_the_greenhouse_is_renamed(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    url = f'/api/sensors/latest?greenhouse={greenhouse_id}'
+    ingest_one(greenhouse_id, time.time() - 60)
+    etag = sensor_client.get(url, headers=AUTH_HEADERS).headers['ETag']
+
+    get_sensor_store().register_greenhouse(greenhouse_id, name='North tunnel')
+    renamed = sensor_client.get(url, headers={**AUTH_HEADERS, 'If-None-Match': etag})
+    assert renamed.status_code == 200
+    assert renamed.get_json()['data']['greenhouse']['name'] == 'North tunnel'
+
+
+def test_history_etag_depends_on_format(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    ingest_one(greenhouse_id, time.time() - 60)
+    url = f'/api/sensors/history?greenhouse={greenhouse_id}&range=24h&interval=1h'
+
+    json_etag = sensor_client.get(url, headers=AUTH_HEADERS).headers['ETag']
+    binary = sensor_client.get(url + '&format=binary', headers={**AUTH_HEADERS, 'If-None-Match': json_etag})
+    assert binary.status_code == 200
+    assert binary.headers['ETag'] != json_etag
+    assert 'max-age=' in binary.headers['Cache-Control']
@@ -0,0 +1,121 @@
+# tests/test_id_token_cache.py
+import os
+import time
+
+import firebase_admin
+import pytest
+from firebase_admin import auth, credentials
+from google.auth.credentials import AnonymousCredentials
+
+import services.firebase_service as firebase_service
+from services.id_token_cache import IdTokenCache, get_id_token_cache
+
+
+def claims(uid, expires_in=3600):
+    return {'uid': uid, 'exp': time.time() + expires_in}
+
+
+def test_cached_claims_are_returned_until_exp_minus_skew(monkeypatch):
+    cache = IdTokenCache(skew_seconds=30)
+    cache.put('token-a', claims('a', expires_in=100))
+    assert cache.get('token-a')['uid'] == 'a'
+
+    now = time.time()
+    monkeypatch.setattr('services.id_token_cache.time.time', lambda: now + 71)
+    assert cache.get('token-a') is None
+    assert cache.counters['expirations'] == 1
+
+
+def test_tokens_without_a_usable_exp_are_not_cached():
+    cache = IdTokenCache(skew_seconds=30)
+    cache.put('no-exp', {'uid': 'a'})
+    cache.put('bad-exp', {'uid': 'a', 'exp': 'soon'})
+    cache.put('nearly-expired', claims('a', expires_in=10))
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = IdTokenCache(max_entries=2)
+    cache.put('token-a', claims('a'))
+    cache.put('token-b', claims('b'))
+    cache.get('token-a')
+    cache.put('token-c', claims('c'))
+
+    assert cache.get('token-b') is None
+    assert cache.get('token-a')['uid'] == 'a'
+    assert cache.counters['evictions'] == 1
+
+
+def test_only_the_token_digest_is_kept():
+    cache = IdTokenCache()
+    cache.put('secret-token', claims('a'))
+    assert all(isinstance(key, bytes) and b'secret-token' not in key for key in cache._entries)
+
+
+class FakeAuth:
+    def __init__(self):
+        self.calls = 0
+
+    def verify_id_token(self, id_token):
+        self.calls += 1
+        if id_token == 'forged':
+            raise ValueError('bad signature')
+        return claims(id_token)
+
+
+class FakeResponse:
+    status = 200
+
+
+@pytest.fixture
+def fake_auth(monkeypatch):
+    fake = FakeAuth()
+    monkeypatch.setattr(firebase_service, 'get_auth', lambda: fake)
+    get_id_token_cache().clear()
+    yield fake
+    get_id_token_cache().clear()
+
+
+def test_verify_id_token_checks_the_signature_once(fake_auth):
+    assert firebase_service.verify_id_token('user-1')['uid'] == 'user-1'
+    assert firebase_service.verify_id_token('user-1')['uid'] == 'user-1'
+    assert fake_auth.calls == 1
+
+
+def test_failed_verification_is_not_cached(fake_auth):
+    for _ in range(2):
+        with pytest.raises(Exception, match='Token verification failed'):
+            firebase_service.verify_id_token('forged')
+    assert fake_auth.calls == 2
+
+
+def test_key_prewarming_is_pinned_to_the_required_firebase_admin():
+    requirements = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'requirements.txt')
+    with open(requirements) as f:
+        pins = dict(line.strip().split('==') for line in f if '==' in line)
+    assert pins['firebase-admin'] == firebase_service.KEY_PREWARM_FIREBASE_ADMIN_VERSION
+
+
+def test_refresh_fetches_keys_through_the_verifiers_cached_request(monkeypatch):
+    class Credential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    app = firebase_admin.initialize_app(Credential(), {'projectId': 'test'}, name=f'keys-{time.time_ns()}')
+    try:
+        verifier = auth._get_client(app)._token_verifier
+        assert callable(verifier.request)
+
+        fetched = []
+        monkeypatch.setattr(verifier, 'request', lambda url, headers: fetched.append((url, headers)) or FakeResponse())
+        firebase_service.refresh_signing_keys(app)
+        assert fetched == [(firebase_service.ID_TOKEN_CERT_URL, {'Cache-Control': 'no-cache'})]
+    finally:
+        firebase_admin.delete_app(app)
+
+
+def test_other_firebase_admin_versions_skip_prewarming(monkeypatch):
+    monkeypatch.setattr(firebase_admin, '__version__', '7.0.0')
+    assert firebase_service.start_key_refresher() is None
+    with pytest.raises(RuntimeError):
+        firebase_service.refresh_signing_keys()
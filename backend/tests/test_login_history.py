@@ -0,0 +1,107 @@
+# tests/test_login_history.py
+import pytest
+from google.api_core.exceptions import NotFound
+
+import services.login_history as login_history
+from conftest import FakeUserFirestore
+from services.login_history import LoginHistoryWriter, LOGIN_HISTORY_LIMIT
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    """Writer flushed by hand: no background thread"""
+    client = FakeUserFirestore({})
+    writer = LoginHistoryWriter(flush_interval=3600, client_factory=lambda: client)
+    monkeypatch.setattr(writer, '_ensure_worker', lambda: None)
+    return writer
+
+
+def flush(writer):
+    """Commit the queue; returns the batch's (uid, fields) updates"""
+    taken = writer._take()
+    client = writer._client_factory()
+    writer._commit(taken)
+    (updates,) = client.users.pop('_batches')
+    return updates
+
+
+def test_logins_are_coalesced_per_user_into_one_batch(writer):
+    writer.record('u1', {'timestamp': 't1'})
+    writer.record('u2', {'timestamp': 't2'})
+    writer.record('u1', {'timestamp': 't3'})
+
+    updates = flush(writer)
+    assert [(uid, fields['loginHistory'].values, fields['lastLogin']) for uid, fields in updates] == [
+        ('u1', [{'timestamp': 't1'}, {'timestamp': 't3'}], 't3'),
+        ('u2', [{'timestamp': 't2'}], 't2'),
+    ]
+    assert writer.stats()['pendingUsers'] == 0
+
+
+def test_history_beyond_the_limit_is_trimmed(writer):
+    history = [{'timestamp': f'old-{n}'} for n in range(LOGIN_HISTORY_LIMIT)]
+    for n in range(3):
+        writer.record('u1', {'timestamp': f'new-{n}'}, history)
+
+    (append, trim) = flush(writer)
+    assert append[1]['loginHistory'].values == [{'timestamp': f'new-{n}'} for n in range(3)]
+    assert trim[1]['loginHistory'].values == history[:3]
+
+
+def test_failed_batch_is_requeued_ahead_of_newer_logins(writer):
+    writer.record('u1', {'timestamp': 't1'})
+    taken = writer._take()
+    writer.record('u2', {'timestamp': 't2'})
+    writer.record('u1', {'timestamp': 't3'})
+    writer._requeue(taken)
+
+    updates = flush(writer)
+    assert [uid for uid, _ in updates] == ['u1', 'u2']
+    assert updates[0][1]['loginHistory'].values == [{'timestamp': 't1'}, {'timestamp': 't3'}]
+
+
+def test_oldest_user_is_dropped_past_the_pending_cap(writer, monkeypatch):
+    monkeypatch.setattr(login_history, 'MAX_PENDING_USERS', 2)
+    for uid in ('u1', 'u2', 'u3'):
+        writer.record(uid, {'timestamp': uid})
+
+    assert [uid for uid, _ in flush(writer)] == ['u2', 'u3']
+    assert writer.stats()['dropped'] == 1
+
+
+class FailingUserFirestore(FakeUserFirestore):
+    """Batches fail with NotFound whenever they touch the 'deleted' user"""
+
+    def __init__(self):
+        super().__init__({})
+        self.written = []
+
+    def batch(self):
+        client = self
+
+        class Batch:
+            def __init__(self):
+                self.uids = []
+
+            def update(self, reference, fields):
+                self.uids.append(reference.uid)
+
+            def commit(self):
+                if 'deleted' in self.uids:
+                    raise NotFound('No document to update')
+                client.written.extend(dict.fromkeys(self.uids))
+
+        return Batch()
+
+
+def test_one_failing_user_does_not_lose_the_rest_of_the_batch():
+    client = FailingUserFirestore()
+    writer = LoginHistoryWriter(flush_interval=3600, client_factory=lambda: client)
+    for n in range(20):
+        writer.record(f'user-{n}', {'timestamp': f't{n}'})
+    writer.record('deleted', {'timestamp': 't'})
+
+    # The deleted user is retried MAX_ATTEMPTS times on its own, then dropped; the queue ends up empty
+    assert writer.drain(timeout=5)
+    assert sorted(client.written) == sorted(f'user-{n}' for n in range(20))
+    assert writer.stats()['dropped'] == 1
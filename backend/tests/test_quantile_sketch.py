@@ -0,0 +1,75 @@
+# tests/test_quantile_sketch.py
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.quantile_sketch import KLLSketch, merged
+from services.sensor_store import get_sensor_store
+
+FRACTIONS = (0.05, 0.5, 0.95)
+
+
+def rank_errors(sketch, values):
+    """Normalized rank error of each estimated quantile against the exact data"""
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(FRACTIONS)
+    return [abs(np.searchsorted(ordered, estimate, side='right') / len(ordered) - fraction)
+            for estimate, fraction in zip(estimates, FRACTIONS)]
+
+
+def test_sketch_stays_small_and_accurate():
+    values = np.random.default_rng(11).normal(22, 5, 200_000).astype(np.float32)
+    sketch = KLLSketch(200)
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+
+    assert sketch.n == len(values)
+    assert sum(len(level) for level in sketch.levels) < 3 * 200
+    assert max(rank_errors(sketch, values)) < 0.02
+
+
+def test_merged_sketches_answer_for_every_input():
+    rng = np.random.default_rng(12)
+    parts = [rng.uniform(low, low + 10, 20_000).astype(np.float32) for low in (0, 10, 20)]
+    sketches = []
+    for part in parts:
+        sketch = KLLSketch(200)
+        sketch.update(part)
+        sketches.append(sketch)
+
+    combined = merged([*sketches, None])
+    assert combined.n == 60_000
+    assert (combined.min, combined.max) == (float(min(p.min() for p in parts)), float(max(p.max() for p in parts)))
+    assert max(rank_errors(combined, np.concatenate(parts))) < 0.02
+
+
+def test_small_and_empty_sketches_are_exact():
+    sketch = KLLSketch(200)
+    assert sketch.quantiles(FRACTIONS) == [None, None, None]
+    sketch.update(np.arange(1, 101))
+    assert sketch.quantiles((0.05, 0.5, 0.95)) == [5.0, 50.0, 95.0]
+
+
+def test_stats_route_reports_percentiles(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    get_sensor_store().ingest(greenhouse_id, now - 3000 + np.arange(1000) * 2.0, {field: np.arange(1000) for field in SENSOR_FIELDS})
+
+    stats = sensor_client.get(f'/api/sensors/stats?greenhouse={greenhouse_id}&period=1h', headers=AUTH_HEADERS).get_json()['data']
+    temperature = stats['temperature']
+    assert temperature['p5'] == pytest.approx(50, abs=20)
+    assert temperature['p50'] == pytest.approx(500, abs=20)
+    assert temperature['p95'] == pytest.approx(950, abs=20)
+
+
+def test_history_route_serves_percentiles_from_hourly_sketches(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    hour = (time.time() // 3600 - 1) * 3600
+    get_sensor_store().ingest(greenhouse_id, hour + np.arange(1000) * 3.0, {field: np.arange(1000) for field in SENSOR_FIELDS})
+
+    response = sensor_client.get(f'/api/sensors/history?greenhouse={greenhouse_id}&range=24h&interval=1h&agg=p95', headers=AUTH_HEADERS)
+    (reading,) = response.get_json()['data']['readings']
+    assert reading['temperature'] == pytest.approx(950, abs=20)
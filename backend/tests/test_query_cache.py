@@ -0,0 +1,72 @@
+# tests/test_query_cache.py
+import time
+import uuid
+
+import services.query_cache as query_cache
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.query_cache import QueryCache, get_query_cache
+from services.sensor_store import get_sensor_store
+
+
+def put(cache, key, window_start=0.0, body=b'{}'):
+    cache.put(key, body, 'application/json', window_start, cache.generation(key[0]))
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    put(cache, ('GH-1', 'a'))
+    put(cache, ('GH-1', 'b'))
+    assert cache.get(('GH-1', 'a'))
+    put(cache, ('GH-1', 'c'))
+
+    assert cache.get(('GH-1', 'b')) is None
+    assert cache.get(('GH-1', 'a')) and cache.get(('GH-1', 'c'))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire(monkeypatch):
+    cache = QueryCache(ttl_seconds=10)
+    now = time.time()
+    put(cache, ('GH-1', 'a'))
+    monkeypatch.setattr(query_cache.time, 'time', lambda: now + 11)
+    assert cache.get(('GH-1', 'a')) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_ingest_drops_only_windows_it_lands_in():
+    cache = QueryCache()
+    put(cache, ('GH-1', 'last hour'), window_start=1000.0)
+    put(cache, ('GH-1', 'yesterday'), window_start=100.0)
+    put(cache, ('GH-2', 'last hour'), window_start=100.0)
+
+    cache.invalidate('GH-1', newest=500.0)
+    assert cache.get(('GH-1', 'last hour'))
+    assert cache.get(('GH-1', 'yesterday')) is None
+    assert cache.get(('GH-2', 'last hour'))
+
+
+def test_result_computed_during_an_ingest_is_not_cached():
+    cache = QueryCache()
+    generation = cache.generation('GH-1')
+    cache.invalidate('GH-1', newest=10.0)
+    cache.put(('GH-1', 'a'), b'stale', 'application/json', 0.0, generation)
+    assert cache.get(('GH-1', 'a')) is None
+
+    cache.put(('GH-1', 'big'), b'x' * (query_cache.MAX_ENTRY_BYTES + 1), 'application/json', 0.0, cache.generation('GH-1'))
+    assert cache.get(('GH-1', 'big')) is None
+
+
+def test_history_is_served_from_cache_until_new_data(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    store = get_sensor_store()
+    store.ingest(greenhouse_id, [time.time() - 120], {field: [20.0] for field in SENSOR_FIELDS})
+    url = f'/api/sensors/history?greenhouse={greenhouse_id}&range=1h&interval=1m'
+
+    hits = get_query_cache().stats()['hits']
+    first = sensor_client.get(url, headers=AUTH_HEADERS).get_data()
+    assert sensor_client.get(url, headers=AUTH_HEADERS).get_data() == first
+    assert get_query_cache().stats()['hits'] == hits + 1
+
+    store.ingest(greenhouse_id, [time.time() - 1], {field: [30.0] for field in SENSOR_FIELDS})
+    readings = sensor_client.get(url, headers=AUTH_HEADERS).get_json()['data']['readings']
+    assert readings[-1]['temperature'] == 30.0
@@ -0,0 +1,87 @@
+# tests/test_rate_limiter.py
+import sqlite3
+
+import pytest
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import middleware.rate_limit as rate_limit_middleware
+from middleware.rate_limit import rate_limit
+from services.rate_limiter import RateLimiter, MemoryRateLimitBackend, SQLiteRateLimitBackend
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_rate_limiter_allows_limit_per_window(backend, tmp_path):
+    limiter = RateLimiter(MemoryRateLimitBackend() if backend == 'memory' else SQLiteRateLimitBackend(str(tmp_path / 'limits.db')))
+    window_start = 1_000_000 * 60.0
+    results = [limiter.hit('login', '198.51.100.7', 3, 60, now=window_start + n) for n in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] >= 1
+
+    # Other keys and later windows have their own budget
+    assert limiter.hit('login', '198.51.100.8', 3, 60, now=window_start + 5)[0]
+    assert limiter.hit('login', '198.51.100.7', 3, 60, now=window_start + 2 * 60 + 1)[0]
+
+
+def limited_app(name, limit):
+    app = Flask(__name__)
+
+    @app.route('/login', methods=['POST'])
+    @rate_limit(name, limit, 60)
+    def login():
+        return 'ok'
+
+    return app
+
+
+def test_decorated_route_answers_429_with_retry_after():
+    client = limited_app('test-login-429', 2).test_client()
+    environ = {'REMOTE_ADDR': '203.0.113.9'}
+    statuses = [client.post('/login', environ_base=environ).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert int(client.post('/login', environ_base=environ).headers['Retry-After']) >= 1
+
+
+def test_forwarded_for_is_ignored_without_a_trusted_proxy():
+    client = limited_app('test-login-spoof', 2).test_client()
+    environ = {'REMOTE_ADDR': '203.0.113.10'}
+    statuses = [
+        client.post('/login', environ_base=environ, headers={'X-Forwarded-For': f'198.51.100.{n}'}).status_code
+        for n in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+
+
+def test_trusted_proxy_hop_supplies_the_client_address():
+    app = limited_app('test-login-proxy', 1)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    client = app.test_client()
+    proxy = {'REMOTE_ADDR': '10.0.0.2'}
+
+    # Only the hop the proxy appended counts; anything the client put in front of it is ignored
+    assert client.post('/login', environ_base=proxy, headers={'X-Forwarded-For': '1.1.1.1, 203.0.113.20'}).status_code == 200
+    assert client.post('/login', environ_base=proxy, headers={'X-Forwarded-For': '2.2.2.2, 203.0.113.20'}).status_code == 429
+    assert client.post('/login', environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.21'}).status_code == 200
+
+
+def test_store_errors_fall_back_to_per_process_limits(tmp_path, monkeypatch):
+    backend = SQLiteRateLimitBackend(str(tmp_path / 'limits.db'))
+    limiter = RateLimiter(backend)
+
+    def locked(*args):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(backend, 'hit', locked)
+    results = [limiter.hit('login', '198.51.100.7', 2, 60, now=60.0 * 1000 + n)[0] for n in range(3)]
+    assert results == [True, True, False]
+    assert limiter.fallback_hits == 3
+
+
+def test_unexpected_limiter_errors_are_not_swallowed(monkeypatch):
+    class Broken:
+        def hit(self, *args):
+            raise RuntimeError('bug')
+
+    monkeypatch.setattr(rate_limit_middleware, 'get_rate_limiter', lambda: Broken())
+    response = limited_app('test-login-broken', 5).test_client().post('/login')
+    assert response.status_code == 500
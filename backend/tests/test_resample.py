@@ -0,0 +1,91 @@
+# tests/test_resample.py
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import get_sensor_store
+from utils.resample import resample, fill_gaps, PERCENTILE_AGGREGATIONS
+from utils.time_utils import parse_duration
+
+TIMESTAMPS = np.array([0.0, 10.0, 50.0, 130.0, 310.0])
+VALUES = [1.0, 3.0, 2.0, 8.0, 4.0]
+
+
+def columns(values):
+    return {field: np.asarray(values, dtype=np.float32) for field in SENSOR_FIELDS}
+
+
+@pytest.mark.parametrize('value, seconds', [('30s', 30), ('15m', 900), ('6h', 21600), ('7d', 604800), ('5', 300), (' 2H ', 7200)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value, 3600) == seconds
+
+
+@pytest.mark.parametrize('value', ['15x', '0.5h', '0', '-5m', 'h', '1e3s'])
+def test_parse_duration_rejects_malformed_values(value):
+    with pytest.raises(ValueError):
+        parse_duration(value, 3600)
+
+
+@pytest.mark.parametrize('agg, expected', [('mean', [2.0, 8.0, 4.0]), ('last', [2.0, 8.0, 4.0]), ('max', [3.0, 8.0, 4.0])])
+def test_aggregations(agg, expected):
+    timestamps, values = resample(TIMESTAMPS, columns(VALUES), 60, agg)
+    assert timestamps.tolist() == [0.0, 120.0, 300.0]
+    assert values['temperature'].tolist() == expected
+
+
+@pytest.mark.parametrize('agg', list(PERCENTILE_AGGREGATIONS))
+def test_percentile_aggregations_match_numpy_per_bucket(agg):
+    rng = np.random.default_rng(5)
+    timestamps = np.sort(rng.uniform(0, 3600, 500))
+    values = rng.normal(20, 4, len(timestamps)).astype(np.float32)
+    buckets, aggregated = resample(timestamps, columns(values), 600, agg)
+
+    groups = (timestamps // 600).astype(np.int64)
+    expected = [np.percentile(values[groups == group], PERCENTILE_AGGREGATIONS[agg] * 100, method='inverted_cdf')
+                for group in np.unique(groups)]
+    assert buckets.tolist() == [n * 600.0 for n in range(6)]
+    assert aggregated['temperature'].tolist() == expected
+
+
+def test_last_picks_the_newest_reading_of_each_bucket():
+    _, values = resample(np.array([0.0, 20.0, 40.0]), columns([5, 1, 3]), 60, 'last')
+    assert values['humidity'].tolist() == [3.0]
+
+
+def test_forward_fill_and_linear_fill_only_between_readings():
+    timestamps, ffilled = resample(TIMESTAMPS, columns(VALUES), 60, 'mean', 'ffill')
+    assert timestamps.tolist() == [0.0, 60.0, 120.0, 180.0, 240.0, 300.0]
+    assert ffilled['temperature'].tolist() == [2.0, 2.0, 8.0, 8.0, 8.0, 4.0]
+
+    _, linear = resample(TIMESTAMPS, columns(VALUES), 60, 'mean', 'linear')
+    np.testing.assert_allclose(linear['temperature'], [2.0, 5.0, 8.0, 20 / 3, 16 / 3, 4.0])
+
+
+def test_single_bucket_and_empty_input():
+    timestamps, values = fill_gaps(np.array([7]), {'temperature': np.array([1.0])}, 60, 'linear')
+    assert timestamps.tolist() == [420.0]
+    assert resample(np.empty(0), columns([]), 60)[0].tolist() == []
+
+
+def test_history_route_resamples_any_interval(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    get_sensor_store().ingest(greenhouse_id, time.time() - 3000 + np.arange(0, 3000, 100.0), columns(np.arange(30)))
+    base = f'/api/sensors/history?greenhouse={greenhouse_id}&range=2h'
+
+    # 2900 seconds of readings span 7 or 8 epoch-aligned 7m buckets
+    readings = sensor_client.get(f'{base}&interval=7m&agg=max', headers=AUTH_HEADERS).get_json()['data']['readings']
+    assert len(readings) in (7, 8)
+    assert readings[-1]['temperature'] == 29
+
+    assert sensor_client.get(f'{base}&interval=1m&agg=median', headers=AUTH_HEADERS).status_code == 400
+    assert sensor_client.get(f'{base}&interval=1m&fill=zero', headers=AUTH_HEADERS).status_code == 400
+    assert sensor_client.get(f'/api/sensors/history?greenhouse={greenhouse_id}&range=30d&interval=1s', headers=AUTH_HEADERS).status_code == 400
+
+
+@pytest.mark.parametrize('query', ['interval=15x', 'interval=0.5h', 'range=xd', 'range=h', 'range=-2h'])
+def test_history_route_rejects_malformed_durations(sensor_client, query):
+    response = sensor_client.get(f'/api/sensors/history?greenhouse=GH-1&{query}', headers=AUTH_HEADERS)
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+# tests/test_rollups.py
+import numpy as np
+
+import services.rollups as rollups
+from conftest import SENSOR_FIELDS
+from services.rollups import RollupSeries, RollupEngine
+from services.sensor_store import SensorStore
+from utils.resample import resample
+
+
+def columns(values):
+    return {field: np.asarray(values, dtype=np.float32) for field in SENSOR_FIELDS}
+
+
+def test_batches_continue_the_open_bucket():
+    series = RollupSeries(60, retention=100)
+    series.update(np.array([0.0, 10.0, 59.0]), columns([1, 5, 3]))
+    series.update(np.array([59.5, 60.0, 130.0]), columns([7, 2, 4]))
+
+    buckets = series.query(0, 200)
+    assert buckets['bucket'].tolist() == [0, 1, 2]
+    assert buckets['count'].tolist() == [4, 1, 1]
+    assert buckets['temperature.sum'].tolist() == [16, 2, 4]
+    assert buckets['temperature.min'].tolist() == [1, 2, 4]
+    assert buckets['temperature.max'].tolist() == [7, 2, 4]
+
+
+def test_retention_trims_old_buckets_and_stops_covering_them():
+    series = RollupSeries(60, retention=300)
+    for minute in range(1000):
+        series.update(np.array([minute * 60.0]), columns([minute]))
+
+    assert series.size >= 300
+    assert series.trimmed
+    assert not series.covers(0)
+    assert series.covers(999 * 60)
+    assert series.query(0, 999 * 60)['bucket'][-1] == 999
+
+
+def test_history_matches_raw_averages():
+    engine = RollupEngine()
+    rng = np.random.default_rng(7)
+    timestamps = np.sort(rng.uniform(0, 6 * 3600, 5000))
+    values = columns(rng.normal(20, 3, len(timestamps)))
+    engine.on_ingest('GH-1', timestamps[:2000], {field: column[:2000] for field, column in values.items()})
+    engine.on_ingest('GH-1', timestamps[2000:], {field: column[2000:] for field, column in values.items()})
+
+    bucket_starts, averages = engine.history('GH-1', 0, 6 * 3600, 1800)
+    assert bucket_starts.tolist() == [n * 1800.0 for n in range(12)]
+
+    groups = (timestamps // 1800).astype(np.int64)
+    expected = np.bincount(groups, weights=values['temperature'].astype(np.float64)) / np.bincount(groups)
+    np.testing.assert_allclose(averages['temperature'], expected, rtol=1e-9)
+
+
+def test_tier_must_divide_the_step():
+    engine = RollupEngine()
+    engine.on_ingest('GH-1', np.array([0.0, 3600.0]), columns([1, 2]))
+
+    assert engine.select_tier('GH-1', 0, 7200).bucket_seconds == 3600
+    assert engine.select_tier('GH-1', 0, 90) is None
+    assert engine.history('GH-1', 0, 3600, 30) is None
+    assert engine.history('GH-unknown', 0, 3600, 60) is None
+
+
+def test_history_percentiles_merge_the_hourly_sketches():
+    engine = RollupEngine()
+    rng = np.random.default_rng(8)
+    timestamps = np.sort(rng.uniform(0, 12 * 3600, 500))
+    values = columns(rng.normal(20, 3, len(timestamps)))
+    for part in np.array_split(np.arange(len(timestamps)), 7):
+        engine.on_ingest('GH-1', timestamps[part], {field: column[part] for field, column in values.items()})
+
+    # Each 3h group holds fewer than k readings, so its merged sketch is still exact
+    assert engine.select_tier('GH-1', 0, 3 * 3600, sketches=True).bucket_seconds == 3600
+    bucket_starts, estimates = engine.history('GH-1', 0, 12 * 3600, 3 * 3600, 'p95')
+    expected = resample(timestamps, values, 3 * 3600, 'p95')
+    assert bucket_starts.tolist() == expected[0].tolist()
+    assert estimates['temperature'].tolist() == expected[1]['temperature'].tolist()
+
+    # Minute buckets carry no sketches
+    assert engine.history('GH-1', 0, 12 * 3600, 600, 'p50') is None
+
+
+def test_percentiles_cover_any_range_with_raw_edges(monkeypatch):
+    store = SensorStore(shard_count=1)
+    engine = RollupEngine()
+    store.add_listener(engine.on_ingest)
+    monkeypatch.setattr(rollups, 'get_sensor_store', lambda: store)
+
+    rng = np.random.default_rng(9)
+    timestamps = np.arange(0, 3 * 86400, 30, dtype=np.float64) + 86400
+    values = rng.gamma(4, 5, len(timestamps))
+    store.ingest('GH-1', timestamps, {field: values for field in SENSOR_FIELDS})
+
+    start, end = 86400 + 5 * 3600 + 123, 3 * 86400 + 17 * 3600 + 45
+    fractions = [0.05, 0.5, 0.95]
+    estimates = engine.percentiles('GH-1', start, end, fractions)['humidity']
+    inside = np.sort(values[(timestamps >= start) & (timestamps < end)].astype(np.float32))
+    ranks = [np.searchsorted(inside, estimate, side='right') / len(inside) for estimate in estimates]
+    np.testing.assert_allclose(ranks, fractions, atol=0.02)
+
+    assert engine.percentiles('GH-1', 0, 3600, fractions)['humidity'] == [None, None, None]
+
+
+def test_open_bucket_sketch_is_copied_for_readers():
+    series = RollupSeries(3600, retention=10, sketches=True)
+    series.update(np.array([0.0, 10.0]), columns([1, 2]))
+    snapshot = series.snapshot(0, 3600)
+    series.update(np.array([20.0]), columns([3]))
+
+    assert snapshot['temperature.sketch'][0].n == 2
+    assert series.query(0, 3600)['temperature.sketch'][0].n == 3
@@ -0,0 +1,75 @@
+# tests/test_segment_store.py
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from conftest import SENSOR_FIELDS
+from services.segment_store import SegmentDirectory, SegmentSeries, RECORD_DTYPE
+from services.sensor_store import SensorStore
+
+
+def columns(values):
+    return {field: np.asarray(values, dtype=np.float32) for field in SENSOR_FIELDS}
+
+
+def test_series_rolls_segments_and_reads_across_them(tmp_path):
+    series = SegmentSeries(str(tmp_path), segment_records=4)
+    series.append(np.arange(6, dtype=np.float64), columns(np.arange(6)))
+    series.append(np.arange(6, 11, dtype=np.float64), columns(np.arange(6, 11)))
+
+    assert [segment.count for segment in series.segments] == [4, 4, 3]
+    timestamps, values = series.query(2, 9)
+    assert timestamps.tolist() == [2, 3, 4, 5, 6, 7, 8, 9]
+    assert values['humidity'].tolist() == [2, 3, 4, 5, 6, 7, 8, 9]
+    assert series.latest() == (10.0, {field: 10.0 for field in SENSOR_FIELDS})
+
+
+def test_latest_skips_a_freshly_rolled_empty_segment(tmp_path):
+    series = SegmentSeries(str(tmp_path), segment_records=4)
+    series.append(np.arange(4, dtype=np.float64), columns(np.arange(4)))
+    # A reader can see the new active segment before the append that rolled it writes anything
+    series._active_segment()
+    assert series.segments[-1].count == 0
+    assert series.latest() == (3.0, {field: 3.0 for field in SENSOR_FIELDS})
+
+
+def test_a_data_directory_is_refused_to_a_second_process(tmp_path):
+    SegmentDirectory(str(tmp_path))
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = f'from services.segment_store import SegmentDirectory; SegmentDirectory({str(tmp_path)!r})'
+    other = subprocess.run([sys.executable, '-c', script], cwd=backend, capture_output=True, text=True)
+    assert other.returncode != 0
+    assert 'in use by another process' in other.stderr
+
+    # The owning process may reopen it
+    SegmentDirectory(str(tmp_path))
+
+
+def test_reopened_series_drops_a_torn_record(tmp_path):
+    series = SegmentSeries(str(tmp_path), segment_records=4)
+    series.append(np.arange(6, dtype=np.float64), columns(np.arange(6)))
+    last_path = series.segments[-1].path
+    with open(last_path, 'ab') as f:
+        f.write(b'\0' * (RECORD_DTYPE.itemsize // 2))
+
+    reopened = SegmentSeries(str(tmp_path), segment_records=4)
+    assert os.path.getsize(last_path) == 2 * RECORD_DTYPE.itemsize
+    assert reopened.size == 6
+    assert reopened.last_timestamp == 5.0
+
+    reopened.append(np.array([6.0]), columns([6]))
+    assert reopened.query()[0].tolist() == [0, 1, 2, 3, 4, 5, 6]
+
+
+def test_store_finds_greenhouses_and_metadata_on_disk(tmp_path):
+    store = SensorStore(shard_count=2, data_dir=str(tmp_path))
+    store.register_greenhouse('GH/1', farm_id='farm-1', name='Tunnel')
+    store.ingest('GH/1', [100.0, 200.0], columns([1, 2]))
+
+    reopened = SensorStore(shard_count=2, data_dir=str(tmp_path))
+    assert reopened.greenhouse('GH/1') == {'id': 'GH/1', 'farmId': 'farm-1', 'name': 'Tunnel'}
+    assert [info['id'] for info in reopened.list_greenhouses('farm-1')] == ['GH/1']
+    assert reopened.latest('GH/1') == (200.0, {field: 2.0 for field in SENSOR_FIELDS})
+    assert reopened.ingest('GH/1', [150.0, 300.0], columns([0, 3])) == (1, 1)
@@ -0,0 +1,187 @@
+# tests/test_sensor_ingest.py
+import json
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import SensorStore, LISTENER_PRIORITY_INVALIDATE, readings_to_columns, get_sensor_store
+
+
+def ingest(client, body):
+    return client.post(
+        '/api/sensors/ingest', data=body,
+        headers={**AUTH_HEADERS, 'Content-Type': 'application/json'}
+    )
+
+
+def new_greenhouse_id():
+    return f'GH-{uuid.uuid4().hex[:8]}'
+
+
+def test_ingested_reading_is_served_by_latest(sensor_client):
+    greenhouse_id = new_greenhouse_id()
+    now = time.time()
+    body = {'greenhouseId': greenhouse_id, 'readings': [
+        {'timestamp': now - 30, 'temperature': 20.0, 'humidity': 60, 'soilMoisture': 40},
+        {'timestamp': now - 10, 'temperature': 22.25, 'humidity': 61, 'soilMoisture': 41},
+    ]}
+
+    response = ingest(sensor_client, json.dumps(body))
+    assert response.status_code == 202
+    assert response.get_json()['data'] == {'greenhouseId': greenhouse_id, 'accepted': 2, 'rejected': 0}
+
+    latest = sensor_client.get(f'/api/sensors/latest?greenhouse={greenhouse_id}', headers=AUTH_HEADERS).get_json()['data']
+    assert (latest['temperature'], latest['humidity'], latest['soilMoisture']) == (22.2, 61, 41)
+
+
+def test_readings_older_than_the_series_are_rejected():
+    store = SensorStore()
+    store.ingest('GH-1', [100.0, 300.0, 200.0], {field: [1.0, 3.0, 2.0] for field in SENSOR_FIELDS})
+    assert store.ingest('GH-1', [150.0, 400.0], {field: [0.0, 4.0] for field in SENSOR_FIELDS}) == (1, 1)
+
+    timestamps, columns = store.query('GH-1')
+    assert timestamps.tolist() == [100.0, 200.0, 300.0, 400.0]
+    assert columns['temperature'].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_query_returns_the_inclusive_range():
+    store = SensorStore()
+    store.ingest('GH-1', np.arange(10, dtype=np.float64), {field: np.arange(10) for field in SENSOR_FIELDS})
+    timestamps, columns = store.query('GH-1', 3, 6)
+    assert timestamps.tolist() == [3, 4, 5, 6]
+    assert columns['humidity'].tolist() == [3, 4, 5, 6]
+
+
+def test_columnar_payload_matches_row_payload():
+    rows = {'readings': [
+        {'timestamp': '2024-01-01T00:00:00Z', 'temperature': 1, 'humidity': 2, 'soilMoisture': 3},
+        {'timestamp': 1704067260000, 'temperature': 4, 'humidity': 5, 'soilMoisture': 6},
+    ]}
+    columnar = {'timestamps': ['2024-01-01T00:00:00', 1704067260], 'temperature': [1, 4], 'humidity': [2, 5], 'soilMoisture': [3, 6]}
+
+    row_timestamps, row_values = readings_to_columns(rows)
+    col_timestamps, col_values = readings_to_columns(columnar)
+    assert row_timestamps.tolist() == col_timestamps.tolist() == [1704067200.0, 1704067260.0]
+    for field in SENSOR_FIELDS:
+        assert row_values[field].tolist() == col_values[field].tolist()
+
+
+def test_malformed_payloads_are_rejected(sensor_client):
+    greenhouse_id = new_greenhouse_id()
+    bodies = [
+        'not json',
+        json.dumps({'greenhouseId': greenhouse_id}),
+        json.dumps({'greenhouseId': greenhouse_id, 'readings': [{'timestamp': 1, 'temperature': 1, 'humidity': 1}]}),
+        json.dumps({'greenhouseId': greenhouse_id, 'timestamps': [1, 2], 'temperature': [1], 'humidity': [1, 2], 'soilMoisture': [1, 2]}),
+        json.dumps({'greenhouseId': greenhouse_id, 'readings': []}),
+    ]
+    for body in bodies:
+        assert ingest(sensor_client, body).status_code == 400
+    assert not get_sensor_store().has_data(greenhouse_id)
+
+
+def test_oversized_batch_is_rejected(sensor_client):
+    import routes.sensor_routes as sensor_routes
+
+    count = sensor_routes.MAX_INGEST_BATCH + 1
+    body = {'greenhouseId': new_greenhouse_id(), 'timestamps': list(range(count)), **{field: [0] * count for field in SENSOR_FIELDS}}
+    assert ingest(sensor_client, json.dumps(body)).status_code == 413
+
+
+def test_farm_index_follows_greenhouse_moves(sensor_client):
+    farm_id = f'farm-{uuid.uuid4().hex[:8]}'
+    greenhouse_id = new_greenhouse_id()
+    body = {
+        'greenhouseId': greenhouse_id, 'farmId': farm_id, 'name': 'North tunnel',
+        'readings': [{'timestamp': time.time() - 60, 'temperature': 20, 'humidity': 60, 'soilMoisture': 40}]
+    }
+    assert ingest(sensor_client, json.dumps(body)).status_code == 202
+
+    listed = sensor_client.get(f'/api/sensors/greenhouses?farm={farm_id}', headers=AUTH_HEADERS).get_json()['data']
+    assert listed['greenhouses'] == [{'id': greenhouse_id, 'farmId': farm_id, 'name': 'North tunnel'}]
+    latest = sensor_client.get(f'/api/sensors/latest?greenhouse={greenhouse_id}', headers=AUTH_HEADERS).get_json()['data']
+    assert latest['greenhouse']['name'] == 'North tunnel'
+
+    get_sensor_store().register_greenhouse(greenhouse_id, farm_id=f'{farm_id}-b')
+    assert get_sensor_store().list_greenhouses(farm_id) == []
+    assert [info['id'] for info in get_sensor_store().list_greenhouses(f'{farm_id}-b')] == [greenhouse_id]
+
+
+def reading_body(greenhouse_id, timestamp, temperature='21.5'):
+    return (
+        '{"greenhouseId": "%s", "readings": [{"timestamp": %s, "temperature": %s, "humidity": 60, "soilMoisture": 40}]}'
+        % (greenhouse_id, timestamp, temperature)
+    )
+
+
+@pytest.mark.parametrize('timestamp', ['NaN', '"nan"', '"inf"', 'Infinity', '1e300', '"1e300"', str(time.time() + 30 * 86400)])
+def test_bad_timestamp_is_rejected_without_poisoning_the_series(sensor_client, timestamp):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+
+    response = ingest(sensor_client, reading_body(greenhouse_id, timestamp))
+    assert response.status_code == 400
+    assert not get_sensor_store().has_data(greenhouse_id)
+
+    # The greenhouse still takes good readings afterwards
+    response = ingest(sensor_client, reading_body(greenhouse_id, time.time() - 60))
+    assert response.status_code == 202
+    assert response.get_json()['data'] == {'greenhouseId': greenhouse_id, 'accepted': 1, 'rejected': 0}
+    assert sensor_client.get(f'/api/sensors/latest?greenhouse={greenhouse_id}', headers=AUTH_HEADERS).status_code == 200
+
+
+@pytest.mark.parametrize('value', ['NaN', '"nan"', '1e300'])
+def test_non_finite_value_is_rejected(sensor_client, value):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    response = ingest(sensor_client, reading_body(greenhouse_id, time.time() - 60, temperature=value))
+    assert response.status_code == 400
+    assert not get_sensor_store().has_data(greenhouse_id)
+
+
+def test_one_bad_reading_rejects_the_whole_columnar_batch(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    body = {
+        'greenhouseId': greenhouse_id,
+        'timestamps': [now - 2, 'nan'],
+        **{field: [1, 2] for field in SENSOR_FIELDS}
+    }
+    assert ingest(sensor_client, json.dumps(body)).status_code == 400
+    assert not get_sensor_store().has_data(greenhouse_id)
+
+
+def test_store_ingest_validates_before_appending():
+    store = SensorStore(shard_count=1)
+    values = {field: np.ones(2) for field in SENSOR_FIELDS}
+    with pytest.raises(ValueError):
+        store.ingest('GH-1', [time.time() - 10, np.nan], values)
+    assert not store.has_data('GH-1')
+
+
+def test_failing_listener_does_not_stop_the_others():
+    store = SensorStore(shard_count=1)
+    seen = []
+
+    def broken(greenhouse_id, timestamps, values):
+        raise RuntimeError('listener bug')
+
+    store.add_listener(broken)
+    store.add_listener(lambda greenhouse_id, timestamps, values: seen.append(len(timestamps)))
+
+    accepted, rejected = store.ingest('GH-1', [time.time() - 10], {field: [1.0] for field in SENSOR_FIELDS})
+    assert (accepted, rejected) == (1, 0)
+    assert seen == [1]
+    assert store.has_data('GH-1')
+
+
+def test_listeners_run_in_priority_order_not_registration_order():
+    store = SensorStore(shard_count=1)
+    calls = []
+    store.add_listener(lambda *args: calls.append('cache'), priority=LISTENER_PRIORITY_INVALIDATE)
+    store.add_listener(lambda *args: calls.append('anomalies'))
+    store.add_listener(lambda *args: calls.append('rollups'))
+
+    store.ingest('GH-1', [time.time() - 10], {field: [1.0] for field in SENSOR_FIELDS})
+    assert calls == ['anomalies', 'rollups', 'cache']
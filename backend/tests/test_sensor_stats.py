@@ -0,0 +1,66 @@
+# tests/test_sensor_stats.py
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_stats import WindowStats
+from services.sensor_store import get_sensor_store
+
+
+def columns(values):
+    return {field: np.asarray(values, dtype=np.float32) for field in SENSOR_FIELDS}
+
+
+def test_merged_batches_match_a_single_pass():
+    window = WindowStats(3600)
+    rng = np.random.default_rng(3)
+    timestamps = np.sort(rng.uniform(0, 3600, 3000))
+    values = rng.normal(25, 4, len(timestamps)).astype(np.float32)
+    for chunk in np.array_split(np.arange(len(timestamps)), 7):
+        window.update(timestamps[chunk], columns(values[chunk]))
+
+    stats = window.snapshot(now=3599)['temperature']
+    expected = values.astype(np.float64)
+    assert stats['count'] == len(values)
+    assert stats['min'] == pytest.approx(expected.min())
+    assert stats['max'] == pytest.approx(expected.max())
+    assert stats['avg'] == pytest.approx(expected.mean(), rel=1e-12)
+    assert stats['stddev'] == pytest.approx(expected.std(), rel=1e-9)
+
+
+def test_expired_slots_leave_the_window():
+    window = WindowStats(3600, slots=60)
+    window.update(np.array([0.0, 30.0]), columns([100, 100]))
+    window.update(np.array([3000.0]), columns([1]))
+
+    assert window.snapshot(now=3100)['temperature']['count'] == 3
+    later = window.snapshot(now=3700)['temperature']
+    assert (later['count'], later['max']) == (1, 1.0)
+    assert window.snapshot(now=8000)['temperature']['count'] == 0
+
+
+def test_reused_slot_is_reset_before_merging():
+    window = WindowStats(600, slots=10)
+    window.update(np.array([5.0]), columns([50]))
+    # Same ring position, one full window later
+    window.update(np.array([605.0]), columns([10]))
+    stats = window.snapshot(now=610)['temperature']
+    assert (stats['count'], stats['avg'], stats['min']) == (1, 10.0, 10.0)
+
+
+def test_stats_route_reports_the_requested_period(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    get_sensor_store().ingest(greenhouse_id, [now - 2 * 86400, now - 60, now - 30], columns([40, 10, 20]))
+
+    day = sensor_client.get(f'/api/sensors/stats?greenhouse={greenhouse_id}&period=24h', headers=AUTH_HEADERS).get_json()['data']
+    week = sensor_client.get(f'/api/sensors/stats?greenhouse={greenhouse_id}&period=7d', headers=AUTH_HEADERS).get_json()['data']
+    assert (day['temperature']['count'], day['temperature']['avg'], day['temperature']['stddev']) == (2, 15.0, 5.0)
+    assert (week['temperature']['count'], week['temperature']['max']) == (3, 40.0)
+    assert week['period'] == '7 days'
+
+    response = sensor_client.get(f'/api/sensors/stats?greenhouse={greenhouse_id}&period=2h', headers=AUTH_HEADERS)
+    assert response.status_code == 400
@@ -0,0 +1,100 @@
+# tests/test_sensor_stream.py
+import json
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import get_sensor_store
+from services.sensor_stream import SensorBroadcaster
+
+
+def parse_frames(chunk):
+    """[(id, event, data)] for the events in one chunk of the stream"""
+    events = []
+    for frame in chunk.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in frame.splitlines() if not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def publish(broadcaster, timestamp, temperature):
+    broadcaster.on_ingest('GH-1', np.array([timestamp]), {field: np.array([temperature], dtype=np.float32) for field in SENSOR_FIELDS})
+
+
+def test_subscriber_receives_each_event_once():
+    broadcaster = SensorBroadcaster()
+    stream = broadcaster.subscribe('GH-1')
+    assert next(stream).startswith(b'retry: ')
+
+    publish(broadcaster, 1_700_000_000, 20.04)
+    publish(broadcaster, 1_700_000_060, 21.0)
+    events = parse_frames(next(stream))
+    assert [event_id for event_id, _, _ in events] == [f'{broadcaster.epoch}-1', f'{broadcaster.epoch}-2']
+    assert events[0][1] == 'readings'
+    assert events[0][2]['greenhouseId'] == 'GH-1'
+    assert events[0][2]['readings'][0]['temperature'] == 20.0
+
+    publish(broadcaster, 1_700_000_120, 22.0)
+    assert [event_id for event_id, _, _ in parse_frames(next(stream))] == [f'{broadcaster.epoch}-3']
+    stream.close()
+
+
+def test_last_event_id_resumes_after_the_missed_events():
+    broadcaster = SensorBroadcaster()
+    first = broadcaster.subscribe('GH-1')
+    next(first)
+    for n in range(4):
+        publish(broadcaster, 1_700_000_000 + n, n)
+    next(first)
+    first.close()
+
+    resumed = broadcaster.subscribe('GH-1', last_event_id=f'{broadcaster.epoch}-2')
+    next(resumed)
+    events = parse_frames(next(resumed))
+    assert [event_id for event_id, _, _ in events] == [f'{broadcaster.epoch}-3', f'{broadcaster.epoch}-4']
+    assert [event[2]['readings'][0]['temperature'] for event in events] == [2.0, 3.0]
+    resumed.close()
+
+
+def test_an_id_from_another_epoch_gets_only_the_latest_reading():
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    get_sensor_store().ingest(greenhouse_id, [1_700_000_000.0, 1_700_000_060.0],
+                              {field: np.array([20.0, 23.0], dtype=np.float32) for field in SENSOR_FIELDS})
+    broadcaster = SensorBroadcaster()
+    first = broadcaster.subscribe(greenhouse_id)
+    next(first)
+    for n in range(3):
+        broadcaster.publish_readings(greenhouse_id, [{'temperature': n}])
+    first.close()
+
+    resumed = broadcaster.subscribe(greenhouse_id, last_event_id='0badc0de-7')
+    next(resumed)
+    ((event_id, event, data),) = parse_frames(next(resumed))
+    assert (event_id, event) == (f'{broadcaster.epoch}-3', 'readings')
+    assert data['readings'] == [{'timestamp': '2023-11-14T22:14:20', **{field: 23.0 for field in SENSOR_FIELDS}}]
+
+    broadcaster.publish_readings(greenhouse_id, [{'temperature': 4}])
+    assert [event_id for event_id, _, _ in parse_frames(next(resumed))] == [f'{broadcaster.epoch}-4']
+    resumed.close()
+
+
+def test_batches_without_subscribers_are_not_encoded():
+    broadcaster = SensorBroadcaster()
+    publish(broadcaster, 1_700_000_000, 20.0)
+    assert 'GH-1' not in broadcaster._channels
+
+    stream = broadcaster.subscribe('GH-1')
+    next(stream)
+    stream.close()
+    publish(broadcaster, 1_700_000_060, 21.0)
+    assert broadcaster._channels['GH-1'].seq == 0
+
+
+def test_invalid_greenhouse_ids_are_refused(sensor_client):
+    with pytest.raises(ValueError):
+        SensorBroadcaster().subscribe('../etc')
+    response = sensor_client.get('/api/sensors/stream?greenhouse=bad%20id', headers=AUTH_HEADERS)
+    assert response.status_code == 400
@@ -0,0 +1,51 @@
+# tests/test_token_store.py
+import time
+from multiprocessing import Pool
+
+import pytest
+
+from services.token_store import TokenStore, MemoryTokenStore, SQLiteTokenStore, LOGIN_TOKEN
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def token_store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryTokenStore()
+    return SQLiteTokenStore(str(tmp_path / 'tokens.db'))
+
+
+def test_token_store_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        TokenStore()
+
+
+def test_token_is_consumed_once(token_store):
+    token_store.issue(LOGIN_TOKEN, 'abc', {'uid': 'u1'}, time.time() + 60)
+    assert token_store.get(LOGIN_TOKEN, 'abc') == {'uid': 'u1'}
+    assert token_store.consume(LOGIN_TOKEN, 'abc') == {'uid': 'u1'}
+    assert token_store.consume(LOGIN_TOKEN, 'abc') is None
+    assert token_store.get(LOGIN_TOKEN, 'abc') is None
+
+
+def test_purge_removes_only_expired_tokens(token_store):
+    now = time.time()
+    token_store.issue(LOGIN_TOKEN, 'old', {}, now - 1)
+    token_store.issue(LOGIN_TOKEN, 'new', {}, now + 60)
+    assert token_store.purge_expired(now) == 1
+    assert token_store.get(LOGIN_TOKEN, 'old') is None
+    assert token_store.get(LOGIN_TOKEN, 'new') == {}
+
+
+def consume_all(path):
+    store = SQLiteTokenStore(path)
+    return sum(store.consume(LOGIN_TOKEN, f'token-{n}') is not None for n in range(50))
+
+
+def test_sqlite_tokens_are_consumed_once_across_processes(tmp_path):
+    path = str(tmp_path / 'tokens.db')
+    store = SQLiteTokenStore(path)
+    for n in range(50):
+        store.issue(LOGIN_TOKEN, f'token-{n}', {'n': n}, time.time() + 60)
+
+    with Pool(4) as pool:
+        assert sum(pool.map(consume_all, [path] * 4)) == 50
@@ -0,0 +1,135 @@
+# tests/test_trusted_devices.py
+import pytest
+
+import services.trusted_devices as trusted_devices
+from conftest import FakeUserDocument, FakeUserFirestore
+from services.trusted_devices import TrustedDeviceCache, SQLiteDeviceGenerations, DEVICE_MAP_FIELD, LEGACY_DEVICE_LIST_FIELD
+from services.user_documents import UserDocumentSession
+
+
+@pytest.fixture
+def user_session(monkeypatch):
+    """Returns a factory binding trusted_devices to a session over the given users"""
+    def bind(users):
+        session = UserDocumentSession(db=FakeUserFirestore(users))
+        monkeypatch.setattr(trusted_devices, 'get_user_documents', lambda: session)
+        for uid in users:
+            trusted_devices.get_trusted_device_cache().invalidate(uid)
+        return session
+    return bind
+
+
+def test_legacy_trusted_device_array_is_migrated_to_a_map(user_session):
+    users = {'u1': {LEGACY_DEVICE_LIST_FIELD: [
+        {'fingerprint': 'fp-1', 'lastUsed': '2024-01-01T00:00:00'},
+        {'fingerprint': 'fp-2', 'lastUsed': '2024-02-01T00:00:00'},
+    ]}}
+    session = user_session(users)
+
+    assert trusted_devices.is_trusted_device('u1', 'fp-1')
+    assert not trusted_devices.is_trusted_device('u1', 'fp-3')
+    session.commit()
+
+    (fields,) = users['_writes']
+    devices = fields[DEVICE_MAP_FIELD]
+    assert set(devices) == {'fp-1', 'fp-2'}
+    assert devices['fp-1']['lastUsed'] > '2024-01-01T00:00:00'
+    assert fields[LEGACY_DEVICE_LIST_FIELD] is trusted_devices.firestore.DELETE_FIELD
+
+
+def test_migrated_devices_update_a_single_field(user_session):
+    users = {'u2': {DEVICE_MAP_FIELD: {'fp-1': {'fingerprint': 'fp-1', 'lastUsed': 'x'}}}}
+    session = user_session(users)
+
+    assert trusted_devices.is_trusted_device('u2', 'fp-1')
+    session.commit()
+    (fields,) = users['_writes']
+    assert list(fields) == [f'{DEVICE_MAP_FIELD}.`fp-1`.lastUsed']
+
+
+def test_trusted_check_is_cached_until_the_device_is_removed(user_session):
+    users = {'u3': {DEVICE_MAP_FIELD: {'fp-1': {'fingerprint': 'fp-1', 'lastUsed': 'x'}}}}
+    user_session(users)
+
+    assert trusted_devices.is_trusted_device('u3', 'fp-1')
+    assert trusted_devices.is_trusted_device('u3', 'fp-1')
+    assert users['_reads'] == 1
+
+    assert trusted_devices.remove_trusted_device('u3', 'fp-1')
+    assert not trusted_devices.is_trusted_device('u3', 'fp-1')
+
+
+def test_adding_a_device_drops_the_least_recently_used_beyond_the_limit(user_session):
+    devices = {
+        f'fp-{n}': {'fingerprint': f'fp-{n}', 'lastUsed': f'2024-01-0{n}T00:00:00'}
+        for n in range(1, trusted_devices.MAX_TRUSTED_DEVICES + 1)
+    }
+    users = {'u4': {DEVICE_MAP_FIELD: devices}}
+    session = user_session(users)
+
+    assert trusted_devices.add_trusted_device('u4', {'fingerprint': 'fp-new'})
+    assert set(session.get('u4')[DEVICE_MAP_FIELD]) == set(devices) - {'fp-1'} | {'fp-new'}
+
+
+def test_cache_entries_expire(monkeypatch):
+    cache = TrustedDeviceCache(ttl_seconds=60)
+    cache.remember('u1', 'fp-1', cache.generation('u1'))
+    assert cache.is_trusted('u1', 'fp-1')
+
+    now = trusted_devices.time.time()
+    monkeypatch.setattr(trusted_devices.time, 'time', lambda: now + 61)
+    assert not cache.is_trusted('u1', 'fp-1')
+
+
+def test_a_device_removed_through_another_worker_is_not_served_from_the_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'devices.db')
+    worker = TrustedDeviceCache(SQLiteDeviceGenerations(path))
+    other_worker = TrustedDeviceCache(SQLiteDeviceGenerations(path))
+    users = {'u5': {DEVICE_MAP_FIELD: {'fp-1': {'fingerprint': 'fp-1', 'lastUsed': 'x'}}}}
+    monkeypatch.setattr(trusted_devices, 'get_trusted_device_cache', lambda: worker)
+    monkeypatch.setattr(trusted_devices, 'get_user_documents', lambda: UserDocumentSession(db=FakeUserFirestore(users)))
+    assert trusted_devices.is_trusted_device('u5', 'fp-1')
+    assert worker.is_trusted('u5', 'fp-1')
+
+    session = UserDocumentSession(db=FakeUserFirestore(users))
+    monkeypatch.setattr(trusted_devices, 'get_user_documents', lambda: session)
+    monkeypatch.setattr(trusted_devices, 'get_trusted_device_cache', lambda: other_worker)
+    assert trusted_devices.remove_trusted_device('u5', 'fp-1')
+    # Not written yet: Firestore still lists the device
+    assert worker.is_trusted('u5', 'fp-1')
+
+    session.commit()
+    assert not worker.is_trusted('u5', 'fp-1')
+
+
+def test_an_entry_read_before_a_concurrent_removal_is_stale(user_session):
+    users = {'u6': {DEVICE_MAP_FIELD: {'fp-1': {'fingerprint': 'fp-1', 'lastUsed': 'x'}}}}
+    user_session(users)
+    cache = trusted_devices.get_trusted_device_cache()
+
+    # Firestore read at the old generation, removal committed before the answer is cached
+    generation = cache.generation('u6')
+    cache.bump('u6')
+    cache.remember('u6', 'fp-1', generation)
+    assert not cache.is_trusted('u6', 'fp-1')
+
+
+def test_a_failed_removal_write_does_not_bump_the_generation(monkeypatch):
+    class BrokenDocument(FakeUserDocument):
+        def update(self, fields):
+            raise PermissionError('permission denied')
+
+    class BrokenFirestore(FakeUserFirestore):
+        def document(self, uid):
+            return BrokenDocument(self.users, uid)
+
+    users = {'u7': {DEVICE_MAP_FIELD: {'fp-1': {'fingerprint': 'fp-1', 'lastUsed': 'x'}}}}
+    session = UserDocumentSession(db=BrokenFirestore(users))
+    monkeypatch.setattr(trusted_devices, 'get_user_documents', lambda: session)
+    cache = trusted_devices.get_trusted_device_cache()
+    generation = cache.generation('u7')
+
+    assert trusted_devices.remove_trusted_device('u7', 'fp-1')
+    with pytest.raises(PermissionError):
+        session.commit()
+    assert cache.generation('u7') == generation
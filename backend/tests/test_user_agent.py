@@ -0,0 +1,48 @@
+# tests/test_user_agent.py
+import user_agents
+from flask import Flask
+
+import routes.auth_routes as auth_routes
+from utils.user_agent import parse_user_agent, user_agent_cache_info, clear_user_agent_cache
+
+CHROME = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+IPHONE = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1'
+
+
+def test_cached_parse_matches_user_agents():
+    for user_agent in (CHROME, IPHONE, ''):
+        ua = user_agents.parse(user_agent)
+        assert parse_user_agent(user_agent) == {
+            'device_type': ua.device.family,
+            'os': f"{ua.os.family} {ua.os.version_string}",
+            'browser': f"{ua.browser.family} {ua.browser.version_string}",
+            'is_mobile': ua.is_mobile,
+            'is_tablet': ua.is_tablet,
+            'is_pc': ua.is_pc,
+        }
+
+
+def test_each_distinct_string_is_parsed_once_and_callers_get_copies():
+    clear_user_agent_cache()
+    first = parse_user_agent(IPHONE)
+    first['os'] = 'tampered'
+    assert parse_user_agent(IPHONE)['os'] != 'tampered'
+    info = user_agent_cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+
+
+def test_device_fingerprint_is_computed_once_per_request(monkeypatch):
+    calls = []
+    monkeypatch.setattr(auth_routes, 'parse_user_agent', lambda user_agent: calls.append(user_agent) or {})
+    app = Flask(__name__)
+
+    with app.test_request_context(headers={'User-Agent': CHROME}, environ_base={'REMOTE_ADDR': '203.0.113.5'}):
+        first = auth_routes.get_device_fingerprint(auth_routes.request)
+        first['fingerprint'] = 'tampered'
+        second = auth_routes.get_device_fingerprint(auth_routes.request)
+    with app.test_request_context(headers={'User-Agent': CHROME}, environ_base={'REMOTE_ADDR': '203.0.113.6'}):
+        other = auth_routes.get_device_fingerprint(auth_routes.request)
+
+    assert len(calls) == 2
+    assert second['fingerprint'] != 'tampered'
+    assert other['fingerprint'] != second['fingerprint']
@@ -0,0 +1,72 @@
+# tests/test_user_documents.py
+from flask import Flask, jsonify
+
+from conftest import FakeUserDocument, FakeUserFirestore
+from services.user_documents import UserDocumentSession, apply_update, get_user_documents, commit_user_documents
+
+
+def test_apply_update_addresses_nested_map_fields():
+    document = {'profile': {'name': 'Farmer'}, 'flag': 'x'}
+    apply_update(document, {'profile.name': 'Renamed', 'devices.fp-1.lastUsed': 't', 'flag': 'y'})
+    assert document == {'profile': {'name': 'Renamed'}, 'devices': {'fp-1': {'lastUsed': 't'}}, 'flag': 'y'}
+
+
+def test_each_document_is_read_once_and_sees_pending_updates():
+    users = {'u1': {'fullName': 'Farmer', 'loginCount': 1}}
+    session = UserDocumentSession(db=FakeUserFirestore(users))
+
+    assert session.get('u1')['fullName'] == 'Farmer'
+    session.update('u1', {'fullName': 'Renamed'})
+    session.update('u1', {'loginCount': 2})
+    assert session.get('u1') == {'fullName': 'Renamed', 'loginCount': 2}
+    assert users['_reads'] == 1
+    assert session.get('missing') is None
+
+    session.commit()
+    assert users['_writes'] == [{'fullName': 'Renamed', 'loginCount': 2}]
+    session.commit()
+    assert len(users['_writes']) == 1
+
+
+def test_several_documents_are_written_in_one_batch():
+    users = {'u1': {'a': 1}, 'u2': {'a': 2}}
+    session = UserDocumentSession(db=FakeUserFirestore(users))
+    session.update('u1', {'a': 10})
+    session.update('u2', {'a': 20})
+    session.commit()
+
+    assert '_writes' not in users
+    assert users['_batches'] == [[('u1', {'a': 10}), ('u2', {'a': 20})]]
+
+
+def test_forget_rereads_the_document():
+    users = {'u1': {'a': 1}}
+    session = UserDocumentSession(db=FakeUserFirestore(users))
+    session.get('u1')
+    session.forget('u1')
+    session.get('u1')
+    assert users['_reads'] == 2
+
+
+def test_failed_user_document_commit_turns_the_response_into_500():
+    class BrokenDocument(FakeUserDocument):
+        def update(self, fields):
+            raise PermissionError('permission denied')
+
+    class BrokenFirestore(FakeUserFirestore):
+        def document(self, uid):
+            return BrokenDocument(self.users, uid)
+
+    app = Flask(__name__)
+    app.after_request(commit_user_documents)
+
+    @app.route('/update')
+    def update():
+        session = get_user_documents()
+        session._db = BrokenFirestore({'u1': {'fullName': 'Farmer'}})
+        session.update('u1', {'fullName': 'Renamed'})
+        return jsonify({'success': True})
+
+    response = app.test_client().get('/update')
+    assert response.status_code == 500
+    assert response.get_json()['success'] is False
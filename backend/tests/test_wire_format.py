@@ -0,0 +1,90 @@
+# tests/test_wire_format.py
+import struct
+import time
+import uuid
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from conftest import AUTH_HEADERS, SENSOR_FIELDS
+from services.sensor_store import get_sensor_store
+from utils.wire_format import (
+    negotiate_format,
+    encode_history_columnar,
+    encode_history_binary,
+    decode_history_binary,
+    encode_stats_binary,
+    BINARY_HEADER,
+    BINARY_MIMETYPE,
+    COLUMNAR_MIMETYPE,
+    STATS_KEYS
+)
+
+
+def gappy_history():
+    timestamps = np.array([600.0, 660.0, 840.0])
+    columns = {field: np.array([1.04, 2.0, 3.0], dtype=np.float32) for field in SENSOR_FIELDS}
+    return timestamps, columns
+
+
+@pytest.mark.parametrize('query, accept, expected', [
+    ('', None, 'json'),
+    ('?format=binary', 'application/json', 'binary'),
+    ('', COLUMNAR_MIMETYPE, 'columnar'),
+    ('', f'{BINARY_MIMETYPE}, application/json;q=0.5', 'binary'),
+    ('?format=xml', '*/*', 'json'),
+])
+def test_format_is_negotiated_from_query_then_accept(query, accept, expected):
+    headers = {'Accept': accept} if accept else {}
+    with Flask(__name__).test_request_context(f'/history{query}', headers=headers):
+        from flask import request
+        assert negotiate_format(request) == expected
+
+
+def test_columnar_history_puts_gaps_on_the_grid():
+    encoded = encode_history_columnar(*gappy_history(), 60)
+    assert (encoded['start'], encoded['step'], encoded['count']) == (600.0, 60, 5)
+    assert encoded['temperature'] == [1.0, 2.0, None, None, 3.0]
+
+
+def test_binary_history_round_trips():
+    payload = encode_history_binary(*gappy_history(), 60)
+    assert len(payload) == BINARY_HEADER.size + 5 * 4 * len(SENSOR_FIELDS)
+
+    start, step, columns = decode_history_binary(payload)
+    assert (start, step) == (600.0, 60.0)
+    np.testing.assert_array_equal(columns['humidity'], np.array([1.04, 2, np.nan, np.nan, 3], dtype=np.float32))
+
+    with pytest.raises(ValueError):
+        decode_history_binary(encode_stats_binary({field: dict.fromkeys(STATS_KEYS) for field in SENSOR_FIELDS}, 3600))
+
+
+def test_binary_stats_layout():
+    stats = {field: {**dict.fromkeys(STATS_KEYS, 2.0), 'count': 3, 'stddev': None} for field in SENSOR_FIELDS}
+    payload = encode_stats_binary(stats, 3600)
+    _, _, kind, field_count, key_count, _, window = BINARY_HEADER.unpack_from(payload)
+    assert (kind, field_count, key_count, window) == (2, len(SENSOR_FIELDS), len(STATS_KEYS), 3600.0)
+
+    matrix = np.frombuffer(payload, dtype='<f4', offset=BINARY_HEADER.size).reshape(field_count, key_count)
+    assert matrix[0, STATS_KEYS.index('count')] == 3
+    assert matrix[0, STATS_KEYS.index('avg')] == 2
+    assert np.isnan(matrix[:, STATS_KEYS.index('stddev')]).all()
+
+
+def test_history_route_serves_every_format(sensor_client):
+    greenhouse_id = f'GH-{uuid.uuid4().hex[:8]}'
+    now = time.time()
+    get_sensor_store().ingest(greenhouse_id, now - 3600 + np.arange(60) * 60.0, {field: np.full(60, 20.0) for field in SENSOR_FIELDS})
+    url = f'/api/sensors/history?greenhouse={greenhouse_id}&range=2h&interval=1m'
+
+    rows = sensor_client.get(url, headers=AUTH_HEADERS).get_json()['data']['readings']
+    columnar = sensor_client.get(url, headers={**AUTH_HEADERS, 'Accept': COLUMNAR_MIMETYPE})
+    binary = sensor_client.get(url + '&format=binary', headers=AUTH_HEADERS)
+
+    assert columnar.mimetype == COLUMNAR_MIMETYPE
+    assert columnar.get_json()['data']['temperature'] == [row['temperature'] for row in rows]
+    assert binary.mimetype == BINARY_MIMETYPE
+    _, _, columns = decode_history_binary(binary.get_data())
+    assert columns['temperature'].tolist() == [row['temperature'] for row in rows]
+    assert struct.unpack_from('<4s', binary.get_data())[0] == b'SHSB'
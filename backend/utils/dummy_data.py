@@ -1,13 +1,34 @@
 # utils/dummy_data.py
+import os
 import random
-from datetime import datetime, timedelta
+import time
+import numpy as np
+from datetime import datetime
+
+from utils.time_utils import parse_duration, format_timestamps
+
+DEFAULT_GREENHOUSE = {
+    'id': 'GH-001',
+    'name': 'ShambaSecure Test Greenhouse',
+    'location': 'Nairobi, Kenya'
+}
+
+# Optional fixed seed so demo and staging environments render the same history
+DEMO_SEED = int(os.environ['SENSOR_DEMO_SEED']) if os.getenv('SENSOR_DEMO_SEED') else None
+
+# field -> (starting value, max step per sample, lower bound, upper bound)
+RANDOM_WALKS = {
+    'temperature': (25.0, 1.0, 18, 32),     # °C
+    'humidity': (65.0, 2.0, 40, 85),        # %
+    'soilMoisture': (55.0, 1.5, 30, 70),    # %
+}
 
 def random_in_range(min_val, max_val, decimals=1):
     """Generate random value within range"""
     value = random.uniform(min_val, max_val)
     return round(value, decimals)
 
-def generate_dummy_data():
+def generate_dummy_data(greenhouse=None):
     """Generate single sensor reading"""
     return {
         'timestamp': datetime.utcnow().isoformat(),
@@ -15,55 +36,50 @@ def generate_dummy_data():
         'humidity': random_in_range(40, 85),     # %
         'soilMoisture': random_in_range(30, 70), # %
         'status': 'active',
-        'greenhouse': {
-            'id': 'GH-001',
-            'name': 'ShambaSecure Test Greenhouse',
-            'location': 'Nairobi, Kenya'
-        }
+        'greenhouse': dict(greenhouse or DEFAULT_GREENHOUSE)
     }
 
-def generate_historical_data(hours=24, interval='1h'):
+def generate_historical_series(hours=24, interval='1h', seed=None, end=None):
+    """
+    Generate a columnar random-walk history in one vectorized pass.
+    Returns {'timestamps': epoch seconds, 'temperature': ..., 'humidity': ..., 'soilMoisture': ...}
+    The same seed always produces the same values; `end` defaults to now.
+    """
+    interval_seconds = parse_duration(interval, 3600)
+    num_points = int(hours * 3600 // interval_seconds) + 1
+    end = time.time() if end is None else end
+
+    rng = np.random.default_rng(DEMO_SEED if seed is None else seed)
+    series = {
+        'timestamps': end - np.arange(num_points - 1, -1, -1, dtype=np.float64) * interval_seconds
+    }
+
+    for field, (base, step, low, high) in RANDOM_WALKS.items():
+        walk = base + np.cumsum(rng.uniform(-step, step, num_points))
+        # Fold the walk back into [low, high] - the vectorized equivalent of bouncing off the bounds
+        width = high - low
+        folded = np.mod(walk - low, 2 * width)
+        walk = low + np.where(folded > width, 2 * width - folded, folded)
+        series[field] = np.round(walk, 1).astype(np.float32)
+
+    return series
+
+def generate_historical_data(hours=24, interval='1h', seed=None):
     """Generate historical sensor data"""
-    data = []
-    
-    # Parse interval
-    if interval.endswith('h'):
-        interval_minutes = int(interval[:-1]) * 60
-    elif interval.endswith('m'):
-        interval_minutes = int(interval[:-1])
-    else:
-        interval_minutes = 60  # Default to 1 hour
-    
-    # Calculate number of data points
-    total_minutes = hours * 60
-    num_points = int(total_minutes / interval_minutes) + 1
-    
-    # Base values for realistic trends
-    base_temp = 25.0
-    base_humidity = 65.0
-    base_soil_moisture = 55.0
-    
-    current_time = datetime.utcnow()
-    
-    for i in range(num_points):
-        # Calculate timestamp (going backwards from now)
-        timestamp = current_time - timedelta(minutes=(num_points - i - 1) * interval_minutes)
-        
-        # Add slight variations for realistic trends
-        base_temp += random_in_range(-1, 1, 2)
-        base_humidity += random_in_range(-2, 2, 2)
-        base_soil_moisture += random_in_range(-1.5, 1.5, 2)
-        
-        # Keep within realistic bounds
-        base_temp = max(18, min(32, base_temp))
-        base_humidity = max(40, min(85, base_humidity))
-        base_soil_moisture = max(30, min(70, base_soil_moisture))
-        
-        data.append({
-            'timestamp': timestamp.isoformat(),
-            'temperature': round(base_temp, 1),
-            'humidity': round(base_humidity, 1),
-            'soilMoisture': round(base_soil_moisture, 1)
-        })
-    
-    return data
\ No newline at end of file
+    series = generate_historical_series(hours, interval, seed)
+
+    timestamps = format_timestamps(series['timestamps'])
+    temperatures = series['temperature'].tolist()
+    humidities = series['humidity'].tolist()
+    soil_moistures = series['soilMoisture'].tolist()
+
+    return [
+        {
+            'timestamp': timestamp,
+            'temperature': round(temperature, 1),
+            'humidity': round(humidity, 1),
+            'soilMoisture': round(soil_moisture, 1)
+        }
+        for timestamp, temperature, humidity, soil_moisture
+        in zip(timestamps, temperatures, humidities, soil_moistures)
+    ]
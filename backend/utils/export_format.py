@@ -0,0 +1,237 @@
+# utils/export_format.py
+"""
+Bulk export encodings for /api/sensors/export.
+
+csv     - greenhouseId,timestamp,temperature,humidity,soilMoisture rows (text/csv)
+binary  - columnar blocks (application/vnd.shambasecure.export+binary)
+
+Binary layout (all little-endian):
+    header  '<4sBH'  magic b'SHSX', version, field count, then the comma-separated field names
+                     as a '<H' length-prefixed UTF-8 string
+    block   '<HI'    greenhouse id length, row count, then the id (UTF-8), float64[rows] epoch
+                     timestamps and one float32[rows] array per field
+    trailer          a block with an empty id and zero rows - a file without it was cut short
+
+CSV rows are formatted with NumPy digit arithmetic into a byte matrix instead of per-value
+string formatting, which keeps the encoder at a few million rows per second.
+"""
+import struct
+from functools import lru_cache
+import numpy as np
+
+from services.sensor_store import SENSOR_FIELDS
+from utils.time_utils import split_micros
+
+CSV_MIMETYPE = 'text/csv'
+EXPORT_MIMETYPE = 'application/vnd.shambasecure.export+binary'
+
+EXPORT_MAGIC = b'SHSX'
+EXPORT_VERSION = 1
+EXPORT_HEADER = struct.Struct('<4sBH')
+NAMES_LENGTH = struct.Struct('<H')
+BLOCK_HEADER = struct.Struct('<HI')
+
+CSV_HEADER = ('greenhouseId,timestamp,' + ','.join(SENSOR_FIELDS) + '\n').encode()
+
+ISO_WIDTH = 26      # YYYY-MM-DDTHH:MM:SS.ffffff, the longest format_timestamps() string
+
+_PAD = 0            # filler byte dropped when a byte matrix is flattened into CSV
+
+# '000'..'999' as byte triples, so microseconds cost two fancy-indexes instead of six divisions
+_THREE_DIGITS = np.array([b'%03d' % i for i in range(1000)]).view(np.uint8).reshape(1000, 3)
+
+
+# Values below this many tenths (i.e. |value| < 1000.0) are formatted with one table lookup
+_DECIMAL_TABLE_SIZE = 10000
+_DECIMAL_WIDTH = 6          # '-999.9'
+
+
+@lru_cache(maxsize=1)
+def _decimal_table():
+    """Right-aligned, _PAD-filled '0.0'..'999.9' followed by '-0.0'..'-999.9'"""
+    rows = [b'%.1f' % (tenths / 10) for tenths in range(_DECIMAL_TABLE_SIZE)]
+    rows += [b'-' + row for row in rows]
+    return np.array([row.rjust(_DECIMAL_WIDTH, b'\0') for row in rows]).view(np.uint8).reshape(-1, _DECIMAL_WIDTH)
+
+
+@lru_cache(maxsize=1)
+def _time_of_day_table():
+    """'THH:MM:SS.' for every second of the day (860 KB), built on first export"""
+    rows = [b'T%02d:%02d:%02d.' % (second // 3600, second // 60 % 60, second % 60) for second in range(86400)]
+    return np.array(rows).view(np.uint8).reshape(86400, 10)
+
+
+def _put_digits(out, column, values, width):
+    """Write `values` as zero-padded decimal digits into out[:, column:column + width]"""
+    for i in range(width - 1, -1, -1):
+        out[:, column + i] = 48 + values % 10
+        values = values // 10
+
+
+def _date_bytes(days):
+    """YYYY-MM-DD for days since the epoch (proleptic Gregorian, vectorized civil-from-days)"""
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+
+    out = np.empty((len(days), 10), dtype=np.uint8)
+    _put_digits(out, 0, year, 4)
+    out[:, 4] = ord('-')
+    _put_digits(out, 5, month, 2)
+    out[:, 7] = ord('-')
+    _put_digits(out, 8, day, 2)
+    return out
+
+
+def iso_bytes(timestamps):
+    """
+    (rows, 26) uint8 matrix of ISO timestamps matching format_timestamps(), byte for byte once
+    _PAD is dropped: whole seconds have their '.ffffff' padded out.
+    """
+    whole, fraction = split_micros(timestamps)
+    if len(whole) == 0:
+        return np.empty((0, ISO_WIDTH), dtype=np.uint8)
+
+    days, seconds = np.divmod(whole, 86400)
+
+    # Sorted readings span few days, so build each date once and fan it out
+    changes = np.r_[True, days[1:] != days[:-1]]
+    dates = _date_bytes(days[changes])[np.cumsum(changes) - 1]
+
+    out = np.concatenate((
+        dates,
+        _time_of_day_table()[seconds],
+        _THREE_DIGITS[fraction // 1000],
+        _THREE_DIGITS[fraction % 1000]
+    ), axis=1)
+    out[fraction == 0, ISO_WIDTH - 7:] = _PAD
+    return out
+
+
+def decimal_bytes(values):
+    """
+    (rows, width) uint8 matrix of values formatted like '%.1f', right-aligned with _PAD filler.
+    NaN becomes an empty field.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    scaled = np.where(missing, 0, values) * 10
+    large = ~(np.abs(scaled) < 1e9)
+    scaled[large] = 0
+    tenths = np.rint(scaled)
+    # '%.1f' rounds the exact binary value, which rint of the scaled value can get wrong right at a
+    # tie (0.35 * 10 == 3.5, though 0.35 is stored as 0.34999...). Near-ties, and values too large
+    # for that check or for int64 tenths (including infinities), are formatted by Python instead.
+    exact = large | (~missing & (np.abs(np.abs(scaled - tenths) - 0.5) < 1e-6))
+    tenths = np.abs(np.where(exact, 0, tenths)).astype(np.int64)
+    # signbit, so values that round to zero keep their sign: '%.1f' % -0.04 == '-0.0'
+    negative = np.signbit(values) & ~missing
+
+    if len(tenths) and tenths.max() < _DECIMAL_TABLE_SIZE:
+        out = _decimal_table()[tenths + negative * _DECIMAL_TABLE_SIZE]
+    else:
+        out = _digit_bytes(tenths, negative)
+    out[missing] = _PAD
+
+    rows = np.flatnonzero(exact)
+    if len(rows):
+        formatted = [b'%.1f' % value for value in values[rows].tolist()]
+        width = max(out.shape[1], max(len(text) for text in formatted))
+        if width > out.shape[1]:
+            out = np.concatenate((np.full((len(out), width - out.shape[1]), _PAD, dtype=np.uint8), out), axis=1)
+        out[rows] = np.array([text.rjust(width, b'\0') for text in formatted]).view(np.uint8).reshape(-1, width)
+    return out
+
+
+def _digit_bytes(tenths, negative):
+    """decimal_bytes() for tenths beyond the lookup table, one digit column at a time"""
+    integer = tenths // 10
+    int_digits = len(str(int(integer.max()))) if len(integer) else 1
+    width = 1 + int_digits + 2
+
+    out = np.full((len(tenths), width), _PAD, dtype=np.uint8)
+    out[:, -1] = 48 + tenths % 10
+    out[:, -2] = ord('.')
+    digit_count = np.ones(len(tenths), dtype=np.int64)
+    for i in range(int_digits):
+        column = width - 3 - i
+        present = (integer > 0) | (i == 0)
+        out[:, column] = np.where(present, 48 + integer % 10, _PAD)
+        digit_count += present & (i > 0)
+        integer = integer // 10
+
+    rows = np.flatnonzero(negative)
+    out[rows, width - 3 - digit_count[rows]] = ord('-')
+    return out
+
+
+def encode_csv_chunk(greenhouse_id, timestamps, columns):
+    """CSV rows for one chunk of readings as bytes"""
+    rows = len(timestamps)
+    if rows == 0:
+        return b''
+
+    prefix = np.frombuffer(greenhouse_id.encode() + b',', dtype=np.uint8)
+    separator = np.full((rows, 1), ord(','), dtype=np.uint8)
+    parts = [np.broadcast_to(prefix, (rows, len(prefix))), iso_bytes(timestamps)]
+    for field in SENSOR_FIELDS:
+        parts.append(separator)
+        parts.append(decimal_bytes(columns[field]))
+    parts.append(np.full((rows, 1), ord('\n'), dtype=np.uint8))
+
+    matrix = np.concatenate(parts, axis=1)
+    return matrix[matrix != _PAD].tobytes()
+
+
+def encode_export_header():
+    names = ','.join(SENSOR_FIELDS).encode()
+    return EXPORT_HEADER.pack(EXPORT_MAGIC, EXPORT_VERSION, len(SENSOR_FIELDS)) + NAMES_LENGTH.pack(len(names)) + names
+
+
+def encode_export_block(greenhouse_id, timestamps, columns):
+    encoded_id = greenhouse_id.encode()
+    parts = [
+        BLOCK_HEADER.pack(len(encoded_id), len(timestamps)),
+        encoded_id,
+        np.ascontiguousarray(timestamps, dtype='<f8').tobytes()
+    ]
+    parts.extend(np.ascontiguousarray(columns[field], dtype='<f4').tobytes() for field in SENSOR_FIELDS)
+    return b''.join(parts)
+
+
+EXPORT_TRAILER = BLOCK_HEADER.pack(0, 0)
+
+
+def iter_export_blocks(payload):
+    """Decode an export file into (greenhouse_id, timestamps, {field: values}) blocks"""
+    magic, version, field_count = EXPORT_HEADER.unpack_from(payload)
+    if magic != EXPORT_MAGIC:
+        raise ValueError('Not a sensor export file')
+    offset = EXPORT_HEADER.size
+    (names_length,) = NAMES_LENGTH.unpack_from(payload, offset)
+    offset += NAMES_LENGTH.size
+    fields = payload[offset:offset + names_length].decode().split(',')
+    offset += names_length
+
+    while True:
+        if offset + BLOCK_HEADER.size > len(payload):
+            raise ValueError('Export file is truncated')
+        id_length, rows = BLOCK_HEADER.unpack_from(payload, offset)
+        offset += BLOCK_HEADER.size
+        if id_length == 0 and rows == 0:
+            return
+        greenhouse_id = payload[offset:offset + id_length].decode()
+        offset += id_length
+        timestamps = np.frombuffer(payload, dtype='<f8', count=rows, offset=offset)
+        offset += rows * 8
+        columns = {}
+        for field in fields:
+            columns[field] = np.frombuffer(payload, dtype='<f4', count=rows, offset=offset)
+            offset += rows * 4
+        yield greenhouse_id, timestamps, columns
@@ -0,0 +1,53 @@
+# utils/http_cache.py
+import hashlib
+import time
+from flask import request, Response
+
+# Intervals at or above this are served from coarse rollup tiers and may be reused without revalidating
+MAX_AGE_MIN_STEP_SECONDS = 3600
+
+
+def data_etag(version, *parts):
+    """
+    Strong ETag from the data version plus whatever shapes the body (params, format, time bucket).
+    Returns None when there is no version, e.g. for randomly generated demo data.
+    """
+    if version is None:
+        return None
+    key = '|'.join(str(part) for part in (*version, *parts))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def bucket_cache_control(step_seconds, now=None):
+    """
+    Cache until the current `step`-aligned bucket closes, for coarse tiers only.
+    Always private: the body is one signed-in user's data and must not be stored by shared caches.
+    """
+    if step_seconds < MAX_AGE_MIN_STEP_SECONDS:
+        return 'private, no-cache'
+
+    now = time.time() if now is None else now
+    remaining = int(step_seconds - now % step_seconds)
+    return f'private, max-age={max(remaining, 1)}'
+
+
+def not_modified(etag, cache_control='private, no-cache'):
+    """
+    304 response if the client's If-None-Match already has this ETag, otherwise None.
+    Uses weak comparison, so validators weakened by response compression still match.
+    """
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+
+    response = Response(status=304)
+    return with_cache_headers(response, etag, cache_control)
+
+
+def with_cache_headers(response, etag, cache_control='private, no-cache'):
+    """Attach ETag/Cache-Control/Vary to a response"""
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+    # Encoding and payload depend on these request headers
+    response.vary.update(('Accept', 'Authorization'))
+    return response
@@ -0,0 +1,81 @@
+# utils/resample.py
+import numpy as np
+
+from services.sensor_store import SENSOR_FIELDS
+
+# Percentile aggregations and the fraction each one estimates
+PERCENTILE_AGGREGATIONS = {'p5': 0.05, 'p50': 0.5, 'p95': 0.95}
+AGGREGATIONS = ('mean', 'last', 'max', *PERCENTILE_AGGREGATIONS)
+GAP_FILLS = ('none', 'ffill', 'linear')
+
+
+def empty_series():
+    return np.empty(0, dtype=np.float64), {field: np.empty(0) for field in SENSOR_FIELDS}
+
+
+def bucket_bounds(timestamps, step):
+    """Epoch-aligned bucket number of each reading plus the start offset and length of every occupied bucket"""
+    # Epoch seconds are positive, so truncating the true division floors it (float // is ~3x slower)
+    group = (np.asarray(timestamps, dtype=np.float64) / step).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    counts = np.diff(np.r_[starts, len(group)])
+    return group, starts, counts
+
+
+def resample(timestamps, columns, step, agg='mean', fill='none'):
+    """
+    Align time-ordered readings to epoch-aligned buckets of `step` seconds.
+    agg picks the bucket value (mean, last, max or p5/p50/p95); fill decides what happens to empty buckets.
+    Returns (bucket_start_timestamps, {field: values}).
+    """
+    if len(timestamps) == 0:
+        return empty_series()
+
+    group, starts, counts = bucket_bounds(timestamps, step)
+
+    aggregated = {}
+    for field in SENSOR_FIELDS:
+        column = columns[field]
+        if agg == 'last':
+            aggregated[field] = column[starts + counts - 1].astype(np.float64)
+        elif agg == 'max':
+            aggregated[field] = np.maximum.reduceat(column, starts).astype(np.float64)
+        elif agg in PERCENTILE_AGGREGATIONS:
+            aggregated[field] = bucket_percentiles(column, group, starts, counts, PERCENTILE_AGGREGATIONS[agg])
+        else:
+            aggregated[field] = np.add.reduceat(column, starts, dtype=np.float64) / counts
+
+    return fill_gaps(group[starts], aggregated, step, fill)
+
+
+def bucket_percentiles(column, group, starts, counts, fraction):
+    """Exact per-bucket percentile (inverted CDF, as np.percentile) without a Python loop per bucket"""
+    # Sort by value within each bucket; the buckets themselves are already in order
+    ordered = np.asarray(column)[np.lexsort((column, group))]
+    rank = np.clip(np.ceil(fraction * counts).astype(np.int64) - 1, 0, counts - 1)
+    return ordered[starts + rank].astype(np.float64)
+
+
+def fill_gaps(buckets, columns, step, fill='none'):
+    """
+    Expand occupied buckets into a regular grid between the first and last one and fill the holes.
+    'none' keeps only occupied buckets, 'ffill' repeats the previous value, 'linear' interpolates.
+    """
+    if fill == 'none' or len(buckets) < 2:
+        return (buckets * step).astype(np.float64), columns
+
+    buckets = np.asarray(buckets, dtype=np.int64)
+    offsets = buckets - buckets[0]
+    size = int(offsets[-1]) + 1
+    grid = np.arange(buckets[0], buckets[0] + size, dtype=np.int64)
+
+    if fill == 'ffill':
+        # Each grid slot takes the value of the last occupied bucket at or before it
+        slot_source = np.zeros(size, dtype=np.int64)
+        slot_source[offsets] = np.arange(len(offsets))
+        slot_source = np.maximum.accumulate(slot_source)
+        filled = {field: np.asarray(values)[slot_source] for field, values in columns.items()}
+    else:
+        filled = {field: np.interp(grid, buckets, values) for field, values in columns.items()}
+
+    return (grid * step).astype(np.float64), filled
@@ -0,0 +1,27 @@
+# utils/sqlite_db.py
+import sqlite3
+import threading
+
+
+class SQLiteDatabase:
+    """
+    Per-thread connections to one SQLite file in WAL mode, for state shared by every
+    gunicorn worker on a host without an external service.
+    Connections are in autocommit mode, so every statement is its own short transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')    # short-lived auth state; WAL keeps it crash-consistent
+            self._local.connection = connection
+        return connection
+
+    def execute(self, sql, parameters=()):
+        return self.connection().execute(sql, parameters)
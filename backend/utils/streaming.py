@@ -0,0 +1,55 @@
+# utils/streaming.py
+import json
+import numpy as np
+
+from utils.time_utils import format_timestamps
+
+# Readings serialized per yielded chunk
+CHUNK_SIZE = 2000
+
+READING_TEMPLATE = '{"timestamp":"%s","temperature":%r,"humidity":%r,"soilMoisture":%r,"anomaly":%s}'
+
+
+def rounded(values):
+    """Round to one decimal in float64 so float32 columns print as e.g. 25.1"""
+    return np.round(np.asarray(values, dtype=np.float64), 1).tolist()
+
+
+def encoded_anomalies(anomalies, count):
+    """JSON text of each reading's anomaly labels; almost all are null, so only flagged ones are dumped"""
+    if anomalies is None:
+        return ['null'] * count
+    return ['null' if labels is None else json.dumps(labels, separators=(',', ':')) for labels in anomalies]
+
+
+def iter_readings_json(timestamps, columns, chunk_size=CHUNK_SIZE, anomalies=None):
+    """Yield comma-separated reading objects chunk by chunk, never holding the whole array as dicts"""
+    anomalies = encoded_anomalies(anomalies, len(timestamps))
+    for start in range(0, len(timestamps), chunk_size):
+        end = start + chunk_size
+        rows = zip(
+            format_timestamps(timestamps[start:end]),
+            rounded(columns['temperature'][start:end]),
+            rounded(columns['humidity'][start:end]),
+            rounded(columns['soilMoisture'][start:end]),
+            anomalies[start:end]
+        )
+        chunk = ','.join(READING_TEMPLATE % row for row in rows)
+        yield (',' + chunk if start else chunk).encode()
+
+
+def iter_history_json(message, time_range, interval, timestamps, columns, anomalies=None):
+    """Yield the /history envelope incrementally: success, message, data.range, data.interval, data.readings"""
+    head = {
+        'success': True,
+        'message': message,
+        'data': {
+            'range': time_range,
+            'interval': interval
+        }
+    }
+    # Serialize the envelope without its closing braces, then stream the readings array into it
+    prefix = json.dumps(head, separators=(',', ':'))[:-2]
+    yield (prefix + ',"readings":[').encode()
+    yield from iter_readings_json(timestamps, columns, anomalies=anomalies)
+    yield b']}}'
@@ -0,0 +1,110 @@
+# utils/time_utils.py
+import math
+import time
+import numpy as np
+from datetime import datetime, timezone
+
+# 2100-01-01T00:00:00Z; parsed timestamps must fall in [0, this)
+MAX_EPOCH_SECONDS = 4102444800
+
+DURATION_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+}
+
+
+def parse_duration(value, default_seconds):
+    """
+    Parse a duration such as '30s', '15m', '6h' or '7d' into seconds; empty means the default.
+    Raises ValueError for anything else (e.g. '15x', '0.5h', '0').
+    """
+    if not value:
+        return default_seconds
+
+    value = str(value).strip().lower()
+    unit = DURATION_UNITS.get(value[-1:])
+    if unit is None:
+        amount = value
+        unit = 60  # Bare numbers are minutes, like the original interval parser
+    else:
+        amount = value[:-1]
+
+    if not amount.isdigit() or int(amount) <= 0:
+        raise ValueError(f'invalid duration: {value}')
+    return int(amount) * unit
+
+
+def parse_timestamp(value):
+    """
+    Convert an ISO string or epoch number (s or ms) into epoch seconds.
+    Raises ValueError for NaN, infinities and anything outside [1970, 2100).
+    """
+    if value is None or value == '':
+        return time.time()
+
+    if isinstance(value, bool):
+        raise ValueError('timestamp must be a number or ISO string')
+
+    if isinstance(value, (int, float)):
+        # Treat very large numbers as milliseconds
+        return check_epoch(value / 1000.0 if value > 1e11 else float(value))
+
+    value = str(value).strip()
+    try:
+        # Epoch numbers also arrive as strings, e.g. from query parameters
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is not None:
+        return parse_timestamp(number)
+
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        # Naive timestamps are UTC, matching datetime.utcnow().isoformat()
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return check_epoch(parsed.timestamp())
+
+
+def check_epoch(seconds):
+    """Return seconds if it is a finite epoch in [0, MAX_EPOCH_SECONDS), else raise ValueError"""
+    if not math.isfinite(seconds) or not 0 <= seconds < MAX_EPOCH_SECONDS:
+        raise ValueError(f'timestamp out of range: {seconds}')
+    return seconds
+
+
+def format_timestamp(epoch_seconds):
+    """Format epoch seconds the same way as datetime.utcnow().isoformat()"""
+    return datetime.fromtimestamp(float(epoch_seconds), tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def split_micros(epoch_seconds):
+    """
+    (whole seconds, microseconds) as int64 arrays, rounded the way datetime.fromtimestamp() rounds:
+    the fractional part alone, half to even, carrying into the seconds.
+    """
+    fraction, whole = np.modf(np.asarray(epoch_seconds, dtype=np.float64))
+    micros = np.round(fraction * 1e6).astype(np.int64)
+    whole = whole.astype(np.int64)
+    carry = micros >= 10 ** 6
+    whole[carry] += 1
+    micros[carry] -= 10 ** 6
+    return whole, micros
+
+
+def format_timestamps(epoch_seconds):
+    """
+    Vectorized format_timestamp for a NumPy array of epoch seconds, identical string for string:
+    like isoformat(), whole seconds have no fractional part.
+    """
+    whole, micros = split_micros(epoch_seconds)
+    instants = (whole * 10 ** 6 + micros).astype('datetime64[us]')
+    formatted = np.datetime_as_string(instants, unit='us')
+    whole_seconds = micros == 0
+    if whole_seconds.any():
+        formatted[whole_seconds] = np.datetime_as_string(instants[whole_seconds], unit='s')
+    return formatted.tolist()
@@ -0,0 +1,32 @@
+# utils/user_agent.py
+from functools import lru_cache
+import user_agents
+
+# Distinct User-Agent strings seen by the auth endpoints are few (browser/OS/version combinations)
+USER_AGENT_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def _parse(user_agent):
+    ua = user_agents.parse(user_agent)
+    return (
+        ('device_type', ua.device.family),
+        ('os', f"{ua.os.family} {ua.os.version_string}"),
+        ('browser', f"{ua.browser.family} {ua.browser.version_string}"),
+        ('is_mobile', ua.is_mobile),
+        ('is_tablet', ua.is_tablet),
+        ('is_pc', ua.is_pc),
+    )
+
+
+def parse_user_agent(user_agent):
+    """Device fields for a User-Agent string; the regex-heavy parse runs once per distinct string"""
+    return dict(_parse(user_agent))
+
+
+def user_agent_cache_info():
+    return _parse.cache_info()
+
+
+def clear_user_agent_cache():
+    _parse.cache_clear()
@@ -0,0 +1,139 @@
+# utils/wire_format.py
+"""
+Compact encodings for sensor history and stats.
+
+json      - default list-of-objects envelope (application/json)
+columnar  - start + step + parallel value arrays, gaps as null, plus an anomaly array
+            (application/vnd.shambasecure.columnar+json)
+binary    - packed little-endian float32 arrays (application/vnd.shambasecure.columnar+binary)
+
+Binary layout (all little-endian):
+    header  '<4sBBHIdd'  magic b'SHSB', version, kind (1=history, 2=stats), field count,
+                         row count, start (epoch seconds), step (seconds)
+    body    history: one float32[row count] array per field in SENSOR_FIELDS order, NaN for gaps
+            stats:   float32[field count x len(STATS_KEYS)] row-major, NaN for missing values
+"""
+import struct
+import numpy as np
+
+from services.sensor_store import SENSOR_FIELDS, SENSOR_UNITS
+
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_MIMETYPE = 'application/vnd.shambasecure.columnar+json'
+BINARY_MIMETYPE = 'application/vnd.shambasecure.columnar+binary'
+
+FORMATS = {
+    'json': JSON_MIMETYPE,
+    'columnar': COLUMNAR_MIMETYPE,
+    'binary': BINARY_MIMETYPE,
+}
+
+BINARY_MAGIC = b'SHSB'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBBHIdd')
+KIND_HISTORY = 1
+KIND_STATS = 2
+
+STATS_KEYS = ('count', 'min', 'max', 'avg', 'stddev', 'p5', 'p50', 'p95')
+
+
+def negotiate_format(request):
+    """Pick json/columnar/binary from ?format= first, then the Accept header"""
+    requested = request.args.get('format')
+    if requested in FORMATS:
+        return requested
+
+    best = request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, COLUMNAR_MIMETYPE, BINARY_MIMETYPE],
+        default=JSON_MIMETYPE
+    )
+    return next(name for name, mimetype in FORMATS.items() if mimetype == best)
+
+
+def grid_slots(timestamps, step):
+    """Grid index of each reading, counted from the first one"""
+    timestamps = np.asarray(timestamps)
+    return np.rint((timestamps - timestamps[0]) / step).astype(np.int64)
+
+
+def to_grid(timestamps, columns, step):
+    """Place readings on a regular start + i*step grid; missing slots become NaN"""
+    if len(timestamps) == 0:
+        return 0.0, {field: np.empty(0, dtype=np.float32) for field in SENSOR_FIELDS}
+
+    start = float(timestamps[0])
+    slots = grid_slots(timestamps, step)
+    grid = {}
+    for field in SENSOR_FIELDS:
+        column = np.full(int(slots[-1]) + 1, np.nan, dtype=np.float32)
+        column[slots] = columns[field]
+        grid[field] = column
+    return start, grid
+
+
+def nan_to_none(values):
+    """Round to one decimal and turn NaN gaps into JSON nulls"""
+    rounded = np.round(np.asarray(values, dtype=np.float64), 1)
+    return [None if value != value else value for value in rounded.tolist()]
+
+
+def encode_history_columnar(timestamps, columns, step, anomalies=None):
+    """
+    {'start', 'step', 'count', field: [...], 'anomaly': [...]} with one array per sensor.
+    `anomalies` is aligned with timestamps; slots without a flagged reading are null.
+    """
+    start, grid = to_grid(timestamps, columns, step)
+    count = len(grid[SENSOR_FIELDS[0]])
+    encoded = {
+        'start': start,
+        'step': step,
+        'count': count,
+    }
+    for field in SENSOR_FIELDS:
+        encoded[field] = nan_to_none(grid[field])
+
+    anomaly = [None] * count
+    if anomalies is not None and count:
+        slots = grid_slots(timestamps, step).tolist()
+        for slot, labels in zip(slots, anomalies):
+            anomaly[slot] = labels
+    encoded['anomaly'] = anomaly
+    return encoded
+
+
+def encode_history_binary(timestamps, columns, step):
+    start, grid = to_grid(timestamps, columns, step)
+    count = len(grid[SENSOR_FIELDS[0]])
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, KIND_HISTORY, len(SENSOR_FIELDS), count, start, float(step))
+    return header + b''.join(grid[field].astype('<f4').tobytes() for field in SENSOR_FIELDS)
+
+
+def decode_history_binary(payload):
+    """Inverse of encode_history_binary: (start, step, {field: float32 array})"""
+    magic, version, kind, field_count, count, start, step = BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC or kind != KIND_HISTORY:
+        raise ValueError('Not a history payload')
+
+    values = np.frombuffer(payload, dtype='<f4', offset=BINARY_HEADER.size, count=field_count * count)
+    return start, step, {field: values[i * count:(i + 1) * count] for i, field in enumerate(SENSOR_FIELDS)}
+
+
+def encode_stats_columnar(stats):
+    """{'fields': [...], 'count': [...], 'min': [...], ...} - one entry per field in each array"""
+    encoded = {
+        'fields': list(SENSOR_FIELDS),
+        'units': [SENSOR_UNITS[field] for field in SENSOR_FIELDS]
+    }
+    for key in STATS_KEYS:
+        values = [stats[field][key] for field in SENSOR_FIELDS]
+        encoded[key] = values if key == 'count' else [None if v is None else round(v, 1) for v in values]
+    return encoded
+
+
+def encode_stats_binary(stats, window_seconds):
+    matrix = np.array(
+        [[np.nan if stats[field][key] is None else stats[field][key] for key in STATS_KEYS] for field in SENSOR_FIELDS],
+        dtype='<f4'
+    )
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, KIND_STATS, len(SENSOR_FIELDS), len(STATS_KEYS), 0.0, float(window_seconds))
+    return header + matrix.tobytes()